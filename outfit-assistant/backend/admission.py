@@ -0,0 +1,204 @@
+"""
+Admission - Per-upstream concurrency and rate limits with a bounded wait queue
+
+Every call to an upstream API (OpenAI, Fal, NanobananaAPI) is admitted by that
+upstream's Limiter first. A Limiter combines a concurrency limit with
+requests-per-minute and tokens-per-minute token buckets, so traffic spikes
+queue here instead of turning into 429s from the provider. Waiting callers are
+admitted strictly by priority (interactive ratings before background
+generations), then in arrival order. When the wait queue is full, a new caller
+displaces the newest waiter of lower priority or is turned away itself; turned
+away callers, and callers that waited longer than their timeout, get Overloaded
+with a Retry-After estimate so the endpoint can fail fast instead of piling up.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# Lower numbers are admitted first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Weight of the latest call in the moving average of how long calls hold a slot
+HOLD_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a call cannot be admitted to an upstream in time"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` units are available (amounts above capacity are capped)"""
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class Limiter:
+    """Admission control for one upstream; limits of 0 are disabled"""
+
+    def __init__(self, name, max_concurrent=0, requests_per_minute=0, tokens_per_minute=0, max_queue=32):
+        """
+        Args:
+            name: Metrics prefix (admission.<name>.*)
+            max_concurrent: Calls allowed in flight at once
+            requests_per_minute: Calls started per minute
+            tokens_per_minute: Tokens (as estimated by callers) started per minute
+            max_queue: Callers allowed to wait before new ones are rejected
+        """
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._changed = threading.Condition()
+        self._waiters = []
+        self._displaced = set()
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._hold_seconds = None
+
+    @contextmanager
+    def admit(self, priority=INTERACTIVE, tokens=0, timeout=None):
+        """
+        Hold a slot on this upstream for the duration of the with block
+
+        Args:
+            priority: INTERACTIVE or BACKGROUND
+            tokens: Estimated tokens the call consumes (for tokens_per_minute)
+            timeout: Longest wait in seconds for a slot; None waits indefinitely
+
+        Raises:
+            Overloaded: If the wait queue is full or timeout passes first
+        """
+        started = time.monotonic()
+        self._acquire(priority, tokens, timeout)
+        admitted = time.monotonic()
+        metrics.increment(f"admission.{self.name}.admitted")
+        metrics.observe(f"admission.{self.name}.wait", admitted - started)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - admitted)
+
+    def state(self):
+        """Calls in flight and waiting, for /api/metrics"""
+        with self._changed:
+            return {"in_flight": self._in_flight, "queued": len(self._waiters)}
+
+    def _acquire(self, priority, tokens, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            if not self._waiters and self._wait_time(tokens) == 0:
+                self._take(tokens)
+                return
+            if len(self._waiters) >= self.max_queue:
+                newest = max(self._waiters)
+                if newest[0] <= priority:
+                    raise self._rejected(tokens)
+                # Make room by turning away the newest lower-priority waiter
+                self._waiters.remove(newest)
+                heapq.heapify(self._waiters)
+                self._displaced.add(newest)
+                self._changed.notify_all()
+
+            entry = (priority, next(self._order))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if entry in self._displaced:
+                        self._displaced.discard(entry)
+                        raise self._rejected(tokens)
+                    delay = None
+                    if self._waiters[0] == entry:
+                        delay = self._wait_time(tokens)
+                        if delay == 0:
+                            heapq.heappop(self._waiters)
+                            self._take(tokens)
+                            # The next caller in line may be able to go as well
+                            self._changed.notify_all()
+                            return
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            metrics.increment(f"admission.{self.name}.timed_out")
+                            # Leave the queue first so the estimate does not count this caller
+                            self._waiters.remove(entry)
+                            heapq.heapify(self._waiters)
+                            self._changed.notify_all()
+                            raise Overloaded(
+                                f"Timed out waiting for {self.name}, please try again shortly",
+                                self._retry_after(tokens)
+                            )
+                        delay = remaining if delay is None else min(delay, remaining)
+                    self._changed.wait(delay)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._changed.notify_all()
+                raise
+
+    def _rejected(self, tokens):
+        metrics.increment(f"admission.{self.name}.rejected")
+        return Overloaded(f"{self.name} is at capacity, please try again shortly", self._retry_after(tokens))
+
+    def _wait_time(self, tokens):
+        """Seconds until a call could start: 0 now, None once a slot is released"""
+        if self.max_concurrent and self._in_flight >= self.max_concurrent:
+            return None
+        delay = 0.0
+        if self._requests is not None:
+            delay = self._requests.wait_time(1)
+        if self._tokens is not None and tokens:
+            delay = max(delay, self._tokens.wait_time(tokens))
+        return delay
+
+    def _take(self, tokens):
+        self._in_flight += 1
+        if self._requests is not None:
+            self._requests.take(1)
+        if self._tokens is not None and tokens:
+            self._tokens.take(tokens)
+
+    def _release(self, held):
+        with self._changed:
+            self._in_flight -= 1
+            if self._hold_seconds is None:
+                self._hold_seconds = held
+            else:
+                self._hold_seconds += HOLD_SMOOTHING * (held - self._hold_seconds)
+            self._changed.notify_all()
+
+    def _retry_after(self, tokens):
+        """Whole seconds until the queue ahead of a new caller has likely drained"""
+        delay = self._wait_time(tokens) or 0.0
+        if self.max_concurrent and self._hold_seconds:
+            delay = max(delay, self._hold_seconds * (len(self._waiters) / self.max_concurrent + 1))
+        return max(1, math.ceil(delay))
@@ -1,16 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, url_for, Response
 from flask_cors import CORS
 import os
 import base64
 from io import BytesIO
 from PIL import Image
 import openai
-import requests
 from dotenv import load_dotenv
-import fal_client
 import logging
+import json
+import hmac
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import fashion_arena
+import arena_photos
+import jobs
+import http_client
+import metrics
+import perceptual_cache
+import image_prep
+import pipeline
+import json_stream
+import prompts
+import model_output
+import admission
+import providers
+from cache import TTLCache, SQLiteCache, TieredCache, make_key
+from single_flight import SingleFlight
 
 # Load environment variables
 load_dotenv()
@@ -62,48 +78,132 @@ fal_key = os.getenv('FAL_API_KEY')
 if fal_key:
     os.environ['FAL_KEY'] = fal_key
 
+# Model backends (providers.py): the live vendors, or MODEL_PROVIDER=stub to run
+# offline with canned outputs and simulated latencies (load tests, benchmarks)
+vision_rater, outfit_writer, image_editor = providers.create_providers()
+logger.info(f"Providers - rating: {vision_rater.name}, outfit: {outfit_writer.name}, image: {image_editor.name}")
+
+# Person photos already on the Fal CDN, keyed by SHA-256 of the image bytes, so
+# regenerating with the same photo skips the upload. Keep the TTL below the CDN's
+# retention for uploaded files so we never hand out an expired URL.
+upload_cache = TTLCache(
+    "fal_uploads",
+    max_entries=int(os.getenv('UPLOAD_CACHE_MAX_ENTRIES', 500)),
+    ttl_seconds=int(os.getenv('UPLOAD_CACHE_TTL_SECONDS', 6 * 3600))
+)
 
-def encode_image_to_base64(image_data):
-    """Convert image to base64 string for OpenAI API"""
-    try:
-        # If image_data is already base64, return it
-        if isinstance(image_data, str) and image_data.startswith('data:image'):
-            return image_data
-        
-        # Otherwise, encode it
-        image = Image.open(BytesIO(image_data))
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        return f"data:image/png;base64,{img_str}"
-    except Exception as e:
-        print(f"Error encoding image: {e}")
-        return None
+# GPT outfit descriptions keyed by the normalized request parameters. Set
+# DESCRIPTION_CACHE_DB to also keep them on disk across restarts.
+DESCRIPTION_MAX_TOKENS = 1500
+DESCRIPTION_CACHE_TTL_SECONDS = int(os.getenv('DESCRIPTION_CACHE_TTL_SECONDS', 24 * 3600))
+DESCRIPTION_CACHE_DB = os.getenv('DESCRIPTION_CACHE_DB', '')
+description_cache = TieredCache(
+    TTLCache(
+        "descriptions",
+        max_entries=int(os.getenv('DESCRIPTION_CACHE_MAX_ENTRIES', 1000)),
+        ttl_seconds=DESCRIPTION_CACHE_TTL_SECONDS
+    ),
+    SQLiteCache("descriptions_disk", DESCRIPTION_CACHE_DB, DESCRIPTION_CACHE_TTL_SECONDS) if DESCRIPTION_CACHE_DB else None
+)
+
+# Outfit ratings keyed by perceptual hash of the photo plus occasion and budget;
+# re-rating a near-identical photo (re-encoded, slightly cropped) reuses the result
+rating_cache = perceptual_cache.PerceptualCache(
+    "ratings",
+    max_entries=int(os.getenv('RATING_CACHE_MAX_ENTRIES', 5000)),
+    ttl_seconds=int(os.getenv('RATING_CACHE_TTL_SECONDS', 24 * 3600)),
+    max_distance=int(os.getenv('RATING_CACHE_MAX_DISTANCE', 4))
+)
+
+# Identical upstream calls already in flight are shared instead of repeated.
+# SINGLE_FLIGHT_LOCK_DIR extends this across worker processes for descriptions,
+# whose cache can be shared through DESCRIPTION_CACHE_DB.
+SINGLE_FLIGHT_LOCK_DIR = os.getenv('SINGLE_FLIGHT_LOCK_DIR') or None
+rating_flight = SingleFlight("ratings")
+upload_flight = SingleFlight("fal_uploads")
+description_flight = SingleFlight("descriptions", lock_dir=SINGLE_FLIGHT_LOCK_DIR if DESCRIPTION_CACHE_DB else None)
+image_flight = SingleFlight("nanobanana_images")
+
+# Load Fashion Arena storage and build the leaderboard index before serving
+fashion_arena.initialize_db()
+
+# Background pool for outfit generation; size it to the upstream API quotas
+job_queue = jobs.JobQueue(
+    max_workers=int(os.getenv('JOB_WORKERS', 4)),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', 50)),
+    ttl_seconds=int(os.getenv('JOB_TTL_SECONDS', 3600))
+)
+# Model calls for batch ratings; bounds concurrent rating calls across requests
+RATING_BATCH_MAX_IMAGES = int(os.getenv('RATING_BATCH_MAX_IMAGES', 8))
+rating_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RATING_BATCH_CONCURRENCY', 4)),
+    thread_name_prefix="rating-batch"
+)
+# Independent stages of a job (upload, description) run here concurrently
+stage_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PIPELINE_WORKERS', 8)),
+    thread_name_prefix="pipeline-stage"
+)
+# Admission control per upstream (admission.py). Ratings are admitted ahead of
+# generation calls; callers that cannot get a slot in time get 503 + Retry-After
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 32))
+RATING_ADMISSION_TIMEOUT = float(os.getenv('RATING_ADMISSION_TIMEOUT', 10))
+GENERATION_ADMISSION_TIMEOUT = float(os.getenv('GENERATION_ADMISSION_TIMEOUT', 120))
+openai_limiter = admission.Limiter(
+    "openai",
+    max_concurrent=int(os.getenv('OPENAI_MAX_CONCURRENT', 16)),
+    # Rate buckets are off unless set to the account's limits
+    requests_per_minute=int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 0)),
+    tokens_per_minute=int(os.getenv('OPENAI_TOKENS_PER_MINUTE', 0)),
+    max_queue=ADMISSION_MAX_QUEUE
+)
+fal_limiter = admission.Limiter(
+    "fal",
+    max_concurrent=int(os.getenv('FAL_MAX_CONCURRENT', 8)),
+    max_queue=ADMISSION_MAX_QUEUE
+)
+nanobanana_limiter = admission.Limiter(
+    "nanobanana",
+    max_concurrent=int(os.getenv('NANOBANANA_MAX_CONCURRENT', 4)),
+    max_queue=ADMISSION_MAX_QUEUE
+)
+
+
+def overloaded_response(error):
+    """503 telling the client when to retry a request an upstream had no room for"""
+    logger.warning(f"Request shed: {error}")
+    return (
+        jsonify({"error": str(error), "retry_after": error.retry_after}),
+        503,
+        {"Retry-After": str(error.retry_after)}
+    )
+
+
+def _normalize_text(value):
+    """Case- and whitespace-insensitive form of a free-text parameter"""
+    return " ".join(str(value).split()).casefold()
 
-def save_base64_to_temp_file(base64_data):
-    """Save base64 image data to a temporary file and return the path"""
-    try:
-        # Remove data URL prefix if present
-        if ',' in base64_data:
-            base64_data = base64_data.split(',')[1]
-        
-        # Decode base64
-        image_data = base64.b64decode(base64_data)
-        
-        # Create temp file
-        import tempfile
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-        temp_file.write(image_data)
-        temp_file.close()
-        
-        return temp_file.name
-    except Exception as e:
-        print(f"Error saving base64 to file: {e}")
-        return None
 
-def generate_outfit_image_with_replicate(person_image_base64, outfit_description, occasion, background_description, conditions=""):
+def add_photo_urls(submission):
+    """Attach original and rendition photo URLs to an arena submission"""
+    photo_hash = submission.get('photo_hash')
+    if not photo_hash:
+        return submission
+    submission['photo_url'] = url_for('get_arena_photo', photo_hash=photo_hash)
+    submission['renditions'] = {
+        str(size): {
+            ext: url_for('get_arena_photo_rendition', photo_hash=photo_hash, size=size, ext=ext)
+            for ext in arena_photos.RENDITION_FORMATS
+        }
+        for size in arena_photos.RENDITION_SIZES
+    }
+    return submission
+
+def generate_outfit_image_with_replicate(person_image_url, outfit_description, occasion, background_description, conditions=""):
     """
-    Use NanobananaAPI to generate outfit visualization with face preservation
+    Use the image editor (NanobananaAPI) to generate outfit visualization with face preservation
+
+    person_image_url is the user's uploaded photo (see upload_person_image)
     """
     try:
         logger.info("="*60)
@@ -114,28 +214,11 @@ def generate_outfit_image_with_replicate(person_image_base64, outfit_description
         logger.info(f"Background: {background_description}")
         logger.info(f"Conditions: {conditions}")
         
-        nanobanana_api_key = os.getenv('NANOBANANA_API_KEY')
-        if not nanobanana_api_key:
-            raise Exception("NANOBANANA_API_KEY not configured")
-        
         print("=" * 60)
         print("GENERATING IMAGE WITH NANOBANANA API")
         print("=" * 60)
         
-        # Step 1: Upload person image to get public URL (using Fal CDN)
-        person_image_path = save_base64_to_temp_file(person_image_base64)
-        if not person_image_path:
-            raise Exception("Failed to process person image")
-        
-        print(f"✓ Person image saved: {person_image_path}")
-        logger.info(f"Person image saved: {person_image_path}")
-        
-        # Upload image to Fal CDN to get a public URL
-        image_url = fal_client.upload_file(person_image_path)
-        print(f"✓ Image uploaded to CDN: {image_url}")
-        logger.info(f"Image uploaded to CDN: {image_url}")
-        
-        # Step 2: Create prompt for NanobananaAPI
+        # Step 1: Create prompt for NanobananaAPI
         conditions_text = f" Special requirements: {conditions}." if conditions else ""
         prompt = f"""Transform this person wearing {outfit_description}. 
 Setting: {background_description}. 
@@ -148,99 +231,10 @@ Photorealistic, professional fashion photography, magazine quality, 3/4 body sho
         logger.info(prompt)
         logger.info("-" * 60)
         
-        # Step 3: Submit task to NanobananaAPI
-        print(f"✓ Calling NanobananaAPI...")
-        logger.info("Calling NanobananaAPI...")
-        
-        headers = {
-            "Authorization": f"Bearer {nanobanana_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "prompt": prompt,
-            "type": "IMAGETOIAMGE",  # Image to Image editing
-            "imageUrls": [image_url],
-            "numImages": 1,
-            "image_size": "3:4",  # Portrait format for fashion
-            "callBackUrl": "https://webhook.site/dummy"  # Dummy callback, we'll poll instead
-        }
-        
-        logger.info(f"Request payload: {payload}")
-        
-        response = requests.post(
-            "https://api.nanobananaapi.ai/api/v1/nanobanana/generate",
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"NanobananaAPI request failed: {response.status_code} - {response.text}")
-            raise Exception(f"NanobananaAPI request failed: {response.text}")
-        
-        task_data = response.json()
-        logger.info(f"Task submitted: {task_data}")
-        
-        if task_data.get('code') != 200:
-            raise Exception(f"NanobananaAPI error: {task_data.get('msg')}")
-        
-        task_id = task_data['data']['taskId']
-        print(f"✓ Task submitted: {task_id}")
-        logger.info(f"Task ID: {task_id}")
-        
-        # Step 4: Poll for task completion
-        print(f"✓ Waiting for image generation...")
-        logger.info("Polling for task completion...")
-        
-        import time
-        max_attempts = 60  # 60 attempts * 2 seconds = 2 minutes max
-        attempt = 0
-        
-        while attempt < max_attempts:
-            time.sleep(2)  # Wait 2 seconds between polls
-            attempt += 1
-            
-            # Check task status
-            status_response = requests.get(
-                f"https://api.nanobananaapi.ai/api/v1/nanobanana/record-info?taskId={task_id}",
-                headers=headers
-            )
-            
-            if status_response.status_code != 200:
-                logger.warning(f"Status check failed: {status_response.status_code}")
-                continue
-            
-            status_data = status_response.json()
-            logger.info(f"Attempt {attempt}: Full response = {status_data}")
-            
-            if status_data.get('code') == 200:
-                task_info = status_data.get('data', {})
-                success_flag = task_info.get('successFlag')
-                
-                logger.info(f"Attempt {attempt}: successFlag = {success_flag}")
-                
-                if success_flag == 1:
-                    # Task completed successfully
-                    response_data = task_info.get('response', {})
-                    generated_image_url = response_data.get('resultImageUrl')
-                    
-                    if generated_image_url:
-                        print(f"✓ Image generated successfully!")
-                        logger.info(f"Generated image URL: {generated_image_url}")
-                        break
-                    else:
-                        logger.warning(f"Success flag is 1 but no resultImageUrl found")
-                elif success_flag is not None and success_flag != 0:
-                    # If successFlag exists and is not 0 or 1, treat as error
-                    error_msg = task_info.get('errorMessage', 'Unknown error')
-                    raise Exception(f"Task failed: {error_msg}")
-        else:
-            raise Exception("Task timeout - image generation took too long")
-        
-        # Step 5: Download and optimize the generated image
-        response = requests.get(generated_image_url)
-        img = Image.open(BytesIO(response.content))
-        logger.info(f"Image downloaded: {len(response.content)} bytes")
+        # Step 2: Generate the image and download it
+        logger.info(f"Calling {image_editor.name} image editor...")
+        img = image_editor.edit(person_image_url, prompt)
+        logger.info(f"Generated image received: {img.width}x{img.height}")
         
         # Resize if needed
         max_size = 1024
@@ -261,18 +255,12 @@ Photorealistic, professional fashion photography, magazine quality, 3/4 body sho
         img.save(optimized_buffer, format='JPEG', quality=85, optimize=True)
         optimized_data = optimized_buffer.getvalue()
         
-        print(f"✓ Image optimized: {len(response.content)} -> {len(optimized_data)} bytes")
+        print(f"✓ Image optimized: {len(optimized_data)} bytes")
         
         # Convert to base64
         image_base64 = base64.b64encode(optimized_data).decode()
         result_url = f"data:image/jpeg;base64,{image_base64}"
         
-        # Cleanup
-        try:
-            os.unlink(person_image_path)
-        except Exception as e:
-            print(f"Warning: Could not delete temp file: {e}")
-        
         print(f"✓ Base64 length: {len(image_base64)} chars")
         print("=" * 60)
         print("IMAGE GENERATION SUCCESSFUL!")
@@ -293,11 +281,157 @@ Photorealistic, professional fashion photography, magazine quality, 3/4 body sho
         traceback.print_exc()
         return None
 
+@app.route('/api/callbacks/nanobanana', methods=['POST'])
+def nanobanana_callback():
+    """
+    Completion callback from NanobananaAPI; completes the waiting generation job
+    """
+    token = request.args.get('token', '')
+    if (not isinstance(image_editor, providers.NanobananaImageEditor) or not image_editor.callback_url()
+            or not hmac.compare_digest(token.encode(), image_editor.callback_secret.encode())):
+        logger.warning("Rejected NanobananaAPI callback with invalid token")
+        return jsonify({"error": "Invalid callback token"}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    data = payload.get('data') if isinstance(payload, dict) else None
+    task_id = data.get('taskId') if isinstance(data, dict) else None
+    if not task_id or not isinstance(task_id, str):
+        return jsonify({"error": "Missing taskId"}), 400
+    
+    logger.info(f"NanobananaAPI callback for task {task_id}: {payload}")
+    result = data.get('info') or data.get('response')
+    result_url = result.get('resultImageUrl') if isinstance(result, dict) else None
+    
+    if payload.get('code') != 200:
+        tracked = image_editor.poller.resolve(task_id, error=Exception(f"Task failed: {payload.get('msg', 'Unknown error')}"))
+    elif result_url:
+        tracked = image_editor.poller.resolve(task_id, result_url)
+    else:
+        # Completion without a result URL: confirm through record-info right away
+        tracked = image_editor.poller.poll_now(task_id)
+    
+    if not tracked:
+        return jsonify({"error": "Unknown or finished task"}), 404
+    return jsonify({"success": True})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({"status": "healthy", "message": "Outfit Assistant API is running"})
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Counters and latency timings collected by this process"""
+    return jsonify({
+        "success": True,
+        "metrics": metrics.snapshot(),
+        "circuits": http_client.circuit_states(),
+        "upstreams": {
+            limiter.name: limiter.state()
+            for limiter in (openai_limiter, fal_limiter, nanobanana_limiter)
+        }
+    })
+
+RATING_MAX_TOKENS = 1500
+
+
+def prepare_rating_request(data):
+    """
+    Validate a rate-outfit request body and prepare its photo
+
+    Returns:
+        dict: photo (image_prep.PreparedImage), prompt, its estimated tokens,
+            and the rating cache image_hash and context
+
+    Raises:
+        ValueError: If the body is not a JSON object, or the image is missing or unreadable
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    
+    image_base64 = data.get('image')
+    occasion = data.get('occasion', 'Casual Outing')
+    budget = data.get('budget', '')
+    
+    logger.info(f"Parameters - Occasion: {occasion}, Budget: {budget}")
+    
+    if not image_base64:
+        raise ValueError("No image provided")
+    
+    photo = image_prep.prepare_image(image_base64)
+    logger.info(f"Image prepared: {photo.original_bytes} -> {len(photo.data)} bytes ({photo.width}x{photo.height})")
+    
+    prompt = prompts.rating_prompt(occasion, budget)
+    return {
+        "photo": photo,
+        "prompt": prompt,
+        "tokens": prompts.estimate_request_tokens(prompt, RATING_MAX_TOKENS, images=1),
+        # Near-identical photos rated before for the same occasion and budget are reused
+        "image_hash": perceptual_cache.dhash(photo.image),
+        "cache_context": (_normalize_text(occasion), _normalize_text(budget))
+    }
+
+
+def run_rating(rating):
+    """
+    Rate a request from prepare_rating_request, reusing a cached rating if any
+
+    Returns:
+        dict: Validated rating (see model_output.Rating)
+
+    Raises:
+        model_output.ModelOutputError: If the model's answer is not a usable rating
+        admission.Overloaded: If OpenAI has no capacity for the call in time
+    """
+    cached = rating_cache.get(rating["image_hash"], rating["cache_context"])
+    if cached:
+        logger.info("Outfit rating served from cache")
+        return cached
+    
+    # Re-clicks of the same photo while it is being rated share the call
+    return rating_flight.do(
+        (rating["image_hash"], rating["cache_context"]),
+        lambda: _request_rating(rating)
+    )
+
+
+def _request_rating(rating):
+    # Call the vision model (GPT-4o)
+    with openai_limiter.admit(admission.INTERACTIVE, rating["tokens"], RATING_ADMISSION_TIMEOUT):
+        completion = vision_rater.rate(rating["prompt"], rating["photo"], RATING_MAX_TOKENS)
+    prompts.record_usage("rate_outfit", completion.usage)
+    
+    # Parse the response
+    result = model_output.parse_rating(completion.text).to_dict()
+    if completion.finish_reason != "length":
+        # Ratings repaired after being cut off are served but not reused
+        rating_cache.set(rating["image_hash"], rating["cache_context"], result)
+    return result
+
+
+def rate_batch_item(data):
+    """Prepare and rate one photo of a batch; failures become the item's error"""
+    try:
+        return {"success": True, "data": run_rating(prepare_rating_request(data))}
+    except admission.Overloaded as e:
+        return {"success": False, "error": str(e), "retry_after": e.retry_after}
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error rating batch item: {e}")
+        return {"success": False, "error": str(e)}
+
+
+def rank_ratings(items):
+    """
+    Order successfully rated items best first by overall rating
+
+    Returns:
+        list: Item indexes; failed items are left out
+    """
+    scores = [(-item["data"]["overall_rating"], index) for index, item in enumerate(items) if item["success"]]
+    return [index for _, index in sorted(scores)]
+
 @app.route('/api/rate-outfit', methods=['POST'])
 def rate_outfit():
     """
@@ -308,265 +442,430 @@ def rate_outfit():
         logger.info("RATE OUTFIT REQUEST RECEIVED")
         logger.info("="*60)
         
-        data = request.json
-        
-        # Extract parameters
-        image_base64 = data.get('image')
-        occasion = data.get('occasion', 'Casual Outing')
-        budget = data.get('budget', '')
-        
-        logger.info(f"Parameters - Occasion: {occasion}, Budget: {budget}")
-        
-        if not image_base64:
-            logger.error("No image provided in request")
-            return jsonify({"error": "No image provided"}), 400
-        
-        # Build the prompt for GPT-4 Vision
-        budget_text = f" with a budget of {budget}" if budget else ""
-        
-        prompt = f"""Analyze this outfit for a {occasion}{budget_text}.
-
-Please provide:
-1. Wow Factor Score (1-10): Rate the overall visual impact and style
-2. Occasion Fitness Score (1-10): How appropriate is this for {occasion}?
-3. Overall Rating (1-10): Combined assessment
-
-Then provide detailed feedback including:
-- Strengths of the outfit
-- Areas for improvement
-- Specific suggestions for colors, fit, accessories
-- 3-5 shopping recommendations with descriptions
-- A humorous "roast" - brutally honest, witty, and playful criticism about the outfit (2-3 sentences, make it funny but not mean-spirited)
-
-Format your response as JSON with this structure:
-{{
-  "wow_factor": <number>,
-  "occasion_fitness": <number>,
-  "overall_rating": <number>,
-  "wow_factor_explanation": "<brief explanation>",
-  "occasion_fitness_explanation": "<brief explanation>",
-  "overall_explanation": "<brief explanation>",
-  "strengths": ["<strength1>", "<strength2>", ...],
-  "improvements": ["<improvement1>", "<improvement2>", ...],
-  "suggestions": ["<suggestion1>", "<suggestion2>", ...],
-  "roast": "<humorous witty roast of the outfit>",
-  "shopping_recommendations": [
-    {{
-      "item": "<item name>",
-      "description": "<description>",
-      "price": "<estimated price>",
-      "reason": "<why this would enhance the outfit>"
-    }}
-  ]
-}}"""
-        
-        # Call OpenAI GPT-4 Vision API
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_base64
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1500,
-            response_format={"type": "json_object"}
-        )
+        try:
+            rating = prepare_rating_request(request.get_json(silent=True) or {})
+        except ValueError as e:
+            logger.warning(f"Rejected rating request: {e}")
+            return jsonify({"error": str(e)}), 400
         
-        # Parse the response
-        result = response.choices[0].message.content
+        result = run_rating(rating)
         
         return jsonify({"success": True, "data": result})
         
+    except admission.Overloaded as e:
+        return overloaded_response(e)
+    except model_output.ModelOutputError as e:
+        logger.error(f"Unusable rating from model: {e}")
+        return jsonify({"error": str(e)}), 502
     except Exception as e:
         print(f"Error in rate_outfit: {e}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/generate-outfit', methods=['POST'])
-def generate_outfit():
+@app.route('/api/rate-outfits/batch', methods=['POST'])
+def rate_outfits_batch():
     """
-    Generate outfit suggestions based on user preferences with realistic person image
+    Rate several outfit photos for the same occasion and budget in one request
+
+    Photos are rated concurrently (at most RATING_BATCH_CONCURRENCY at a time
+    across all requests), so a comparison takes about as long as its slowest
+    photo. Each item succeeds or fails on its own; with "rank": true the
+    response also lists item indexes best first.
     """
     try:
-        logger.info("="*60)
-        logger.info("GENERATE OUTFIT REQUEST RECEIVED")
-        logger.info("="*60)
-        
-        data = request.json
-        
-        # Extract parameters
-        user_image = data.get('user_image', None)
-        wow_factor = data.get('wow_factor', 5)
-        brands = data.get('brands', [])
-        budget = data.get('budget', '')
-        occasion = data.get('occasion', 'Casual Outing')
-        conditions = data.get('conditions', '')
-        
-        logger.info(f"Parameters:")
-        logger.info(f"  - Occasion: {occasion}")
-        logger.info(f"  - Wow Factor: {wow_factor}")
-        logger.info(f"  - Brands: {brands}")
-        logger.info(f"  - Budget: {budget}")
-        logger.info(f"  - Conditions: {conditions}")
-        logger.info(f"  - User image provided: {user_image is not None}")
-        
-        # Build the style description based on wow factor
-        if wow_factor <= 3:
-            style_desc = "classic, safe, and timeless"
-        elif wow_factor <= 6:
-            style_desc = "balanced, stylish, and modern"
-        else:
-            style_desc = "bold, creative, and fashion-forward"
-        
-        # Build brand preference text
-        brand_text = f" from brands like {', '.join(brands)}" if brands else ""
-        budget_text = f" within a budget of {budget}" if budget else ""
-        conditions_text = f" Additional requirements: {conditions}." if conditions else ""
-        
-        # Step 1: Generate outfit description using GPT-4
-        description_prompt = f"""Create a detailed outfit recommendation for {occasion}.
-
-Style level: {wow_factor}/10 ({style_desc})
-Preferences:{brand_text}{budget_text}
-{conditions_text}
-
-Provide:
-1. Complete outfit description (top, bottom, shoes, accessories)
-2. Color palette and why it works
-3. Style notes and occasion appropriateness
-4. 5-8 specific product recommendations with:
-   - Item type and description
-   - Estimated price
-   - Why it fits the outfit
-   
-Format as JSON:
-{{
-  "outfit_concept": "<overall concept and inspiration>",
-  "items": [
-    {{
-      "type": "<item type>",
-      "description": "<detailed description>",
-      "color": "<color>",
-      "style_notes": "<why this works>"
-    }}
-  ],
-  "color_palette": "<description of colors and why they work>",
-  "occasion_notes": "<why this works for the occasion>",
-  "product_recommendations": [
-    {{
-      "item": "<item name>",
-      "type": "<clothing type>",
-      "brand": "<suggested brand>",
-      "description": "<description>",
-      "price": "<estimated price>",
-      "reason": "<why recommended>"
-    }}
-  ]
-}}"""
-        
-        logger.info("-" * 60)
-        logger.info("GPT-4 OUTFIT DESCRIPTION PROMPT:")
-        logger.info(description_prompt)
-        logger.info("-" * 60)
-        
-        messages = [{"role": "user", "content": description_prompt}]
-        
-        # If user provided image, include it for context
-        if user_image:
-            messages = [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": description_prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": user_image}
-                        }
-                    ]
-                }
-            ]
+        data = request.json or {}
+        images = data.get('images')
+        if not isinstance(images, list) or not images:
+            return jsonify({"error": "No images provided"}), 400
+        if len(images) > RATING_BATCH_MAX_IMAGES:
+            return jsonify({"error": f"At most {RATING_BATCH_MAX_IMAGES} images per batch"}), 400
+        
+        logger.info(f"RATE OUTFITS BATCH REQUEST RECEIVED - {len(images)} images")
+        shared = {
+            "occasion": data.get('occasion', 'Casual Outing'),
+            "budget": data.get('budget', '')
+        }
+        with metrics.timer("rate_outfits.batch"):
+            items = list(rating_executor.map(
+                rate_batch_item, [dict(shared, image=image) for image in images]
+            ))
+        
+        succeeded = sum(1 for item in items if item["success"])
+        metrics.increment("rate_outfits.batch.items", len(items))
+        metrics.increment("rate_outfits.batch.failed_items", len(items) - succeeded)
+        
+        response = {
+            "success": succeeded > 0,
+            "results": [dict(item, index=index) for index, item in enumerate(items)],
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded
+        }
+        if data.get('rank'):
+            response["ranking"] = rank_ratings(items)
+        return jsonify(response)
         
+    except Exception as e:
+        print(f"Error in rate_outfits_batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/rate-outfit/stream', methods=['POST'])
+def rate_outfit_stream():
+    """
+    Rate an outfit, streaming server-sent events while GPT-4o writes the rating
+
+    Emits a 'field' event ({"name", "value"}) for each top-level rating field as
+    soon as it is complete, in the order the model writes them (scores first),
+    then 'done' with the same body as /api/rate-outfit, or 'error' (with
+    retry_after when OpenAI had no capacity for the call).
+    """
+    logger.info("RATE OUTFIT STREAM REQUEST RECEIVED")
+    try:
+        rating = prepare_rating_request(request.get_json(silent=True) or {})
+    except ValueError as e:
+        logger.warning(f"Rejected rating request: {e}")
+        return jsonify({"error": str(e)}), 400
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+    
+    def stream():
+        started = time.perf_counter()
+        cached = rating_cache.get(rating["image_hash"], rating["cache_context"])
+        if cached:
+            for name, value in cached.items():
+                yield event("field", {"name": name, "value": value})
+            yield event("done", {"success": True, "data": cached})
+            return
+        
+        parser = json_stream.ObjectStream()
+        first_field = True
+        try:
+            with openai_limiter.admit(admission.INTERACTIVE, rating["tokens"], RATING_ADMISSION_TIMEOUT):
+                for chunk in vision_rater.stream_rating(rating["prompt"], rating["photo"], RATING_MAX_TOKENS):
+                    if chunk.usage:
+                        prompts.record_usage("rate_outfit_stream", chunk.usage)
+                    if not chunk.text:
+                        continue
+                    for name, value in parser.feed(chunk.text):
+                        if first_field:
+                            metrics.observe("rate_outfit.stream.first_field", time.perf_counter() - started)
+                            first_field = False
+                        yield event("field", {"name": name, "value": value})
+            # Validates the whole rating, repairing it if the stream was cut off
+            result = model_output.parse_rating(parser.text).to_dict()
+        except admission.Overloaded as e:
+            logger.warning(f"Rating stream shed: {e}")
+            yield event("error", {"error": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            logger.error(f"Error in rate_outfit_stream: {e}")
+            yield event("error", {"error": str(e)})
+            return
+        
+        metrics.observe("rate_outfit.stream.complete", time.perf_counter() - started)
+        if parser.done:
+            rating_cache.set(rating["image_hash"], rating["cache_context"], result)
+        yield event("done", {"success": True, "data": result})
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def description_cache_key(occasion, style_desc, brands, budget, conditions, image_hash):
+    """
+    Cache key for a GPT outfit description
+
+    The wow factor is bucketed into its style description, brand order does not
+    matter, and the attached photo is part of the key because the description is
+    tailored to the person in it.
+    """
+    return make_key(
+        outfit_writer.model,
+        _normalize_text(occasion),
+        style_desc,
+        sorted({_normalize_text(brand) for brand in brands}),
+        _normalize_text(budget),
+        _normalize_text(conditions),
+        image_hash
+    )
+
+
+def upload_person_image(person_image):
+    """
+    Upload the prepared person photo to Fal CDN so NanobananaAPI can fetch it
+
+    Returns:
+        str: Public URL of the photo
+    """
+    print(f"✓ Person image prepared: {person_image.width}x{person_image.height}, {len(person_image.data)} bytes")
+    
+    # Upload straight from memory to Fal CDN to get a public URL, unless
+    # this exact photo was uploaded recently (e.g. a regeneration)
+    image_url = upload_cache.get(person_image.sha256)
+    if image_url:
+        print(f"✓ Reusing CDN upload: {image_url}")
+        logger.info(f"Reusing CDN upload for {person_image.sha256[:12]}: {image_url}")
+    else:
+        image_url = upload_flight.do(person_image.sha256, lambda: _upload_to_cdn(person_image))
+    return image_url
+
+
+def _upload_to_cdn(person_image):
+    with fal_limiter.admit(admission.BACKGROUND, timeout=GENERATION_ADMISSION_TIMEOUT):
+        image_url = image_editor.upload(person_image)
+    upload_cache.set(person_image.sha256, image_url)
+    print(f"✓ Image uploaded to CDN: {image_url}")
+    logger.info(f"Image uploaded to CDN: {image_url}")
+    return image_url
+
+
+def describe_outfit(data, person_image):
+    """
+    Ask GPT-4o for an outfit matching the request (or reuse a cached answer)
+
+    Args:
+        data: Request body of /api/generate-outfit
+        person_image: image_prep.PreparedImage of the user's photo, or None
+
+    Returns:
+        tuple: (outfit description dict, item summary for the image prompt)
+
+    Raises:
+        model_output.ModelOutputError: If the model's answer is not a usable outfit
+        admission.Overloaded: If OpenAI has no capacity for the call in time
+    """
+    wow_factor = data.get('wow_factor', 5)
+    brands = data.get('brands', [])
+    budget = data.get('budget', '')
+    occasion = data.get('occasion', 'Casual Outing')
+    conditions = data.get('conditions', '')
+    
+    # Build the style description based on wow factor
+    if wow_factor <= 3:
+        style_desc = "classic, safe, and timeless"
+    elif wow_factor <= 6:
+        style_desc = "balanced, stylish, and modern"
+    else:
+        style_desc = "bold, creative, and fashion-forward"
+    
+    # Generate outfit description using GPT-4
+    description_prompt = prompts.outfit_prompt(occasion, wow_factor, style_desc, brands, budget, conditions)
+    
+    logger.info("-" * 60)
+    logger.info("GPT-4 OUTFIT DESCRIPTION PROMPT:")
+    logger.info(description_prompt)
+    logger.info("-" * 60)
+    
+    # "Surprise me" requests (e.g. regenerations) always ask for a fresh outfit
+    cache_key = None
+    if not data.get('surprise_me'):
+        cache_key = description_cache_key(
+            occasion, style_desc, brands, budget, conditions,
+            person_image.sha256 if person_image else None
+        )
+    
+    def cached_description():
+        outfit_description = description_cache.get(cache_key)
+        return model_output.parse_outfit(outfit_description) if outfit_description else None
+    
+    def request_description():
         logger.info("Calling GPT-4 API...")
-        description_response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=1500,
-            response_format={"type": "json_object"}
+        tokens = prompts.estimate_request_tokens(
+            description_prompt, DESCRIPTION_MAX_TOKENS, images=1 if person_image else 0
         )
+        # The user's photo, if any, is included for context
+        with openai_limiter.admit(admission.BACKGROUND, tokens, GENERATION_ADMISSION_TIMEOUT):
+            completion = outfit_writer.describe(description_prompt, person_image, DESCRIPTION_MAX_TOKENS)
+        prompts.record_usage("generate_outfit", completion.usage)
         
-        outfit_description = description_response.choices[0].message.content
+        outfit_description = completion.text
         logger.info("GPT-4 Response received")
         logger.info(f"Outfit Description: {outfit_description[:500]}...")
         
-        outfit_data = eval(outfit_description)  # Parse for outfit details
-        
-        # Build detailed outfit description for image generation
-        outfit_details = " ".join([f"{item['description']} in {item['color']}" for item in outfit_data.get('items', [])])
-        
-        # Step 3: Determine appropriate background based on occasion
-        background_map = {
-            'Job Interview': 'professional office lobby with modern corporate interior',
-            'Casual Outing': 'trendy urban street with stylish storefronts and natural daylight',
-            'Formal Event': 'elegant ballroom with chandeliers and sophisticated ambiance',
-            'Date Night': 'upscale restaurant interior with romantic lighting',
-            'Business Meeting': 'contemporary conference room with glass walls',
-            'Professional/Formal': 'elegant professional setting with modern corporate interior or sophisticated ballroom ambiance',
-            'Wedding Guest': 'beautiful outdoor garden venue with floral decorations',
-            'Garden Party': 'elegant outdoor garden party setting with lush greenery, flowers, and natural daylight',
-            'Beach/Resort': 'pristine sandy beach with turquoise ocean water and tropical scenery',
-            'Gym/Athletic': 'modern fitness center or outdoor athletic track',
-            'Party/Club': 'stylish nightclub interior with ambient lighting',
-            'Halloween': 'festive Halloween party setting with atmospheric decorations',
-            'Travel': 'airport terminal or scenic travel destination'
-        }
+        outfit = model_output.parse_outfit(outfit_description)
+        if cache_key:
+            # Only cache descriptions that parsed
+            description_cache.set(cache_key, outfit_description)
+        return outfit
+    
+    outfit = cached_description() if cache_key else None
+    if outfit:
+        logger.info("GPT-4 outfit description served from cache")
+    elif cache_key:
+        # Identical requests in flight (double submits, popular presets) share one call
+        outfit = description_flight.do(cache_key, request_description, recheck=cached_description)
+    else:
+        outfit = request_description()
+    
+    # Build detailed outfit description for image generation
+    return outfit.to_dict(), outfit.summary()
+
+
+def run_outfit_generation(data, progress):
+    """
+    Outfit generation pipeline, executed on the job worker pool
+
+    The photo upload and the GPT-4o description only need the prepared photo,
+    so they run concurrently; the NanobananaAPI task waits for both.
+
+    Args:
+        data: Request body of /api/generate-outfit
+        progress: Callable(stage) reporting the current pipeline stage
 
-        # Get background or use neutral elegant backdrop as fallback
-        background = background_map.get(occasion, 'elegant neutral backdrop with natural lighting')
+    Returns:
+        dict: Response payload with outfit_description and outfit_image_url
+    """
+    occasion = data.get('occasion', 'Casual Outing')
+    conditions = data.get('conditions', '')
+    
+    # Determine appropriate background based on occasion
+    background_map = {
+        'Job Interview': 'professional office lobby with modern corporate interior',
+        'Casual Outing': 'trendy urban street with stylish storefronts and natural daylight',
+        'Formal Event': 'elegant ballroom with chandeliers and sophisticated ambiance',
+        'Date Night': 'upscale restaurant interior with romantic lighting',
+        'Business Meeting': 'contemporary conference room with glass walls',
+        'Professional/Formal': 'elegant professional setting with modern corporate interior or sophisticated ballroom ambiance',
+        'Wedding Guest': 'beautiful outdoor garden venue with floral decorations',
+        'Garden Party': 'elegant outdoor garden party setting with lush greenery, flowers, and natural daylight',
+        'Beach/Resort': 'pristine sandy beach with turquoise ocean water and tropical scenery',
+        'Gym/Athletic': 'modern fitness center or outdoor athletic track',
+        'Party/Club': 'stylish nightclub interior with ambient lighting',
+        'Halloween': 'festive Halloween party setting with atmospheric decorations',
+        'Travel': 'airport terminal or scenic travel destination'
+    }
+
+    # Get background or use neutral elegant backdrop as fallback
+    background = background_map.get(occasion, 'elegant neutral backdrop with natural lighting')
+    
+    logger.info(f"Background selected: {background}")
+    
+    def generate_image(person_image_url, description):
+        logger.info(f"Outfit details for image: {description[1]}")
+        
+        def run_task():
+            # A slot is held from task submission until the image is downloaded
+            with nanobanana_limiter.admit(admission.BACKGROUND, timeout=GENERATION_ADMISSION_TIMEOUT):
+                return generate_outfit_image_with_replicate(
+                    person_image_url,
+                    description[1],
+                    occasion,
+                    background,
+                    conditions
+                )
+        
+        # Identical generations in flight (e.g. a double submit) share one task
+        image_url = image_flight.do(
+            make_key(person_image_url, description[1], occasion, background, conditions),
+            run_task
+        )
+        if not image_url:
+            raise Exception("NanobananaAPI generation returned None. Check logs above for specific error.")
+        return image_url
+    
+    flow = pipeline.Pipeline("generate_outfit", stage_executor)
+    flow.stage("preparing_image", lambda: image_prep.prepare_image(data.get('user_image')))
+    flow.stage("uploading_image", upload_person_image, "preparing_image")
+    flow.stage("describing_outfit", lambda person_image: describe_outfit(data, person_image), "preparing_image")
+    flow.stage("generating_image", generate_image, "uploading_image", "describing_outfit")
+    results = flow.run(progress)
+    logger.info("Stage timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in flow.timings.items()))
+    
+    return {
+        "success": True,
+        "outfit_description": results["describing_outfit"][0],
+        "outfit_image_url": results["generating_image"]
+    }
+
+@app.route('/api/generate-outfit', methods=['POST'])
+def generate_outfit():
+    """
+    Generate outfit suggestions based on user preferences with realistic person image
+
+    The pipeline runs in the background; responds 202 with a job id to poll at
+    /api/jobs/<job_id>
+    """
+    try:
+        logger.info("="*60)
+        logger.info("GENERATE OUTFIT REQUEST RECEIVED")
+        logger.info("="*60)
         
-        logger.info(f"Background selected: {background}")
-        logger.info(f"Outfit details for image: {outfit_details}")
+        data = request.json
         
-        # Step 4: Generate realistic outfit image using NanobananaAPI
-        # Verify prerequisites
-        if not user_image:
-            raise ValueError("No user image provided. Image generation requires a user photo.")
+        logger.info(f"Parameters:")
+        logger.info(f"  - Occasion: {data.get('occasion', 'Casual Outing')}")
+        logger.info(f"  - Wow Factor: {data.get('wow_factor', 5)}")
+        logger.info(f"  - Brands: {data.get('brands', [])}")
+        logger.info(f"  - Budget: {data.get('budget', '')}")
+        logger.info(f"  - Conditions: {data.get('conditions', '')}")
+        logger.info(f"  - User image provided: {data.get('user_image') is not None}")
         
-        nanobanana_api_key = os.getenv('NANOBANANA_API_KEY')
-        if not nanobanana_api_key:
-            raise ValueError("NANOBANANA_API_KEY not configured. Please add it to your .env file.")
+        # Verify prerequisites before queueing
+        if not data.get('user_image'):
+            return jsonify({"error": "No user image provided. Image generation requires a user photo."}), 400
         
-        # Call NanobananaAPI image generation
-        image_url = generate_outfit_image_with_replicate(
-            user_image, 
-            outfit_details,
-            occasion,
-            background,
-            conditions
-        )
+        configuration_error = image_editor.missing_configuration()
+        if configuration_error:
+            return jsonify({"error": configuration_error}), 500
         
-        if not image_url:
-            raise Exception("NanobananaAPI generation returned None. Check logs above for specific error.")
+        job = job_queue.submit("generate_outfit", run_outfit_generation, data)
+        logger.info(f"Outfit generation queued - Job: {job['job_id']}")
         
         return jsonify({
             "success": True,
-            "outfit_description": outfit_description,
-            "outfit_image_url": image_url
-        })
-        
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": url_for('get_job_status', job_id=job["job_id"])
+        }), 202
+        
+    except jobs.QueueFullError as e:
+        logger.warning(f"Outfit generation rejected: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         print(f"Error in generate_outfit: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Get the status of a background job; result is set once status is 'succeeded'
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"success": True, **job})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Server-sent events for a background job: one 'status' event per change and
+    a final 'done' event once it has succeeded or failed
+    """
+    if not job_queue.get(job_id):
+        return jsonify({"error": "Job not found"}), 404
+
+    def stream():
+        version = None
+        while True:
+            job = job_queue.wait(job_id, version, timeout=15)
+            if job is None:
+                return
+            if job["version"] == version:
+                yield ": keepalive\n\n"
+                continue
+            version = job["version"]
+            finished = job["status"] in jobs.FINISHED_STATUSES
+            yield f"event: {'done' if finished else 'status'}\ndata: {json.dumps(job)}\n\n"
+            if finished:
+                return
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 @app.route('/api/regenerate-outfit', methods=['POST'])
 def regenerate_outfit():
     """
@@ -638,6 +937,9 @@ def submit_to_arena():
             "submission": submission
         })
         
+    except ValueError as e:
+        logger.warning(f"Rejected submission: {e}")
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in submit_to_arena: {e}")
         return jsonify({"error": str(e)}), 500
@@ -646,35 +948,103 @@ def submit_to_arena():
 def get_arena_submissions():
     """
     Get all Fashion Arena submissions
+
+    Supports keyset pagination with ?cursor=<next_cursor> (pass an empty
+    cursor for the first page) and the older ?page=<n> offset pagination.
     """
     try:
         sort_by = request.args.get('sort_by', 'recent')
+        cursor = request.args.get('cursor')
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
         
-        submissions, total_count = fashion_arena.get_all_submissions(sort_by=sort_by, page=page, limit=limit)
+        if cursor is not None:
+            submissions, total_count, next_cursor = fashion_arena.get_submissions_after(
+                sort_by=sort_by, cursor=cursor, limit=limit
+            )
+        else:
+            submissions, total_count = fashion_arena.get_all_submissions(sort_by=sort_by, page=page, limit=limit)
+            has_more = submissions and page * limit < total_count
+            next_cursor = fashion_arena.encode_cursor(sort_by, submissions[-1]) if has_more else None
         
-        # Remove photo data to reduce payload size (send thumbnails separately if needed)
+        # Photos are served separately from /api/arena/photo/<hash>
         for sub in submissions:
-            if 'photo' in sub:
-                # Keep only first 100 chars of base64 for preview indicator
-                sub['has_photo'] = bool(sub['photo'])
-                # Don't remove photo completely for now, client needs it
-                # sub.pop('photo')
+            sub['has_photo'] = bool(sub.get('photo_hash'))
+            add_photo_urls(sub)
         
-        return jsonify({
+        response = {
             "success": True,
             "submissions": submissions,
             "total": total_count,
-            "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit
-        })
+            "next_cursor": next_cursor
+        }
+        if cursor is None:
+            response["page"] = page
+            response["total_pages"] = (total_count + limit - 1) // limit
+        
+        return jsonify(response)
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in get_arena_submissions: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/arena/photo/<photo_hash>', methods=['GET'])
+def get_arena_photo(photo_hash):
+    """
+    Serve a Fashion Arena photo by its SHA-256 content hash
+    """
+    try:
+        path = fashion_arena.get_photo_path(photo_hash)
+        
+        if not path:
+            return jsonify({"error": "Photo not found"}), 404
+        
+        # Content-addressed: the hash is a strong ETag and the bytes never change
+        response = send_file(
+            path,
+            mimetype=fashion_arena.photo_store.content_type(photo_hash),
+            etag=photo_hash,
+            max_age=31536000,
+            conditional=True
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error in get_arena_photo: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/arena/photo/<photo_hash>/<int:size>.<ext>', methods=['GET'])
+def get_arena_photo_rendition(photo_hash, size, ext):
+    """
+    Serve a resized rendition of a Fashion Arena photo
+    """
+    try:
+        path = fashion_arena.get_rendition_path(photo_hash, size, ext)
+        
+        if not path:
+            return jsonify({"error": "Photo not found"}), 404
+        
+        _, mimetype = arena_photos.RENDITION_FORMATS[ext]
+        response = send_file(
+            path,
+            mimetype=mimetype,
+            etag=f"{photo_hash}-{size}-{ext}",
+            max_age=31536000,
+            conditional=True
+        )
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error in get_arena_photo_rendition: {e}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/arena/leaderboard', methods=['GET'])
 def get_arena_leaderboard():
     """
@@ -682,13 +1052,15 @@ def get_arena_leaderboard():
     """
     try:
         limit = int(request.args.get('limit', 10))
-        leaderboard = fashion_arena.get_leaderboard(limit=limit)
+        leaderboard = [add_photo_urls(sub) for sub in fashion_arena.get_leaderboard(limit=limit)]
         
         return jsonify({
             "success": True,
             "leaderboard": leaderboard
         })
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in get_arena_leaderboard: {e}")
         return jsonify({"error": str(e)}), 500
@@ -750,7 +1122,7 @@ def get_submission_details(submission_id):
         
         return jsonify({
             "success": True,
-            "submission": submission
+            "submission": add_photo_urls(submission)
         })
         
     except Exception as e:
@@ -0,0 +1,300 @@
+"""
+Fashion Arena Counters - Write-behind buffering for likes and votes
+
+Likes are acknowledged as soon as they are appended to a durable intent log
+and applied to the in-memory index. Votes live in their own log; for them the
+counters only re-derive the submission's fields (rating aggregates, and
+total_votes as likes plus current upvotes) and queue it for flushing. Aggregated
+like deltas, plus the derived fields, are flushed to storage every
+ARENA_FLUSH_INTERVAL_MS or ARENA_FLUSH_MAX_OPS operations, whichever comes
+first. Intent log segments are only deleted once their flush has committed,
+and the last applied segment is recorded in the same transaction, so a crash
+at any point loses nothing and applies nothing twice. A vote whose refresh
+never reached storage is repaired on the next startup, which re-derives every
+submission from the vote log.
+
+Each process writes its own log (<log_id>.<segment>.log) and holds a lock on
+<log_id>.lock while alive; on startup, logs whose lock is free belonged to a
+process that died and are replayed.
+"""
+import json
+import os
+import threading
+import uuid
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process assumed, every other log is orphaned
+    fcntl = None
+
+COUNTER_DELTA_FIELDS = ("likes",)
+APPLIED_SEGMENT_KEY = "intent_log_applied:{log_id}"
+
+
+def apply_deltas(submission, delta):
+    """Add counter deltas to a submission"""
+    for field in COUNTER_DELTA_FIELDS:
+        submission[field] = submission.get(field, 0) + delta.get(field, 0)
+
+
+class WriteBehindCounters:
+    """Buffers like/vote deltas in memory, backed by an append-only intent log"""
+
+    def __init__(self, writer, index, log_dir, flush_interval_ms=500, max_batch=200, fsync=True,
+                 derived=None):
+        """
+        Args:
+            writer: ArenaWriter used for flushes
+            index: ArenaIndex updated as changes arrive
+            log_dir: Directory for the intent logs
+            flush_interval_ms: Maximum time a change stays buffered
+            max_batch: Number of buffered changes that triggers an early flush
+            fsync: fsync the intent log after every append
+            derived: Optional callable(submission) returning absolute field
+                values derived from other sources (e.g. the vote log), applied
+                after every change and written with every flush
+        """
+        self.writer = writer
+        self.index = index
+        self.log_dir = log_dir
+        self.derived = derived
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.fsync = fsync
+
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending_deltas = {}
+        self._pending_ops = 0
+        # Segments whose flush failed; retried with the next flush
+        self._unflushed_segments = []
+        # Whether a flush has recorded this log's applied segment in storage meta
+        self._flushed = False
+        self._closed = False
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._log_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock_file = open(os.path.join(self.log_dir, f"{self._log_id}.lock"), 'w')
+        if fcntl is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        self._replay_orphans()
+        self._segment = 1
+        self._log = open(self._segment_path(self._log_id, self._segment), 'a')
+
+        self._thread = threading.Thread(target=self._run, name="arena-flusher", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Intent log
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, log_id, segment):
+        return os.path.join(self.log_dir, f"{log_id}.{segment:012d}.log")
+
+    def _segments(self, log_id):
+        prefix = f"{log_id}."
+        return sorted(
+            int(name[len(prefix):-4]) for name in os.listdir(self.log_dir)
+            if name.startswith(prefix) and name.endswith(".log")
+        )
+
+    def _claim_orphan(self, log_id):
+        """Lock another process's log if that process is gone; returns the lock file or None"""
+        lock_file = open(os.path.join(self.log_dir, f"{log_id}.lock"), 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    def _append(self, intent):
+        self._log.write(json.dumps(intent) + "\n")
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+
+    def _replay_orphans(self):
+        """Apply intent logs left behind by processes that crashed or exited unflushed"""
+        log_ids = {
+            name[:-5] for name in os.listdir(self.log_dir)
+            if name.endswith(".lock") and name[:-5] != self._log_id
+        }
+        for log_id in sorted(log_ids):
+            lock_file = self._claim_orphan(log_id)
+            if lock_file is None:
+                continue
+            with lock_file:
+                self._replay(log_id)
+
+    def _replay(self, log_id):
+        applied_key = APPLIED_SEGMENT_KEY.format(log_id=log_id)
+        applied = self.writer.storage.get_meta(applied_key) or 0
+        deltas, replayed = {}, []
+        for segment in self._segments(log_id):
+            if segment > applied:
+                with open(self._segment_path(log_id, segment), 'r') as f:
+                    for line in f:
+                        try:
+                            intent = json.loads(line)
+                        except ValueError:
+                            # Torn final write from a crash; everything before it is intact
+                            continue
+                        self._merge(deltas, intent)
+            replayed.append(segment)
+
+        if deltas:
+            self._commit(log_id, deltas, replayed[-1])
+            print(f"Replayed Fashion Arena intent log {log_id} ({len(deltas)} submissions)")
+        for segment in replayed:
+            os.unlink(self._segment_path(log_id, segment))
+        if applied:
+            self.writer.execute(lambda storage: storage.delete_meta(applied_key))
+        os.unlink(os.path.join(self.log_dir, f"{log_id}.lock"))
+
+    @staticmethod
+    def _merge(deltas, intent):
+        delta = deltas.setdefault(intent["submission_id"], dict.fromkeys(COUNTER_DELTA_FIELDS, 0))
+        for field in COUNTER_DELTA_FIELDS:
+            delta[field] += intent["delta"].get(field, 0)
+
+    # ------------------------------------------------------------------
+    # Ingestion
+    # ------------------------------------------------------------------
+
+    def _apply(self, submission, delta):
+        """Add a counter delta to a submission and re-derive its other fields"""
+        apply_deltas(submission, delta)
+        if self.derived:
+            submission.update(self.derived(submission))
+
+    def _record(self, submission_id, delta):
+        """Log a counter delta, then apply it to the index and queue it for flushing"""
+        if self.index.get(submission_id) is None:
+            return None
+
+        intent = {"submission_id": submission_id, "delta": delta}
+        if any(delta.values()):
+            # Durable before the change becomes visible
+            self._append(intent)
+        updated = self.index.update(submission_id, lambda record: self._apply(record, delta))
+        if updated is None:
+            return None  # Deleted meanwhile; flushes skip missing submissions
+        self._merge(self._pending_deltas, intent)
+
+        self._pending_ops += 1
+        if self._pending_ops >= self.max_batch:
+            self._lock.notify()
+        return updated
+
+    def like(self, submission_id):
+        """Add one like; returns the updated submission or None if not found"""
+        with self._lock:
+            updated = self._record(submission_id, {"likes": 1})
+        metrics.increment("arena.likes")
+        return updated
+
+    def refresh(self, submission_id):
+        """
+        Re-derive a submission's fields after their source changed, e.g. a new
+        vote was logged, and queue them for flushing
+
+        Returns:
+            dict: Updated submission or None if not found
+        """
+        with self._lock:
+            return self._record(submission_id, dict.fromkeys(COUNTER_DELTA_FIELDS, 0))
+
+    def rebuild_index(self, load):
+        """
+        Rebuild the index from storage, keeping changes that are not flushed yet
+
+        Args:
+            load: Callable returning every stored submission. It is called while
+                flushes and new changes are held off, so each buffered delta is
+                either already in storage or re-applied here, never both.
+        """
+        with self._flush_lock, self._lock:
+            self.index.rebuild(load())
+            for submission_id, delta in self._pending_deltas.items():
+                self.index.update(submission_id, lambda record, delta=delta: self._apply(record, delta))
+
+    # ------------------------------------------------------------------
+    # Flushing
+    # ------------------------------------------------------------------
+
+    def _commit(self, log_id, deltas, segment):
+        """Write aggregated deltas in one transaction, marking segment as applied"""
+        def apply(storage):
+            for submission_id, delta in deltas.items():
+                submission = storage.get_submission(submission_id)
+                if not submission:
+                    continue
+                self._apply(submission, delta)
+                storage.update_submission(submission)
+            storage.set_meta(APPLIED_SEGMENT_KEY.format(log_id=log_id), segment)
+
+        self.writer.execute(apply)
+
+    def flush(self):
+        """Flush all buffered deltas to storage now"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_ops:
+                    return
+                deltas, ops = self._pending_deltas, self._pending_ops
+                segments = self._unflushed_segments + [self._segment]
+                self._pending_deltas, self._pending_ops = {}, 0
+                self._unflushed_segments = []
+
+                # Start a new segment; the old ones are deleted once committed
+                self._log.close()
+                self._segment += 1
+                self._log = open(self._segment_path(self._log_id, self._segment), 'a')
+
+            try:
+                with metrics.timer("arena.flush"):
+                    self._commit(self._log_id, deltas, segments[-1])
+            except Exception as e:
+                print(f"Error flushing Fashion Arena counters: {e}")
+                metrics.increment("arena.flush_errors")
+                # Put everything back so the next flush retries it
+                with self._lock:
+                    for submission_id, delta in deltas.items():
+                        self._merge(self._pending_deltas, {"submission_id": submission_id, "delta": delta})
+                    self._pending_ops += ops
+                    self._unflushed_segments = segments
+                return
+
+            self._flushed = True
+            for segment in segments:
+                os.unlink(self._segment_path(self._log_id, segment))
+            metrics.increment("arena.flushes")
+            metrics.increment("arena.flushed_ops", ops)
+
+    def close(self):
+        """Flush and remove this process's log; called on clean shutdown, safe to call again"""
+        if self._closed:
+            return
+        self.flush()
+        with self._lock:
+            if self._pending_ops:
+                return  # Flush failed; leave the log for the next startup to replay
+            if self._flushed:
+                # Nothing is left to replay, so the applied-segment marker can go too
+                applied_key = APPLIED_SEGMENT_KEY.format(log_id=self._log_id)
+                self.writer.execute(lambda storage: storage.delete_meta(applied_key))
+            self._closed = True
+            self._log.close()
+            os.unlink(self._segment_path(self._log_id, self._segment))
+            os.unlink(self._lock_file.name)
+            self._lock_file.close()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._pending_ops >= self.max_batch, timeout=self.flush_interval)
+            self.flush()
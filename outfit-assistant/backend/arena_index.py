@@ -0,0 +1,134 @@
+"""
+Fashion Arena Index - In-process ranked indexes over arena submissions
+
+Keeps every submission record in memory together with one sorted structure per
+sort order, so listings and the leaderboard never sort the whole arena.
+
+Sort keys are held in a sortedcontainers SortedList, so every re-rank is an
+O(log n) insert and removal.
+"""
+import threading
+
+from sortedcontainers import SortedList
+
+from arena_storage import SORT_ORDERS, sort_key
+
+
+class RankedIndex:
+    """Submission sort keys for one sort order, kept in ascending order"""
+
+    def __init__(self, sort_by):
+        self.sort_by = sort_by
+        self._keys = SortedList()
+        self._key_by_id = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, submission):
+        key = sort_key(submission, self.sort_by)
+        if self._key_by_id.get(submission["id"]) == key:
+            return
+        self.remove(submission["id"])
+        self._keys.add(key)
+        self._key_by_id[submission["id"]] = key
+
+    def remove(self, submission_id):
+        key = self._key_by_id.pop(submission_id, None)
+        if key is not None:
+            self._keys.remove(key)
+
+    def descending(self, offset, limit):
+        """Return the ids ranked offset..offset+limit, best first"""
+        end = len(self._keys) - offset
+        start = max(end - limit, 0)
+        return [key[-1] for key in reversed(self._keys[start:max(end, 0)])]
+
+    def descending_after(self, key, limit):
+        """Return up to limit ids ranked strictly after key, best first"""
+        end = self._keys.bisect_left(key)
+        start = max(end - limit, 0)
+        return [entry[-1] for entry in reversed(self._keys[start:end])]
+
+
+class ArenaIndex:
+    """Submission records plus a RankedIndex for every sort order"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = {}
+        self._ranks = {sort_by: RankedIndex(sort_by) for sort_by in SORT_ORDERS}
+
+    def rebuild(self, submissions):
+        """Replace the index contents with the given submissions"""
+        with self._lock:
+            self._records = {}
+            self._ranks = {sort_by: RankedIndex(sort_by) for sort_by in SORT_ORDERS}
+            for submission in submissions:
+                self.put(submission)
+
+    def put(self, submission):
+        """Add a submission or re-rank it after its counters changed"""
+        with self._lock:
+            self._records[submission["id"]] = dict(submission)
+            for rank in self._ranks.values():
+                rank.add(submission)
+
+    def update(self, submission_id, change):
+        """
+        Apply change(record) to a stored record in place and re-rank it
+
+        Returns:
+            dict: Copy of the updated record, or None if the submission is not indexed
+        """
+        with self._lock:
+            record = self._records.get(submission_id)
+            if record is None:
+                return None
+            change(record)
+            for rank in self._ranks.values():
+                rank.add(record)
+            return dict(record)
+
+    def remove(self, submission_id):
+        with self._lock:
+            self._records.pop(submission_id, None)
+            for rank in self._ranks.values():
+                rank.remove(submission_id)
+
+    def get(self, submission_id):
+        """Return a copy of a submission record, or None"""
+        with self._lock:
+            record = self._records.get(submission_id)
+            return dict(record) if record else None
+
+    def page(self, sort_by, offset, limit):
+        """
+        Return one page of a sort order
+
+        Returns:
+            tuple: (list of submission copies, total_count)
+        """
+        with self._lock:
+            ids = self._ranks[sort_by].descending(offset, limit)
+            return [dict(self._records[i]) for i in ids], len(self._records)
+
+    def page_after(self, sort_by, key, limit):
+        """
+        Return the page that follows a (sort key, id) position
+
+        Args:
+            sort_by: Sort order name
+            key: Sort key tuple of the last item seen, or None for the first page
+            limit: Maximum number of submissions to return
+
+        Returns:
+            tuple: (list of submission copies, total_count)
+        """
+        with self._lock:
+            rank = self._ranks[sort_by]
+            if key is None:
+                ids = rank.descending(0, limit)
+            else:
+                ids = rank.descending_after(key, limit)
+            return [dict(self._records[i]) for i in ids], len(self._records)
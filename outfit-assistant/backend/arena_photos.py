@@ -0,0 +1,177 @@
+"""
+Fashion Arena Photos - Content-addressed blob store for submission images
+
+Photos are decoded once at submit time and written as binary files named by
+the SHA-256 of their bytes, so identical uploads share a single file. Resized
+renditions for the arena grid and leaderboard are generated in the background.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image, ImageOps, features
+
+from image_prep import decode_data_url
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Longest edge in pixels of each generated rendition
+RENDITION_SIZES = (128, 320, 1024)
+
+# Rendition formats: file extension -> (Pillow format, content type)
+RENDITION_FORMATS = {'jpg': ('JPEG', 'image/jpeg')}
+if features.check('webp'):
+    RENDITION_FORMATS['webp'] = ('WEBP', 'image/webp')
+
+RENDITION_QUALITY = 82
+
+# Magic numbers for the formats browsers send us
+CONTENT_TYPES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+)
+
+
+def _write_atomic(path, data):
+    """Write bytes to path via a temp file so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def guess_content_type(data):
+    """Sniff the image content type from its leading bytes"""
+    for magic, content_type in CONTENT_TYPES:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+class PhotoStore:
+    """Stores photos on disk under <root>/<hash[:2]>/<hash>"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        # Single background worker so rendition work never competes with requests
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="arena-renditions")
+
+    def path_for(self, photo_hash):
+        """Return the file path for a hash, or None if the hash is malformed"""
+        if not HASH_PATTERN.match(photo_hash or ''):
+            return None
+        return os.path.join(self.root, photo_hash[:2], photo_hash)
+
+    def exists(self, photo_hash):
+        path = self.path_for(photo_hash)
+        return path is not None and os.path.exists(path)
+
+    def put(self, photo):
+        """
+        Decode and store a photo
+
+        Args:
+            photo: Image bytes, or base64 optionally with a data URL prefix
+
+        Returns:
+            dict: photo_hash, photo_width, photo_height and photo_bytes for the submission
+
+        Raises:
+            ValueError: If the data is not a readable image
+        """
+        data = photo if isinstance(photo, bytes) else decode_data_url(photo)
+        try:
+            width, height = Image.open(BytesIO(data)).size
+        except Exception:
+            raise ValueError("Invalid photo data. Could not read image.")
+
+        photo_hash = hashlib.sha256(data).hexdigest()
+        path = self.path_for(photo_hash)
+        if not os.path.exists(path):
+            # Identical photos dedupe to the same file
+            _write_atomic(path, data)
+
+        return {
+            "photo_hash": photo_hash,
+            "photo_width": width,
+            "photo_height": height,
+            "photo_bytes": len(data)
+        }
+
+    def content_type(self, photo_hash):
+        """Return the content type of a stored photo"""
+        with open(self.path_for(photo_hash), 'rb') as f:
+            return guess_content_type(f.read(16))
+
+    def rendition_path(self, photo_hash, size, ext):
+        """Return the file path of a rendition, or None if the request is invalid"""
+        if size not in RENDITION_SIZES or ext not in RENDITION_FORMATS:
+            return None
+        if not HASH_PATTERN.match(photo_hash or ''):
+            return None
+        return os.path.join(self.root, "renditions", photo_hash[:2], f"{photo_hash}_{size}.{ext}")
+
+    def generate_renditions(self, photo_hash):
+        """
+        Create every missing rendition of a stored photo
+
+        Returns:
+            int: Number of rendition files written
+        """
+        missing = [
+            (size, ext) for size in RENDITION_SIZES for ext in RENDITION_FORMATS
+            if not os.path.exists(self.rendition_path(photo_hash, size, ext))
+        ]
+        if not missing:
+            return 0
+
+        with Image.open(self.path_for(photo_hash)) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+        # Largest first so each smaller rendition downsamples the previous one
+        for size in sorted({size for size, _ in missing}, reverse=True):
+            if max(image.size) > size:
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for ext in RENDITION_FORMATS:
+                if (size, ext) not in missing:
+                    continue
+                pil_format, _ = RENDITION_FORMATS[ext]
+                buffer = BytesIO()
+                image.save(buffer, format=pil_format, quality=RENDITION_QUALITY, optimize=True)
+                _write_atomic(self.rendition_path(photo_hash, size, ext), buffer.getvalue())
+        return len(missing)
+
+    def schedule_renditions(self, photo_hash):
+        """Generate renditions in the background worker"""
+        future = self._executor.submit(self.generate_renditions, photo_hash)
+        future.add_done_callback(_log_rendition_failure)
+        return future
+
+    def get_rendition(self, photo_hash, size, ext):
+        """
+        Return the path of a rendition, generating it inline if the worker has not yet
+
+        Returns:
+            str: File path, or None if the photo or rendition spec does not exist
+        """
+        path = self.rendition_path(photo_hash, size, ext)
+        if path is None or not self.exists(photo_hash):
+            return None
+        if not os.path.exists(path):
+            self.generate_renditions(photo_hash)
+        return path
+
+
+def _log_rendition_failure(future):
+    error = future.exception()
+    if error:
+        print(f"Error generating arena renditions: {error}")
@@ -0,0 +1,515 @@
+"""
+Fashion Arena Storage - Pluggable persistence backends for submissions and votes
+
+SQLite (WAL mode) is the default backend. The original whole-file JSON store is
+kept as a legacy adapter and can be selected with ARENA_STORAGE=json.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock for the JSON adapter
+    fcntl = None
+
+# Submission fields stored in their own columns; everything else lives in `data`
+COUNTER_FIELDS = ("total_votes", "total_rating", "vote_count", "average_rating")
+
+# Sort orders shared by every backend: (sort key fields, descending), ties broken by id
+SORT_ORDERS = {
+    "recent": ("created_at",),
+    "top_voted": ("total_votes",),
+    "top_rated": ("average_rating", "total_votes"),
+}
+
+
+def sort_key(submission, sort_by):
+    """Return the ordering tuple for a submission under the given sort"""
+    fields = SORT_ORDERS.get(sort_by, SORT_ORDERS["recent"])
+    return tuple(submission.get(field, 0) for field in fields) + (submission["id"],)
+
+
+def vote_key(submission_id, voter_id):
+    """Key used for votes in the legacy JSON document"""
+    return f"{submission_id}_{voter_id}"
+
+
+class ArenaStorage(ABC):
+    """Interface implemented by the Fashion Arena storage backends"""
+
+    name = "base"
+
+    @abstractmethod
+    def transaction(self):
+        """Group several operations into one atomic write (a context manager)"""
+
+    @abstractmethod
+    def get_submission(self, submission_id):
+        ...
+
+    @abstractmethod
+    def list_submissions(self):
+        ...
+
+    @abstractmethod
+    def page_submissions(self, sort_by, offset, limit):
+        """Return (submissions, total_count) for one page of a sort order"""
+
+    @abstractmethod
+    def add_submission(self, submission):
+        ...
+
+    @abstractmethod
+    def update_submission(self, submission):
+        ...
+
+    @abstractmethod
+    def delete_submission(self, submission_id):
+        ...
+
+    @abstractmethod
+    def get_vote(self, submission_id, voter_id):
+        ...
+
+    @abstractmethod
+    def save_vote(self, vote):
+        ...
+
+    @abstractmethod
+    def get_stats(self):
+        ...
+
+    @abstractmethod
+    def get_meta(self, key):
+        """Read a small bookkeeping value (e.g. the last applied intent log segment)"""
+
+    @abstractmethod
+    def set_meta(self, key, value):
+        ...
+
+    @abstractmethod
+    def delete_meta(self, key):
+        ...
+
+    @abstractmethod
+    def replace_all(self, data):
+        """Replace the whole store with a {'submissions': [...], 'votes': {...}} document"""
+
+    @abstractmethod
+    def export(self):
+        """Dump the whole store in the legacy JSON document format"""
+
+
+class JSONStorage(ArenaStorage):
+    """Legacy adapter: the whole arena lives in a single JSON document"""
+
+    name = "json"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if not os.path.exists(self.path):
+            self._write({"submissions": [], "votes": {}})
+
+    def _read(self):
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def _write(self, data):
+        # Write to a temp file and swap it in so readers never see a truncated file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @contextmanager
+    def _locked(self):
+        """Hold the in-process lock and, where supported, an exclusive file lock"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def transaction(self):
+        if getattr(self._local, "doc", None) is not None:
+            yield
+            return
+        with self._locked():
+            self._local.doc = self._read()
+            self._local.dirty = False
+            try:
+                yield
+                if self._local.dirty:
+                    self._write(self._local.doc)
+            finally:
+                self._local.doc = None
+
+    def _load(self):
+        doc = getattr(self._local, "doc", None)
+        return doc if doc is not None else self._read()
+
+    def _save(self, doc):
+        if getattr(self._local, "doc", None) is not None:
+            self._local.doc = doc
+            self._local.dirty = True
+        else:
+            self._write(doc)
+
+    def get_submission(self, submission_id):
+        for sub in self._load()["submissions"]:
+            if sub["id"] == submission_id:
+                return sub
+        return None
+
+    def list_submissions(self):
+        return self._load()["submissions"]
+
+    def page_submissions(self, sort_by, offset, limit):
+        submissions = sorted(
+            self._load()["submissions"],
+            key=lambda sub: sort_key(sub, sort_by),
+            reverse=True
+        )
+        return submissions[offset:offset + limit], len(submissions)
+
+    def add_submission(self, submission):
+        doc = self._load()
+        doc["submissions"].append(submission)
+        self._save(doc)
+
+    def update_submission(self, submission):
+        doc = self._load()
+        for i, sub in enumerate(doc["submissions"]):
+            if sub["id"] == submission["id"]:
+                doc["submissions"][i] = submission
+                self._save(doc)
+                return
+
+    def delete_submission(self, submission_id):
+        doc = self._load()
+        original_length = len(doc["submissions"])
+        doc["submissions"] = [sub for sub in doc["submissions"] if sub["id"] != submission_id]
+        if len(doc["submissions"]) < original_length:
+            self._save(doc)
+            return True
+        return False
+
+    def get_vote(self, submission_id, voter_id):
+        return self._load()["votes"].get(vote_key(submission_id, voter_id))
+
+    def save_vote(self, vote):
+        doc = self._load()
+        doc["votes"][vote_key(vote["submission_id"], vote["voter_id"])] = vote
+        self._save(doc)
+
+    def get_stats(self):
+        doc = self._load()
+        submissions = doc["submissions"]
+        return {
+            "total_submissions": len(submissions),
+            "total_votes": len(doc["votes"]),
+            "avg_rating_overall": round(
+                sum(s["average_rating"] for s in submissions) / len(submissions), 2
+            ) if submissions else 0
+        }
+
+    def get_meta(self, key):
+        return self._load().get("meta", {}).get(key)
+
+    def set_meta(self, key, value):
+        doc = self._load()
+        doc.setdefault("meta", {})[key] = value
+        self._save(doc)
+
+    def delete_meta(self, key):
+        doc = self._load()
+        if doc.get("meta", {}).pop(key, None) is not None:
+            self._save(doc)
+
+    def replace_all(self, data):
+        self._save({
+            "submissions": list(data.get("submissions", [])),
+            "votes": dict(data.get("votes", {})),
+            "meta": self._load().get("meta", {})
+        })
+
+    def export(self):
+        return self._load()
+
+
+class SQLiteStorage(ArenaStorage):
+    """SQLite backend with WAL journaling and indexed lookups"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS submissions (
+            id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            total_votes INTEGER NOT NULL DEFAULT 0,
+            total_rating INTEGER NOT NULL DEFAULT 0,
+            vote_count INTEGER NOT NULL DEFAULT 0,
+            average_rating REAL NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_submissions_recent
+            ON submissions (created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_submissions_top_voted
+            ON submissions (total_votes, id);
+        CREATE INDEX IF NOT EXISTS idx_submissions_top_rated
+            ON submissions (average_rating, total_votes, id);
+        CREATE TABLE IF NOT EXISTS votes (
+            submission_id TEXT NOT NULL,
+            voter_id TEXT NOT NULL,
+            vote_type TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            voted_at TEXT NOT NULL,
+            PRIMARY KEY (submission_id, voter_id)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; multi-statement writes go through transaction()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self._conn()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    @staticmethod
+    def _row_to_submission(row):
+        submission = {"id": row["id"]}
+        submission.update(json.loads(row["data"]))
+        submission["created_at"] = row["created_at"]
+        for field in COUNTER_FIELDS:
+            submission[field] = row[field]
+        return submission
+
+    @staticmethod
+    def _submission_params(submission):
+        data = {
+            key: value for key, value in submission.items()
+            if key not in COUNTER_FIELDS and key not in ("id", "created_at")
+        }
+        return (
+            submission["id"],
+            submission["created_at"],
+            submission.get("total_votes", 0),
+            submission.get("total_rating", 0),
+            submission.get("vote_count", 0),
+            submission.get("average_rating", 0),
+            json.dumps(data)
+        )
+
+    def get_submission(self, submission_id):
+        row = self._conn().execute(
+            "SELECT * FROM submissions WHERE id = ?", (submission_id,)
+        ).fetchone()
+        return self._row_to_submission(row) if row else None
+
+    def list_submissions(self):
+        rows = self._conn().execute("SELECT * FROM submissions ORDER BY rowid")
+        return [self._row_to_submission(row) for row in rows]
+
+    def page_submissions(self, sort_by, offset, limit):
+        fields = SORT_ORDERS.get(sort_by, SORT_ORDERS["recent"]) + ("id",)
+        order = ", ".join(f"{field} DESC" for field in fields)
+        conn = self._conn()
+        rows = conn.execute(
+            f"SELECT * FROM submissions ORDER BY {order} LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        total_count = conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        return [self._row_to_submission(row) for row in rows], total_count
+
+    def add_submission(self, submission):
+        self._conn().execute(
+            "INSERT INTO submissions (id, created_at, total_votes, total_rating, "
+            "vote_count, average_rating, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._submission_params(submission)
+        )
+
+    def update_submission(self, submission):
+        params = self._submission_params(submission)
+        self._conn().execute(
+            "UPDATE submissions SET created_at = ?, total_votes = ?, total_rating = ?, "
+            "vote_count = ?, average_rating = ?, data = ? WHERE id = ?",
+            params[1:] + params[:1]
+        )
+
+    def delete_submission(self, submission_id):
+        cursor = self._conn().execute(
+            "DELETE FROM submissions WHERE id = ?", (submission_id,)
+        )
+        return cursor.rowcount > 0
+
+    def get_vote(self, submission_id, voter_id):
+        row = self._conn().execute(
+            "SELECT * FROM votes WHERE submission_id = ? AND voter_id = ?",
+            (submission_id, voter_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def save_vote(self, vote):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO votes (submission_id, voter_id, vote_type, rating, voted_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (vote["submission_id"], vote["voter_id"], vote["vote_type"],
+             vote["rating"], vote["voted_at"])
+        )
+
+    def get_stats(self):
+        conn = self._conn()
+        total_submissions, avg_rating = conn.execute(
+            "SELECT COUNT(*), AVG(average_rating) FROM submissions"
+        ).fetchone()
+        total_votes = conn.execute("SELECT COUNT(*) FROM votes").fetchone()[0]
+        return {
+            "total_submissions": total_submissions,
+            "total_votes": total_votes,
+            "avg_rating_overall": round(avg_rating, 2) if total_submissions else 0
+        }
+
+    def get_meta(self, key):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def set_meta(self, key, value):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    def delete_meta(self, key):
+        self._conn().execute("DELETE FROM meta WHERE key = ?", (key,))
+
+    def replace_all(self, data):
+        with self.transaction():
+            conn = self._conn()
+            conn.execute("DELETE FROM submissions")
+            conn.execute("DELETE FROM votes")
+            for submission in data.get("submissions", []):
+                self.add_submission(submission)
+            for vote in data.get("votes", {}).values():
+                self.save_vote(vote)
+
+    def export(self):
+        votes = {
+            vote_key(row["submission_id"], row["voter_id"]): dict(row)
+            for row in self._conn().execute("SELECT * FROM votes")
+        }
+        return {"submissions": self.list_submissions(), "votes": votes}
+
+
+def migrate_json_to_sqlite(json_path, storage):
+    """
+    One-shot migration of the legacy JSON document into a SQLite store
+
+    The JSON file is renamed to `<path>.migrated` afterwards so the import
+    never runs twice.
+
+    Args:
+        json_path: Path of the legacy fashion_arena_db.json
+        storage: Target SQLiteStorage
+
+    Returns:
+        int: Number of submissions migrated
+    """
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"submissions": data, "votes": {}}
+
+    with storage.transaction():
+        for submission in data.get("submissions", []):
+            if storage.get_submission(submission["id"]) is None:
+                storage.add_submission(submission)
+        for vote in data.get("votes", {}).values():
+            storage.save_vote(vote)
+
+    os.replace(json_path, json_path + ".migrated")
+    return len(data.get("submissions", []))
+
+
+def create_storage(backend, sqlite_path, json_path):
+    """
+    Build the configured storage backend
+
+    Args:
+        backend: 'sqlite' or 'json'
+        sqlite_path: Database file for the SQLite backend
+        json_path: Legacy JSON document path
+
+    Returns:
+        ArenaStorage: Ready-to-use storage backend
+    """
+    if backend == "json":
+        return JSONStorage(json_path)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown ARENA_STORAGE backend: {backend}")
+
+    storage = SQLiteStorage(sqlite_path)
+    if os.path.exists(json_path):
+        count = migrate_json_to_sqlite(json_path, storage)
+        print(f"Migrated {count} Fashion Arena submissions from {json_path} to {sqlite_path}")
+    return storage
+
+
+if __name__ == "__main__":
+    # Usage: python arena_storage.py <fashion_arena_db.json> <fashion_arena.db>
+    if len(sys.argv) != 3:
+        print("Usage: python arena_storage.py <json_path> <sqlite_path>")
+        sys.exit(1)
+    migrated = migrate_json_to_sqlite(sys.argv[1], SQLiteStorage(sys.argv[2]))
+    print(f"Migrated {migrated} submissions")
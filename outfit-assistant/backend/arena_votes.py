@@ -0,0 +1,291 @@
+"""
+Fashion Arena Votes - Append-only vote log with snapshot compaction
+
+Every vote is appended as one JSON line to votes.<generation>.log. The latest
+vote per (submission, voter) and per-submission rating aggregates are kept in
+memory and updated incrementally on append; both are rebuilt on startup by
+replaying snapshot.json followed by the current log. Once a log reaches
+compact_every votes it is folded into a new snapshot and moved to archive/,
+which keeps the full vote history for score disputes.
+
+Several processes may share the directory: appends and compaction run under an
+exclusive file lock, and each process catches up on votes appended by the
+others before appending. Reads only stat the current log and take the file
+lock when it has grown or been compacted away since the last catch-up.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process assumed
+    fcntl = None
+
+SNAPSHOT_FILE = "snapshot.json"
+
+
+def empty_aggregates():
+    return {"total_rating": 0, "vote_count": 0, "average_rating": 0, "upvotes": 0}
+
+
+class VoteLog:
+    """Latest votes and rating aggregates, derived from an append-only log"""
+
+    def __init__(self, log_dir, compact_every=10000, fsync=True, archive=True, initial_votes=None):
+        """
+        Args:
+            log_dir: Directory holding the snapshot, logs and archive
+            compact_every: Number of logged votes that triggers a compaction
+            fsync: fsync the log after every append
+            archive: Keep compacted logs in archive/ instead of deleting them
+            initial_votes: Callable returning votes to seed a brand new log with
+        """
+        self.log_dir = log_dir
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.archive = archive
+
+        self._thread_lock = threading.RLock()
+        self._lock_path = os.path.join(log_dir, "votes.lock")
+        self._generation = None
+        self._offset = 0
+        # Log size seen by the last catch-up, including a torn or in-progress last line
+        self._size = 0
+        self._entries = 0
+        self._latest = {}
+        self._aggregates = {}
+
+        os.makedirs(os.path.join(log_dir, "archive"), exist_ok=True)
+        with self._locked():
+            if not os.path.exists(self._snapshot_path()):
+                self._write_snapshot(1, initial_votes() if initial_votes else [])
+            self._catch_up()
+
+    def __len__(self):
+        with self._reading():
+            return len(self._latest)
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _snapshot_path(self):
+        return os.path.join(self.log_dir, SNAPSHOT_FILE)
+
+    def _log_path(self, generation):
+        return os.path.join(self.log_dir, f"votes.{generation:06d}.log")
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _reading(self):
+        """Hold the thread lock, catching up under the file lock only if the log changed"""
+        with self._thread_lock:
+            if self._log_size() == self._size:
+                yield
+                return
+            with self._locked():
+                self._catch_up()
+                yield
+
+    def _log_size(self):
+        """Size of the current generation's log, or None if it is gone (or not loaded yet)"""
+        if self._generation is None:
+            return None
+        try:
+            return os.path.getsize(self._log_path(self._generation))
+        except FileNotFoundError:
+            return None
+
+    def _write_snapshot(self, generation, votes):
+        """Atomically write a snapshot and start the (empty) log of its generation"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.log_dir, prefix=".snapshot.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"generation": generation, "votes": list(votes)}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._snapshot_path())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        open(self._log_path(generation), 'a').close()
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    def _load_snapshot(self):
+        with open(self._snapshot_path(), 'r') as f:
+            snapshot = json.load(f)
+        self._generation = snapshot["generation"]
+        self._offset = 0
+        self._size = 0
+        self._entries = 0
+        self._latest = {}
+        self._aggregates = {}
+        for vote in snapshot["votes"]:
+            self._apply(vote)
+        # Recover from a crash between writing the snapshot and creating its log
+        open(self._log_path(self._generation), 'a').close()
+
+    def _catch_up(self):
+        """Apply votes appended since the last read, by this or any other process"""
+        size = self._log_size()
+        if size is None:
+            # First load, or another process compacted the log we were reading
+            self._load_snapshot()
+            size = os.path.getsize(self._log_path(self._generation))
+        self._size = size
+        if size <= self._offset:
+            return
+
+        with open(self._log_path(self._generation), 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        # Only consume complete lines; a torn last line from a crash is skipped
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                vote = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(vote)
+            self._entries += 1
+        self._offset += end
+
+    def _apply(self, vote):
+        """Fold one vote into the in-memory state; returns the vote it replaced"""
+        key = (vote["submission_id"], vote["voter_id"])
+        old_vote = self._latest.get(key)
+        self._latest[key] = vote
+
+        aggregates = self._aggregates.setdefault(vote["submission_id"], empty_aggregates())
+        if old_vote:
+            aggregates["total_rating"] -= old_vote["rating"]
+            if old_vote["vote_type"] == "upvote":
+                aggregates["upvotes"] -= 1
+        else:
+            aggregates["vote_count"] += 1
+        aggregates["total_rating"] += vote["rating"]
+        if vote["vote_type"] == "upvote":
+            aggregates["upvotes"] += 1
+        aggregates["average_rating"] = round(aggregates["total_rating"] / aggregates["vote_count"], 2)
+        return old_vote
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def append(self, vote):
+        """
+        Record a vote
+
+        Args:
+            vote: Vote record (submission_id, voter_id, vote_type, rating, voted_at)
+
+        Returns:
+            dict: The voter's previous vote on this submission, or None
+        """
+        with self._locked():
+            self._catch_up()
+            old_vote, = self._write([vote])
+        metrics.increment("arena.votes")
+        return old_vote
+
+    def merge(self, votes):
+        """
+        Append votes the log is missing, e.g. ones still held by an older storage backend
+
+        A vote is appended when the log has no vote by that voter on that
+        submission, or only an older one (by voted_at).
+
+        Returns:
+            int: Number of votes appended
+        """
+        with self._locked():
+            self._catch_up()
+            missing = {}
+            for vote in votes:
+                key = (vote["submission_id"], vote["voter_id"])
+                latest = missing.get(key) or self._latest.get(key)
+                if latest is None or vote.get("voted_at", "") > latest.get("voted_at", ""):
+                    missing[key] = vote
+            if missing:
+                self._write(list(missing.values()))
+        return len(missing)
+
+    def _write(self, votes):
+        """Durably append votes to the current log; returns the votes they replaced"""
+        data = "".join(json.dumps(vote) + "\n" for vote in votes).encode()
+        with open(self._log_path(self._generation), 'ab') as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._offset += len(data)
+        self._size += len(data)
+        self._entries += len(votes)
+        old_votes = [self._apply(vote) for vote in votes]
+        if self._entries >= self.compact_every:
+            self._compact()
+        return old_votes
+
+    def get(self, submission_id, voter_id):
+        """Return a voter's latest vote on a submission, or None"""
+        with self._reading():
+            return self._latest.get((submission_id, voter_id))
+
+    def aggregates(self, submission_id):
+        """Return total_rating, vote_count, average_rating and current upvotes for a submission"""
+        with self._reading():
+            return dict(self._aggregates.get(submission_id, empty_aggregates()))
+
+    def compact(self):
+        """Fold the current log into a new snapshot"""
+        with self._locked():
+            self._catch_up()
+            self._compact()
+
+    def _compact(self):
+        old_generation = self._generation
+        with metrics.timer("arena.vote_compaction"):
+            self._write_snapshot(old_generation + 1, self._latest.values())
+        self._retire_log(old_generation)
+        self._generation = old_generation + 1
+        self._offset = 0
+        self._size = 0
+        self._entries = 0
+
+    def _retire_log(self, generation):
+        path = self._log_path(generation)
+        if self.archive:
+            os.replace(path, os.path.join(self.log_dir, "archive", os.path.basename(path)))
+        else:
+            os.unlink(path)
+
+    def replace_all(self, votes):
+        """Replace every vote, e.g. when restoring a backup"""
+        with self._locked():
+            self._catch_up()
+            old_generation = self._generation
+            self._write_snapshot(old_generation + 1, votes)
+            self._retire_log(old_generation)
+            self._load_snapshot()
@@ -0,0 +1,111 @@
+"""
+Fashion Arena Writer - Serializes arena mutations through a single writer thread
+
+Mutations are queued and applied by one dedicated thread. Whatever is queued
+when the writer wakes up is committed as one storage transaction, so a burst of
+likes and votes costs a single commit.
+
+Every committed batch also advances a version number kept in storage meta, so
+other processes can tell that their in-memory view of the arena is stale.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+# Meta key holding the storage version, advanced by every committed write
+VERSION_KEY = "arena_version"
+
+
+def bump_version(storage):
+    """
+    Advance the storage version inside the current transaction
+
+    Returns:
+        tuple: (previous version, new version)
+    """
+    version = storage.get_meta(VERSION_KEY) or 0
+    storage.set_meta(VERSION_KEY, version + 1)
+    return version, version + 1
+
+
+class ArenaWriter:
+    """Single writer thread with group commit over an ArenaStorage backend"""
+
+    def __init__(self, storage, max_batch=100, on_version=None):
+        """
+        Args:
+            storage: ArenaStorage backend
+            max_batch: Maximum number of queued mutations committed together
+            on_version: Optional callable(previous, new) run after each commit
+                with the storage versions before and after the batch
+        """
+        self.storage = storage
+        self.max_batch = max_batch
+        self.on_version = on_version
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._thread = threading.Thread(target=self._run, name="arena-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation):
+        """
+        Queue a mutation
+
+        Args:
+            operation: Callable taking the storage backend and returning a result
+
+        Returns:
+            Future: Resolves with the operation's result once it is committed
+        """
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Already inside a batch (nested call); run as part of it
+            future.set_result(operation(self.storage))
+            return future
+        self._queue.put((operation, future))
+        return future
+
+    def execute(self, operation):
+        """Queue a mutation and wait for its committed result"""
+        return self.submit(operation).result()
+
+    def on_commit(self, callback):
+        """Run callback after the current batch commits; only valid inside an operation"""
+        self._local.callbacks.append(callback)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception:
+                # One bad operation must not fail the others: retry them one by one
+                for item in batch:
+                    try:
+                        self._commit([item])
+                    except Exception as e:
+                        item[1].set_exception(e)
+
+    def _commit(self, batch):
+        self._local.callbacks = []
+        results = []
+        with self.storage.transaction():
+            for operation, _ in batch:
+                results.append(operation(self.storage))
+            versions = bump_version(self.storage)
+        if self.on_version:
+            # Runs after the batch's own callbacks have updated the index
+            self._local.callbacks.append(lambda: self.on_version(*versions))
+        for callback in self._local.callbacks:
+            try:
+                callback()
+            except Exception as e:
+                # Already committed; never let a callback trigger a retry
+                print(f"Error in arena post-commit callback: {e}")
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
@@ -0,0 +1,178 @@
+"""
+Cache Module - Thread-safe LRU caches with per-entry expiry
+
+Used to skip repeated upstream work (uploads, model calls) for inputs we have
+already seen. TTLCache keeps entries in memory, expiring them after ttl_seconds
+and evicting the least recently used entry once max_entries is reached.
+SQLiteCache is an optional on-disk tier that survives restarts, and
+TieredCache checks several tiers in order. Hits, misses and evictions are
+counted under cache.<name>.* in /api/metrics.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+def make_key(*parts):
+    """
+    Build a cache key from JSON-serializable parts
+
+    Callers normalize their inputs first (case, whitespace, ordering); equal
+    parts always give the same key.
+    """
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """LRU cache whose entries expire ttl_seconds after they were stored"""
+
+    def __init__(self, name, max_entries=1000, ttl_seconds=3600):
+        """
+        Args:
+            name: Metrics prefix (cache.<name>.hits, ...)
+            max_entries: Entries kept before the least recently used one is evicted
+            ttl_seconds: Seconds an entry stays valid after set()
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                metrics.increment(f"cache.{self.name}.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.increment(f"cache.{self.name}.hits")
+        return entry[1]
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.increment(f"cache.{self.name}.evictions", evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk cache tier; values must be JSON-serializable"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, name, path, ttl_seconds=86400):
+        """
+        Args:
+            name: Metrics prefix (cache.<name>.hits, ...)
+            path: SQLite database file
+            ttl_seconds: Seconds an entry stays valid after set()
+        """
+        self.name = name
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the cached value for key, or None if it is missing or expired"""
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} read failed: {e}")
+            row = None
+        if row is None:
+            metrics.increment(f"cache.{self.name}.misses")
+            return None
+        metrics.increment(f"cache.{self.name}.hits")
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl_seconds)
+            )
+        except sqlite3.Error as e:
+            print(f"Cache {self.name} write failed: {e}")
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """Checks each tier in order; a hit in a slower tier is copied into the faster ones"""
+
+    def __init__(self, *tiers):
+        self.tiers = [tier for tier in tiers if tier is not None]
+
+    def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:index]:
+                    faster.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def delete(self, key):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
@@ -1,37 +1,226 @@
 """
 Fashion Arena Module - Handles photo submissions, voting, and leaderboard
 """
+import atexit
+import base64
+import binascii
 import json
 import os
+import threading
 from datetime import datetime
 import uuid
 
+import arena_counters
+import arena_index
+import arena_photos
+import arena_storage
+import arena_votes
+import arena_writer
+import image_prep
+import metrics
+
 # Use Railway volume path if it exists, otherwise use local path
 # Railway volume is mounted at /app/data
 DATA_DIR = '/app/data' if os.path.exists('/app/data') else '.'
 os.makedirs(DATA_DIR, exist_ok=True)
 FASHION_ARENA_DB = os.path.join(DATA_DIR, "fashion_arena_db.json")
-print(f"Fashion Arena DB path: {FASHION_ARENA_DB}")
+FASHION_ARENA_SQLITE = os.path.join(DATA_DIR, "fashion_arena.db")
+PHOTO_DIR = os.path.join(DATA_DIR, "arena_photos")
+INTENT_LOG_DIR = os.path.join(DATA_DIR, "arena_intents")
+VOTE_LOG_DIR = os.path.join(DATA_DIR, "arena_votes")
+
+# Storage backend: 'sqlite' (default) or 'json' (legacy whole-file store)
+ARENA_STORAGE = os.getenv('ARENA_STORAGE', 'sqlite').lower()
+
+# Maximum number of queued mutations committed together by the writer thread
+ARENA_WRITE_BATCH = int(os.getenv('ARENA_WRITE_BATCH', 100))
+
+# Likes and votes are buffered and flushed every N ms or N operations
+ARENA_FLUSH_INTERVAL_MS = int(os.getenv('ARENA_FLUSH_INTERVAL_MS', 500))
+ARENA_FLUSH_MAX_OPS = int(os.getenv('ARENA_FLUSH_MAX_OPS', 200))
+ARENA_INTENT_FSYNC = os.getenv('ARENA_INTENT_FSYNC', 'true').lower() == 'true'
+# Votes appended to the vote log before it is compacted into a snapshot
+ARENA_VOTE_COMPACT_EVERY = int(os.getenv('ARENA_VOTE_COMPACT_EVERY', 10000))
+# Keep compacted vote logs as an audit trail
+ARENA_VOTE_ARCHIVE = os.getenv('ARENA_VOTE_ARCHIVE', 'true').lower() == 'true'
+# Longest edge kept for submitted photos (renditions go up to 1024)
+ARENA_PHOTO_MAX_SIDE = int(os.getenv('ARENA_PHOTO_MAX_SIDE', 2048))
+
+# Type of each sort key field stored in a cursor; the trailing submission id is a string
+CURSOR_FIELD_TYPES = {"created_at": str, "total_votes": (int, float), "average_rating": (int, float)}
+
+_storage = None
+_writer = None
+_counters = None
+_votes = None
+_init_lock = threading.Lock()
+photo_store = arena_photos.PhotoStore(PHOTO_DIR)
+
+# In-process ranked view of all submissions; serves listings and the leaderboard
+_index = arena_index.ArenaIndex()
+# Storage version the index reflects; other processes' writes advance storage past it
+_index_version = None
+_index_version_lock = threading.Lock()
+_index_reload_lock = threading.Lock()
 
 def initialize_db():
-    """Initialize the fashion arena database if it doesn't exist"""
-    if not os.path.exists(FASHION_ARENA_DB):
-        with open(FASHION_ARENA_DB, 'w') as f:
-            json.dump({
-                "submissions": [],
-                "votes": {}
-            }, f)
-
-def load_db():
-    """Load the fashion arena database"""
+    """Open the storage backend, run pending migrations and build the ranked index"""
+    global _storage, _writer, _counters, _votes, _index_version
+    if _storage is not None:
+        return
+    with _init_lock:
+        if _storage is not None:
+            return
+        storage = arena_storage.create_storage(ARENA_STORAGE, FASHION_ARENA_SQLITE, FASHION_ARENA_DB)
+        db_path = FASHION_ARENA_DB if storage.name == "json" else FASHION_ARENA_SQLITE
+        print(f"Fashion Arena DB path: {db_path} ({storage.name})")
+        migrated = _migrate_inline_photos(storage)
+        if migrated:
+            print(f"Moved {migrated} inline Fashion Arena photos to {PHOTO_DIR}")
+        _votes = arena_votes.VoteLog(
+            VOTE_LOG_DIR,
+            compact_every=ARENA_VOTE_COMPACT_EVERY,
+            fsync=ARENA_INTENT_FSYNC,
+            archive=ARENA_VOTE_ARCHIVE,
+            initial_votes=lambda: list(storage.export().get("votes", {}).values())
+        )
+        _drop_stored_votes(storage)
+        updated = _sync_vote_aggregates(storage)
+        if updated:
+            print(f"Rebuilt rating aggregates of {updated} Fashion Arena submissions from the vote log")
+        # All mutations go through one writer thread, committed in batches
+        _writer = arena_writer.ArenaWriter(storage, max_batch=ARENA_WRITE_BATCH, on_version=_on_version)
+        # Replays any unflushed likes/votes before the index is built
+        _counters = arena_counters.WriteBehindCounters(
+            _writer,
+            _index,
+            INTENT_LOG_DIR,
+            flush_interval_ms=ARENA_FLUSH_INTERVAL_MS,
+            max_batch=ARENA_FLUSH_MAX_OPS,
+            fsync=ARENA_INTENT_FSYNC,
+            derived=_vote_fields
+        )
+        _index_version = storage.get_meta(arena_writer.VERSION_KEY) or 0
+        _index.rebuild(storage.list_submissions())
+        atexit.register(_counters.close)
+        _storage = storage
+
+def _on_version(previous, new):
+    """Keep the index current through this process's own commits"""
+    global _index_version
+    with _index_version_lock:
+        if _index_version == previous:
+            _index_version = new
+
+def _refresh_index():
+    """Rebuild the index if another process has written to storage since it was built"""
+    global _index_version
+    version = _storage.get_meta(arena_writer.VERSION_KEY) or 0
+    if version == _index_version:
+        return
+    with _index_reload_lock:
+        version = _storage.get_meta(arena_writer.VERSION_KEY) or 0
+        if version == _index_version:
+            return
+        _counters.rebuild_index(_storage.list_submissions)
+        with _index_version_lock:
+            _index_version = version
+        metrics.increment("arena.index_reloads")
+
+def _lookup(submission_id):
+    """Return a submission from the index, falling back to storage on a miss"""
+    _refresh_index()
+    submission = _index.get(submission_id)
+    if submission is None:
+        submission = _storage.get_submission(submission_id)
+        if submission is not None:
+            _index.put(submission)
+    return submission
+
+def get_storage():
+    """Return the configured storage backend, initializing it on first use"""
+    initialize_db()
+    return _storage
+
+def _write(operation):
+    """Run a mutation on the writer thread and return its committed result"""
     initialize_db()
-    with open(FASHION_ARENA_DB, 'r') as f:
-        return json.load(f)
+    return _writer.execute(operation)
 
-def save_db(data):
-    """Save the fashion arena database"""
-    with open(FASHION_ARENA_DB, 'w') as f:
-        json.dump(data, f, indent=2)
+def _extract_photo(submission):
+    """Move an inline base64 photo into the photo store, returning True if moved"""
+    photo = submission.get("photo")
+    if not photo or not photo.startswith("data:image"):
+        return False
+    try:
+        submission.update(photo_store.put(photo))
+    except ValueError as e:
+        print(f"Could not extract photo for submission {submission.get('id')}: {e}")
+        return False
+    submission.pop("photo")
+    photo_store.schedule_renditions(submission["photo_hash"])
+    return True
+
+def _migrate_inline_photos(storage):
+    """Move base64 photos left in older submissions into the photo store"""
+    migrated = 0
+    with storage.transaction():
+        for submission in storage.list_submissions():
+            if _extract_photo(submission):
+                storage.update_submission(submission)
+                migrated += 1
+        if migrated:
+            arena_writer.bump_version(storage)
+    return migrated
+
+def _drop_stored_votes(storage):
+    """Move votes kept in the storage backend by older versions into the vote log"""
+    with storage.transaction():
+        data = storage.export()
+        if data.get("votes"):
+            # A new vote log was seeded with them; an existing one may still be missing some
+            merged = _votes.merge(data["votes"].values())
+            storage.replace_all({"submissions": data["submissions"], "votes": {}})
+            arena_writer.bump_version(storage)
+            print(f"Moved {len(data['votes'])} Fashion Arena votes to the vote log ({merged} were not logged yet)")
+
+def _vote_fields(submission):
+    """
+    Return the submission fields derived from the vote log
+
+    total_votes counts likes plus current upvotes, so a vote is complete once it
+    is in the vote log, even if the process dies before its counters are flushed.
+    """
+    aggregates = _votes.aggregates(submission["id"])
+    likes = submission.get("likes")
+    if likes is None:
+        # Older records: whatever total_votes holds beyond the current upvotes came from likes
+        likes = max(submission.get("total_votes", 0) - aggregates["upvotes"], 0)
+    return {**aggregates, "likes": likes, "total_votes": likes + aggregates["upvotes"]}
+
+def _sync_vote_aggregates(storage):
+    """Rewrite submission vote counters and rating aggregates that differ from the vote log"""
+    updated = 0
+    with storage.transaction():
+        for submission in storage.list_submissions():
+            derived = _vote_fields(submission)
+            if any(submission.get(field) != value for field, value in derived.items()):
+                submission.update(derived)
+                storage.update_submission(submission)
+                updated += 1
+        if updated:
+            arena_writer.bump_version(storage)
+    return updated
+
+def get_photo_path(photo_hash):
+    """Return the file path of a stored photo, or None if it does not exist"""
+    if not photo_store.exists(photo_hash):
+        return None
+    return photo_store.path_for(photo_hash)
+
+def get_rendition_path(photo_hash, size, ext):
+    """Return the file path of a photo rendition, or None if it does not exist"""
+    return photo_store.get_rendition(photo_hash, size, ext)
 
 def submit_to_arena(photo_data, title, description, occasion, source_mode, user_id=None):
     """
@@ -47,13 +236,20 @@ def submit_to_arena(photo_data, title, description, occasion, source_mode, user_
     
     Returns:
         dict: Submission details including submission_id
+
+    Raises:
+        ValueError: If the photo data cannot be decoded
     """
-    db = load_db()
+    # Decode once and keep only the content hash on the submission
+    # Arena photos are shown full screen, so keep more resolution than model inputs
+    prepared = image_prep.prepare_image(photo_data, max_short_side=ARENA_PHOTO_MAX_SIDE, max_long_side=ARENA_PHOTO_MAX_SIDE)
+    photo = photo_store.put(prepared.data)
+    photo_store.schedule_renditions(photo["photo_hash"])
     
     submission_id = str(uuid.uuid4())
     submission = {
         "id": submission_id,
-        "photo": photo_data,
+        **photo,
         "title": title,
         "description": description,
         "occasion": occasion,
@@ -61,15 +257,18 @@ def submit_to_arena(photo_data, title, description, occasion, source_mode, user_
         "user_id": user_id or "anonymous",
         "created_at": datetime.now().isoformat(),
         "total_votes": 0,
+        "likes": 0,
         "total_rating": 0,
         "vote_count": 0,
         "average_rating": 0
     }
     
-    db["submissions"].append(submission)
-    save_db(db)
+    def apply(storage):
+        storage.add_submission(submission)
+        _writer.on_commit(lambda: _index.put(submission))
+        return submission
     
-    return submission
+    return _write(apply)
 
 def get_all_submissions(sort_by="recent", page=1, limit=10):
     """
@@ -82,26 +281,91 @@ def get_all_submissions(sort_by="recent", page=1, limit=10):
     
     Returns:
         tuple: (list of submissions, total_count)
+
+    Raises:
+        ValueError: If page or limit is below 1
     """
-    db = load_db()
-    submissions = db["submissions"]
-    
-    if sort_by == "top_voted":
-        submissions = sorted(submissions, key=lambda x: x["total_votes"], reverse=True)
-    elif sort_by == "top_rated":
-        submissions = sorted(submissions, key=lambda x: x["average_rating"], reverse=True)
-    else:  # recent
-        submissions = sorted(submissions, key=lambda x: x["created_at"], reverse=True)
-    
-    total_count = len(submissions)
+    if sort_by not in arena_storage.SORT_ORDERS:
+        sort_by = "recent"
+    if page < 1 or limit < 1:
+        raise ValueError("page and limit must be at least 1")
     
     # Pagination
     start_idx = (page - 1) * limit
-    end_idx = start_idx + limit
     
-    paginated_submissions = submissions[start_idx:end_idx]
+    initialize_db()
+    _refresh_index()
+    return _index.page(sort_by, start_idx, limit)
+
+def encode_cursor(sort_by, submission):
+    """Build an opaque pagination cursor pointing just after a submission"""
+    if sort_by not in arena_storage.SORT_ORDERS:
+        sort_by = "recent"
+    position = [sort_by, *arena_storage.sort_key(submission, sort_by)]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decode a pagination cursor
+
+    Returns:
+        tuple: (sort_by, sort key tuple)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_by, *key = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if sort_by not in arena_storage.SORT_ORDERS or len(key) != len(arena_storage.SORT_ORDERS[sort_by]) + 1:
+        raise ValueError("Invalid cursor")
+    # Keys are compared against stored sort keys, so every element must have the stored type
+    field_types = [CURSOR_FIELD_TYPES[field] for field in arena_storage.SORT_ORDERS[sort_by]] + [str]
+    if any(isinstance(value, bool) or not isinstance(value, field_type)
+           for value, field_type in zip(key, field_types)):
+        raise ValueError("Invalid cursor")
+    return sort_by, tuple(key)
+
+def get_submissions_after(sort_by="recent", cursor=None, limit=10):
+    """
+    Get Fashion Arena submissions with keyset (cursor) pagination
+    
+    Args:
+        sort_by: 'recent', 'top_voted', or 'top_rated'
+        cursor: Cursor from a previous page's next_cursor, or None for the first page
+        limit: Number of items per page
     
-    return paginated_submissions, total_count
+    Returns:
+        tuple: (list of submissions, total_count, next_cursor or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another sort order,
+            or limit is below 1
+    """
+    if sort_by not in arena_storage.SORT_ORDERS:
+        sort_by = "recent"
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    
+    key = None
+    if cursor:
+        cursor_sort_by, key = decode_cursor(cursor)
+        if cursor_sort_by != sort_by:
+            raise ValueError("Cursor does not match sort_by")
+    
+    initialize_db()
+    _refresh_index()
+    # Fetch one extra item to know whether another page exists
+    submissions, total_count = _index.page_after(sort_by, key, limit + 1)
+    
+    next_cursor = None
+    if len(submissions) > limit:
+        submissions = submissions[:limit]
+        next_cursor = encode_cursor(sort_by, submissions[-1])
+    
+    return submissions, total_count, next_cursor
 
 def get_leaderboard(limit=10):
     """
@@ -112,18 +376,18 @@ def get_leaderboard(limit=10):
     
     Returns:
         list: Top submissions sorted by average rating
+
+    Raises:
+        ValueError: If limit is below 1
     """
-    db = load_db()
-    submissions = db["submissions"]
-    
-    # Sort by average rating, then by total votes as tiebreaker
-    sorted_submissions = sorted(
-        submissions,
-        key=lambda x: (x["average_rating"], x["total_votes"]),
-        reverse=True
-    )
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    # Ranked by average rating, then by total votes as tiebreaker
+    initialize_db()
+    _refresh_index()
+    leaderboard, _ = _index.page("top_rated", 0, limit)
     
-    return sorted_submissions[:limit]
+    return leaderboard
 
 def vote_submission(submission_id, vote_type, rating, voter_id=None):
     """
@@ -138,48 +402,12 @@ def vote_submission(submission_id, vote_type, rating, voter_id=None):
     Returns:
         dict: Updated submission or None if not found
     """
-    db = load_db()
+    initialize_db()
     voter_id = voter_id or "anonymous"
-    
-    # Find the submission
-    submission = None
-    for sub in db["submissions"]:
-        if sub["id"] == submission_id:
-            submission = sub
-            break
-    
-    if not submission:
+    if _lookup(submission_id) is None:
         return None
     
-    # Check if user already voted
-    vote_key = f"{submission_id}_{voter_id}"
-    if vote_key in db["votes"]:
-        # User already voted, update their vote
-        old_vote = db["votes"][vote_key]
-        
-        # Update vote count
-        if old_vote["vote_type"] == "upvote" and vote_type == "downvote":
-            submission["total_votes"] -= 1
-        elif old_vote["vote_type"] == "downvote" and vote_type == "upvote":
-            submission["total_votes"] += 1
-        
-        # Update rating
-        submission["total_rating"] = submission["total_rating"] - old_vote["rating"] + rating
-        
-    else:
-        # New vote
-        if vote_type == "upvote":
-            submission["total_votes"] += 1
-        
-        submission["vote_count"] += 1
-        submission["total_rating"] += rating
-    
-    # Calculate average rating
-    if submission["vote_count"] > 0:
-        submission["average_rating"] = round(submission["total_rating"] / submission["vote_count"], 2)
-    
-    # Save the vote
-    db["votes"][vote_key] = {
+    vote = {
         "submission_id": submission_id,
         "voter_id": voter_id,
         "vote_type": vote_type,
@@ -187,35 +415,29 @@ def vote_submission(submission_id, vote_type, rating, voter_id=None):
         "voted_at": datetime.now().isoformat()
     }
     
-    save_db(db)
-    
-    return submission
+    # Acknowledged once appended to the vote log; upvotes and rating aggregates are
+    # derived from it and reach storage with the next flush
+    _votes.append(vote)
+    return _counters.refresh(submission_id)
 
 def get_submission_by_id(submission_id):
     """Get a single submission by ID"""
-    db = load_db()
-    for sub in db["submissions"]:
-        if sub["id"] == submission_id:
-            return sub
-    return None
+    initialize_db()
+    return _lookup(submission_id)
 
 def check_user_vote(submission_id, voter_id=None):
     """Check if a user has already voted on a submission"""
-    db = load_db()
+    initialize_db()
     voter_id = voter_id or "anonymous"
-    vote_key = f"{submission_id}_{voter_id}"
-    return db["votes"].get(vote_key)
+    return _votes.get(submission_id, voter_id)
 
 def get_stats():
     """Get Fashion Arena statistics"""
-    db = load_db()
-    return {
-        "total_submissions": len(db["submissions"]),
-        "total_votes": len(db["votes"]),
-        "avg_rating_overall": round(
-            sum(s["average_rating"] for s in db["submissions"]) / len(db["submissions"]), 2
-        ) if db["submissions"] else 0
-    }
+    storage = get_storage()
+    _counters.flush()
+    stats = storage.get_stats()
+    stats["total_votes"] = len(_votes)
+    return stats
 
 def restore_data(backup_data):
     """
@@ -236,8 +458,23 @@ def restore_data(backup_data):
         if not isinstance(backup_data, dict) or "submissions" not in backup_data:
             raise ValueError("Invalid backup format")
 
-        # Save the backup data directly
-        save_db(backup_data)
+        # Older backups carry inline base64 photos
+        for submission in backup_data["submissions"]:
+            _extract_photo(submission)
+
+        # Replace the stored data with the backup
+        get_storage()
+        _counters.flush()
+
+        def apply(storage):
+            # Vote counters and rating aggregates always follow the vote log
+            for submission in backup_data["submissions"]:
+                submission.update(_vote_fields(submission))
+            storage.replace_all({"submissions": backup_data["submissions"], "votes": {}})
+            _writer.on_commit(lambda: _index.rebuild(backup_data["submissions"]))
+
+        _votes.replace_all(backup_data.get("votes", {}).values())
+        _write(apply)
 
         return len(backup_data.get("submissions", []))
     except Exception as e:
@@ -253,24 +490,12 @@ def like_submission(submission_id):
     Returns:
         dict: Updated submission or None if not found
     """
-    db = load_db()
-
-    # Find the submission
-    submission = None
-    for sub in db["submissions"]:
-        if sub["id"] == submission_id:
-            submission = sub
-            break
-
-    if not submission:
+    initialize_db()
+    if _lookup(submission_id) is None:
         return None
 
-    # Increment the like count
-    submission["total_votes"] = submission.get("total_votes", 0) + 1
-
-    save_db(db)
-
-    return submission
+    # Increment the like count; acknowledged once logged, flushed in batches
+    return _counters.like(submission_id)
 
 def cleanup_invalid_submissions():
     """
@@ -279,25 +504,26 @@ def cleanup_invalid_submissions():
     Returns:
         dict: Cleanup results with count of removed submissions
     """
-    db = load_db()
-    original_count = len(db["submissions"])
+    def apply(storage):
+        submissions = storage.list_submissions()
 
-    # Filter out submissions with file:// paths
-    valid_submissions = [
-        sub for sub in db["submissions"]
-        if not (sub.get("photo", "").startswith("file://"))
-    ]
+        # Filter out submissions with file:// paths
+        invalid_ids = [
+            sub["id"] for sub in submissions
+            if sub.get("photo", "").startswith("file://")
+        ]
 
-    removed_count = original_count - len(valid_submissions)
+        for submission_id in invalid_ids:
+            storage.delete_submission(submission_id)
+            _writer.on_commit(lambda submission_id=submission_id: _index.remove(submission_id))
+        return len(submissions), len(invalid_ids)
 
-    if removed_count > 0:
-        db["submissions"] = valid_submissions
-        save_db(db)
+    original_count, removed_count = _write(apply)
 
     return {
         "original_count": original_count,
         "removed_count": removed_count,
-        "remaining_count": len(valid_submissions)
+        "remaining_count": original_count - removed_count
     }
 
 def delete_submission(submission_id):
@@ -310,14 +536,13 @@ def delete_submission(submission_id):
     Returns:
         bool: True if deleted successfully, False if not found
     """
-    db = load_db()
-
     # Find and remove the submission
-    original_length = len(db["submissions"])
-    db["submissions"] = [sub for sub in db["submissions"] if sub["id"] != submission_id]
+    def apply(storage):
+        deleted = storage.delete_submission(submission_id)
+        _writer.on_commit(lambda: _index.remove(submission_id))
+        return deleted
 
-    if len(db["submissions"]) < original_length:
-        save_db(db)
+    if _write(apply):
         print(f"Deleted submission: {submission_id}")
         return True
     else:
@@ -0,0 +1,186 @@
+"""
+HTTP Client - Shared outbound HTTP with pooling, timeouts, retries and circuit breakers
+
+All upstream calls go through one requests.Session, so connections to each host
+are kept alive and reused (one urllib3 pool per host). Every request gets a
+connect/read timeout, transient failures are retried with jittered exponential
+backoff, and a per-host circuit breaker fails fast while an upstream is down.
+
+Retries: idempotent methods (GET, HEAD, ...) are retried on connection errors,
+timeouts, 429 and 5xx. Other methods are only retried when the request cannot
+have been processed (connect timeout or 429), so a task is never submitted twice.
+"""
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.5))
+# Longest Retry-After we are willing to honour inside a request
+MAX_RETRY_AFTER = 10
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+BREAKER_THRESHOLD = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('HTTP_BREAKER_RESET_SECONDS', 30))
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling an upstream whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; after `reset_seconds` a single
+    trial request is let through and its outcome closes or re-opens the circuit.
+    A trial that never reports back (e.g. its caller died on an unexpected
+    exception) expires after another `reset_seconds`, so the circuit cannot be
+    stuck open.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_started = None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_seconds:
+                return False
+            if self._trial_started is not None and now - self._trial_started < self.reset_seconds:
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_started = None
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return "open"
+            return "half_open"
+
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker_for(host):
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET_SECONDS)
+        return _breakers[host]
+
+
+def circuit_states():
+    """Return the circuit breaker state of every upstream host contacted so far"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {host: breaker.state() for host, breaker in breakers.items()}
+
+
+def _retry_delay(attempt, response=None):
+    """Seconds to wait before the next attempt, honouring Retry-After when given"""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(int(retry_after), MAX_RETRY_AFTER)
+    return RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the shared session
+
+    Args:
+        method: HTTP method
+        url: Absolute URL
+        timeout: Seconds or (connect, read) tuple; defaults to HTTP_CONNECT_TIMEOUT/HTTP_READ_TIMEOUT
+        **kwargs: Passed to requests (headers, json, data, params, stream, ...)
+
+    Returns:
+        requests.Response: The final response (possibly a 4xx/5xx after retries)
+
+    Raises:
+        CircuitOpenError: If the host's circuit breaker is open
+        requests.RequestException: If the request still fails after retries
+    """
+    host = urlsplit(url).netloc
+    breaker = _breaker_for(host)
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            metrics.increment(f"http.{host}.short_circuited")
+            raise CircuitOpenError(f"Circuit breaker open for {host}")
+
+        metrics.increment(f"http.{host}.requests")
+        start = time.perf_counter()
+        try:
+            response = _session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            breaker.record_failure()
+            metrics.increment(f"http.{host}.errors")
+            retryable = idempotent or isinstance(e, requests.ConnectTimeout)
+            if not retryable or attempt >= MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+        else:
+            metrics.observe(f"http.{host}", time.perf_counter() - start)
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+            if not retryable or attempt >= MAX_RETRIES:
+                return response
+            delay = _retry_delay(attempt, response)
+            response.close()
+
+        attempt += 1
+        metrics.increment(f"http.{host}.retries")
+        time.sleep(delay)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
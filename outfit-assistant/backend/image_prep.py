@@ -0,0 +1,107 @@
+"""
+Image Prep - One preprocessing stage for every photo we receive
+
+Photos arrive as whatever the browser produced: multi-megapixel phone JPEGs,
+PNG screenshots, sideways images relying on an EXIF orientation tag. Each is
+decoded once here, turned upright, downsized to the resolution the vision
+model actually looks at, stripped of metadata (EXIF, GPS, ICC) and re-encoded
+as JPEG. Everything downstream (OpenAI, Fal CDN, the arena photo store, the
+caches) works from the same bytes and their SHA-256.
+"""
+import base64
+import binascii
+import hashlib
+import math
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# GPT-4o's high detail mode scales images to fit 2048x2048 and then to a 768px
+# shortest side; anything larger is tokens and upload time spent for nothing
+MODEL_MAX_SHORT_SIDE = int(os.getenv('IMAGE_MAX_SHORT_SIDE', 768))
+MODEL_MAX_LONG_SIDE = int(os.getenv('IMAGE_MAX_LONG_SIDE', 2048))
+JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', 85))
+
+
+class PreparedImage:
+    """Normalized JPEG bytes plus the decoded image they were encoded from"""
+
+    __slots__ = ("data", "sha256", "image", "width", "height", "original_bytes")
+
+    content_type = "image/jpeg"
+
+    def __init__(self, data, image, original_bytes):
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.image = image
+        self.width, self.height = image.size
+        self.original_bytes = original_bytes
+
+    def data_url(self):
+        return f"data:{self.content_type};base64,{base64.b64encode(self.data).decode()}"
+
+
+def decode_data_url(data_url):
+    """
+    Decode a base64 image (with or without a data URL prefix)
+
+    Raises:
+        ValueError: If the data is not valid base64
+    """
+    if ',' in data_url:
+        data_url = data_url.split(',', 1)[1]
+    try:
+        return base64.b64decode(data_url, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid photo data. Please use base64-encoded image data.")
+
+
+def _target_size(width, height, max_short_side, max_long_side):
+    scale = min(1.0, max_short_side / min(width, height), max_long_side / max(width, height))
+    return max(1, math.floor(width * scale)), max(1, math.floor(height * scale))
+
+
+def prepare_image(photo, max_short_side=MODEL_MAX_SHORT_SIDE, max_long_side=MODEL_MAX_LONG_SIDE,
+                  quality=JPEG_QUALITY):
+    """
+    Decode, orient, downsize and re-encode a photo
+
+    Args:
+        photo: Base64 image (optionally a data URL) or raw bytes
+        max_short_side: Largest allowed shorter edge in pixels
+        max_long_side: Largest allowed longer edge in pixels
+        quality: JPEG quality
+
+    Returns:
+        PreparedImage: JPEG bytes, their SHA-256 and dimensions
+
+    Raises:
+        ValueError: If the data is not a readable image
+    """
+    original = photo if isinstance(photo, bytes) else decode_data_url(photo)
+    try:
+        image = Image.open(BytesIO(original))
+        target = _target_size(*image.size, max_short_side, max_long_side)
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft("RGB", target)
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError("Invalid photo data. Could not read image.")
+
+    # Orientation may have swapped the edges, so size against the upright image
+    target = _target_size(*image.size, max_short_side, max_long_side)
+    if target != image.size:
+        image = image.resize(target, Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    # No exif/icc_profile arguments, so the output carries no metadata
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return PreparedImage(buffer.getvalue(), image, len(original))
@@ -0,0 +1,147 @@
+"""
+Jobs Module - Runs long pipelines on a bounded worker pool
+
+Requests that take minutes (outfit generation) are queued here instead of
+holding a Flask worker. The client gets a job id back immediately and follows
+progress through GET /api/jobs/<id> or its server-sent event stream.
+"""
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import metrics
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while too many jobs are already waiting"""
+
+
+class JobQueue:
+    """In-process job registry backed by a fixed-size thread pool"""
+
+    def __init__(self, max_workers=4, max_pending=50, ttl_seconds=3600):
+        """
+        Args:
+            max_workers: Jobs executed concurrently
+            max_pending: Jobs allowed to wait for a worker before submissions are rejected
+            ttl_seconds: How long finished jobs stay queryable
+        """
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-worker")
+        self._changed = threading.Condition()
+        self._jobs = {}
+
+    def submit(self, kind, function, *args):
+        """
+        Queue a job
+
+        Args:
+            kind: Job type, used in status responses and metric names
+            function: Callable(*args, progress) returning a JSON-serializable result;
+                progress(stage) records the pipeline stage being worked on
+            *args: Arguments passed to function
+
+        Returns:
+            dict: Snapshot of the queued job
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting
+        """
+        with self._changed:
+            self._expire()
+            pending = sum(1 for job in self._jobs.values() if job["status"] == "queued")
+            if pending >= self.max_pending:
+                metrics.increment(f"jobs.{kind}.rejected")
+                raise QueueFullError(f"Too many {kind} jobs waiting, please try again shortly")
+
+            now = datetime.now().isoformat()
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "kind": kind,
+                "status": "queued",
+                "stage": None,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+                "version": 0,
+                "_queued_at": time.monotonic(),
+                "_finished_at": None
+            }
+            self._jobs[job["job_id"]] = job
+            snapshot = self._snapshot(job)
+
+        metrics.increment(f"jobs.{kind}.submitted")
+        self._executor.submit(self._run, job["job_id"], function, args)
+        return snapshot
+
+    def _run(self, job_id, function, args):
+        job = self._update(job_id, status="running")
+        kind = job["kind"]
+        started = time.monotonic()
+        metrics.observe(f"jobs.{kind}.wait", started - job["_queued_at"])
+        try:
+            result = function(*args, progress=lambda stage: self._update(job_id, stage=stage))
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e), _finished_at=time.monotonic())
+            metrics.increment(f"jobs.{kind}.failed")
+        else:
+            self._update(job_id, status="succeeded", result=result, _finished_at=time.monotonic())
+            metrics.increment(f"jobs.{kind}.succeeded")
+        metrics.observe(f"jobs.{kind}.run", time.monotonic() - started)
+
+    def _update(self, job_id, **changes):
+        with self._changed:
+            job = self._jobs[job_id]
+            job.update(changes)
+            job["updated_at"] = datetime.now().isoformat()
+            job["version"] += 1
+            self._changed.notify_all()
+            return dict(job)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["_finished_at"] is not None and job["_finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job):
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        with self._changed:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait(self, job_id, version, timeout):
+        """
+        Wait until a job changes
+
+        Args:
+            job_id: Job to watch
+            version: Last version seen by the caller (None returns immediately)
+            timeout: Maximum seconds to wait
+
+        Returns:
+            dict: Job snapshot (unchanged if the timeout expired), or None if unknown
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]["version"] != version,
+                timeout=timeout
+            )
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
@@ -0,0 +1,82 @@
+"""
+JSON Stream - Incremental parser for a JSON object arriving in chunks
+
+Model responses are streamed token by token. ObjectStream is fed the text as it
+arrives and hands back each top-level field of the object as soon as its value
+is complete, so "wow_factor" can be shown while the shopping recommendations
+are still being written.
+"""
+import json
+
+
+class ObjectStream:
+    """Yields (key, value) for each top-level member of a streamed JSON object"""
+
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self.done = False
+
+    def feed(self, chunk):
+        """
+        Add the next piece of text
+
+        Returns:
+            list: (key, value) pairs completed by this chunk, in document order
+
+        Raises:
+            ValueError: If a completed member is not valid JSON
+        """
+        self._text += chunk
+        members = []
+        text = self._text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None and self._key is None and self._value_start is None:
+                        self._key = json.loads(text[self._key_start:index + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = index
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]" or (char == "," and self._depth == 1):
+                if self._depth == 1 and self._value_start is not None:
+                    members.append(self._complete(text[self._value_start:index]))
+                if char != ",":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self.done = True
+            elif char == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = index + 1
+
+        self._position = len(text)
+        return members
+
+    def _complete(self, value_text):
+        try:
+            member = (self._key, json.loads(value_text))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON value for {self._key!r}: {e}")
+        self._key_start = self._key = self._value_start = None
+        return member
+
+    @property
+    def text(self):
+        """Everything fed so far"""
+        return self._text
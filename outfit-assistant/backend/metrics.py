@@ -0,0 +1,67 @@
+"""
+Metrics Module - In-process counters and latency timings reported by /api/metrics
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Number of recent samples kept per timing for percentile reporting
+MAX_SAMPLES = 1000
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_timing_counts = defaultdict(int)
+
+
+def increment(name, amount=1):
+    """Add to a named counter"""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, seconds):
+    """Record one latency sample in seconds"""
+    with _lock:
+        _timings[name].append(seconds)
+        _timing_counts[name] += 1
+
+
+@contextmanager
+def timer(name):
+    """Time the enclosed block and record it under name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def _percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def snapshot():
+    """
+    Get all metrics
+
+    Returns:
+        dict: counters, plus count/avg/p50/p95/max in milliseconds for each timing
+    """
+    with _lock:
+        counters = dict(_counters)
+        timings = {name: (sorted(samples), _timing_counts[name]) for name, samples in _timings.items()}
+
+    report = {}
+    for name, (samples, count) in timings.items():
+        if not samples:
+            continue
+        report[name] = {
+            "count": count,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "p50_ms": round(_percentile(samples, 0.5) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3)
+        }
+    return {"counters": counters, "timings": report}
@@ -0,0 +1,232 @@
+"""
+Model Output - Decode and validate JSON returned by the language model
+
+Model responses are decoded once (with orjson when it is installed), repaired
+if the completion was cut off mid-document, and checked against small typed
+classes for ratings and outfits. Endpoints get validated objects back, or a
+ModelOutputError that says what was wrong instead of a failure deep in the
+pipeline.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library decoder is used instead
+    orjson = None
+
+import metrics
+
+# Scores are on the 1-10 scale the prompts ask for
+SCORE_MIN = 1
+SCORE_MAX = 10
+
+
+class ModelOutputError(ValueError):
+    """Raised when a model response is not the JSON document we asked for"""
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def repair_truncated(text):
+    """
+    Close a JSON document that was cut off (e.g. the completion hit max_tokens)
+
+    Open strings, arrays and objects are closed; if that does not yield valid
+    JSON, the document is cut back to the last complete member.
+
+    Returns:
+        str: Repaired text, or None if it cannot be repaired
+    """
+    stack = []
+    in_string = escaped = False
+    last_member = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+        elif char == ",":
+            # Everything before a separator is a complete member
+            last_member = (index, list(stack))
+
+    candidates = [text.rstrip() + ('"' if in_string else "") + "".join(reversed(stack))]
+    if last_member is not None:
+        index, open_stack = last_member
+        candidates.append(text[:index] + "".join(reversed(open_stack)))
+    for candidate in candidates:
+        try:
+            loads(candidate)
+        except ValueError:
+            continue
+        return candidate
+    return None
+
+
+def decode(text, kind):
+    """
+    Decode a model JSON object, repairing truncation if needed
+
+    Args:
+        text: Raw completion text
+        kind: Response kind for error messages and metrics (e.g. "rating")
+
+    Returns:
+        dict: Decoded object
+
+    Raises:
+        ModelOutputError: If the text is not (repairable) JSON for an object
+    """
+    try:
+        value = loads(text)
+    except ValueError:
+        repaired = repair_truncated(text or "")
+        if repaired is None:
+            metrics.increment(f"model_output.{kind}.invalid")
+            raise ModelOutputError(f"Model returned invalid JSON for {kind}")
+        metrics.increment(f"model_output.{kind}.repaired")
+        value = loads(repaired)
+    if not isinstance(value, dict):
+        metrics.increment(f"model_output.{kind}.invalid")
+        raise ModelOutputError(f"Model returned {type(value).__name__} instead of an object for {kind}")
+    return value
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _texts(value):
+    if not isinstance(value, list):
+        return []
+    return [_text(item) for item in value if item is not None]
+
+
+def _score(data, field, kind):
+    value = data.get(field)
+    if isinstance(value, bool):
+        raise ModelOutputError(f"Model {kind} is missing a numeric {field}")
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise ModelOutputError(f"Model {kind} is missing a numeric {field}")
+    if not math.isfinite(score) or not SCORE_MIN <= score <= SCORE_MAX:
+        raise ModelOutputError(f"Model {kind} {field} {value!r} is not between {SCORE_MIN} and {SCORE_MAX}")
+    return int(score) if score.is_integer() else score
+
+
+class Record:
+    """Fixed-field record built from a model JSON object"""
+
+    __slots__ = ()
+
+    # Fields every instance has, in output order; text unless overridden below
+    FIELDS = ()
+    LISTS = {}
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+
+    @classmethod
+    def from_dict(cls, data):
+        values = {}
+        for field in cls.FIELDS:
+            value = data.get(field)
+            if field in cls.LISTS:
+                item_type = cls.LISTS[field]
+                if item_type is str:
+                    values[field] = _texts(value)
+                else:
+                    values[field] = [
+                        item_type.from_dict(item) for item in (value if isinstance(value, list) else [])
+                        if isinstance(item, dict)
+                    ]
+            else:
+                values[field] = _text(value)
+        return cls(**values)
+
+    def to_dict(self):
+        result = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, list):
+                value = [item.to_dict() if isinstance(item, Record) else item for item in value]
+            result[field] = value
+        return result
+
+
+class ShoppingItem(Record):
+    __slots__ = FIELDS = ("item", "description", "price", "reason")
+
+
+class Rating(Record):
+    __slots__ = FIELDS = (
+        "wow_factor", "occasion_fitness", "overall_rating",
+        "wow_factor_explanation", "occasion_fitness_explanation", "overall_explanation",
+        "strengths", "improvements", "suggestions", "roast", "shopping_recommendations"
+    )
+    SCORES = ("wow_factor", "occasion_fitness", "overall_rating")
+    LISTS = {
+        "strengths": str,
+        "improvements": str,
+        "suggestions": str,
+        "shopping_recommendations": ShoppingItem
+    }
+
+    @classmethod
+    def from_dict(cls, data):
+        rating = super().from_dict(data)
+        for field in cls.SCORES:
+            setattr(rating, field, _score(data, field, "rating"))
+        return rating
+
+
+class OutfitItem(Record):
+    __slots__ = FIELDS = ("type", "description", "color", "style_notes")
+
+
+class ProductRecommendation(Record):
+    __slots__ = FIELDS = ("item", "type", "brand", "description", "price", "reason")
+
+
+class Outfit(Record):
+    __slots__ = FIELDS = ("outfit_concept", "items", "color_palette", "occasion_notes", "product_recommendations")
+    LISTS = {"items": OutfitItem, "product_recommendations": ProductRecommendation}
+
+    @classmethod
+    def from_dict(cls, data):
+        outfit = super().from_dict(data)
+        if not outfit.items:
+            raise ModelOutputError("Model outfit has no items")
+        return outfit
+
+    def summary(self):
+        """Item descriptions for the image generation prompt"""
+        return " ".join(f"{item.description} in {item.color}" for item in self.items)
+
+
+def parse_rating(text):
+    """Decode and validate an outfit rating; raises ModelOutputError"""
+    return Rating.from_dict(decode(text, "rating"))
+
+
+def parse_outfit(text):
+    """Decode and validate an outfit description; raises ModelOutputError"""
+    return Outfit.from_dict(decode(text, "outfit"))
@@ -0,0 +1,82 @@
+"""
+Local stand-in for NanobananaAPI, for testing generation without the real service
+
+Implements /generate, /record-info and the completion callback. Each task
+succeeds after STUB_DELAY seconds with a generated placeholder image.
+
+Usage:
+    python nanobanana_stub.py [port]
+    NANOBANANA_API_BASE=http://localhost:5055 python app.py
+
+Set STUB_SKIP_CALLBACK=true to exercise the polling fallback.
+"""
+import os
+import sys
+import threading
+import uuid
+from io import BytesIO
+
+import requests
+from flask import Flask, request, jsonify, send_file
+from PIL import Image
+
+STUB_DELAY = float(os.getenv('STUB_DELAY', 3))
+STUB_SKIP_CALLBACK = os.getenv('STUB_SKIP_CALLBACK', 'false').lower() == 'true'
+
+app = Flask(__name__)
+tasks = {}
+
+
+def complete_task(task_id, base_url):
+    task = tasks[task_id]
+    task["successFlag"] = 1
+    task["response"] = {"resultImageUrl": f"{base_url}/images/{task_id}.jpg"}
+
+    callback_url = task["callBackUrl"]
+    if STUB_SKIP_CALLBACK or not callback_url or "webhook.site" in callback_url:
+        return
+    try:
+        requests.post(callback_url, json={
+            "code": 200,
+            "msg": "Image generated successfully.",
+            "data": {"taskId": task_id, "info": {"resultImageUrl": task["response"]["resultImageUrl"]}}
+        }, timeout=10)
+        print(f"✓ Callback sent for task {task_id}")
+    except requests.RequestException as e:
+        print(f"Callback for task {task_id} failed: {e}")
+
+
+@app.route('/generate', methods=['POST'])
+def generate():
+    if not request.headers.get('Authorization', '').startswith('Bearer '):
+        return jsonify({"code": 401, "msg": "Missing API key"}), 401
+
+    task_id = uuid.uuid4().hex
+    tasks[task_id] = {"successFlag": 0, "callBackUrl": request.json.get('callBackUrl')}
+    threading.Timer(STUB_DELAY, complete_task, args=(task_id, request.host_url.rstrip('/'))).start()
+    return jsonify({"code": 200, "msg": "success", "data": {"taskId": task_id}})
+
+
+@app.route('/record-info', methods=['GET'])
+def record_info():
+    task = tasks.get(request.args.get('taskId'))
+    if task is None:
+        return jsonify({"code": 404, "msg": "Task not found"})
+    return jsonify({"code": 200, "msg": "success", "data": {
+        "taskId": request.args.get('taskId'),
+        "successFlag": task["successFlag"],
+        "response": task.get("response", {})
+    }})
+
+
+@app.route('/images/<task_id>.jpg', methods=['GET'])
+def image(task_id):
+    buffer = BytesIO()
+    Image.new('RGB', (768, 1024), (180, 140, 200)).save(buffer, format='JPEG')
+    buffer.seek(0)
+    return send_file(buffer, mimetype='image/jpeg')
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5055
+    app.run(host='127.0.0.1', port=port, threaded=True)
@@ -0,0 +1,182 @@
+"""
+Perceptual Cache - Results cached by what an image looks like, not its exact bytes
+
+The same outfit photo comes back re-encoded, resized or re-cropped by the
+browser, so byte hashes rarely repeat. Images are reduced to a 64-bit
+difference hash (dHash) and a lookup returns the closest cached entry within
+max_distance differing bits. Entries are grouped by an exact context (e.g.
+occasion and budget) and each group is indexed by a BK-tree, so a lookup only
+visits hashes that can be within range instead of scanning every entry.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+import metrics
+
+HASH_SIZE = 8
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Difference hash of an image
+
+    The image is upright-rotated, converted to grayscale and shrunk to
+    (hash_size + 1) x hash_size; each bit records whether a pixel is brighter
+    than its right-hand neighbour.
+
+    Args:
+        image: PIL Image
+        hash_size: Bits per row/column (64-bit hash by default)
+
+    Returns:
+        int: hash_size * hash_size bit hash
+    """
+    image = ImageOps.exif_transpose(image).convert("L")
+    image = image.resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = image.tobytes()  # one byte per grayscale pixel
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Metric tree over hashes under Hamming distance"""
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, value):
+        if self._root is None:
+            self._root = (value, {})
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Return [(distance, hash)] for every hash within radius of value"""
+        matches = []
+        pending = [self._root] if self._root is not None else []
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= radius:
+                matches.append((distance, node[0]))
+            # Triangle inequality: only children at distance-radius..distance+radius can match
+            for child_distance, child in node[1].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    pending.append(child)
+        return matches
+
+
+class PerceptualCache:
+    """LRU cache with TTL, looked up by nearest perceptual hash within a context"""
+
+    def __init__(self, name, max_entries=5000, ttl_seconds=86400, max_distance=4):
+        """
+        Args:
+            name: Metrics prefix (cache.<name>.hits, ...)
+            max_entries: Entries kept before the least recently used one is evicted
+            ttl_seconds: Seconds an entry stays valid after set()
+            max_distance: Largest Hamming distance treated as the same image
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._trees = {}
+        self._live = {}
+
+    def get(self, image_hash, context):
+        """
+        Return the value cached for the nearest matching image, or None
+
+        Args:
+            image_hash: dhash() of the image
+            context: Hashable value that must match exactly (e.g. occasion and budget)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tree = self._trees.get(context)
+            candidates = tree.search(image_hash, self.max_distance) if tree else []
+            best = None
+            for distance, candidate in sorted(candidates):
+                key = (context, candidate)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if entry[0] <= now:
+                    self._remove(key)
+                    continue
+                best = (key, distance, entry[1])
+                break
+            if best is None:
+                metrics.increment(f"cache.{self.name}.misses")
+                return None
+            self._entries.move_to_end(best[0])
+        metrics.increment(f"cache.{self.name}.hits")
+        if best[1]:
+            metrics.increment(f"cache.{self.name}.near_hits")
+        return best[2]
+
+    def set(self, image_hash, context, value):
+        key = (context, image_hash)
+        evicted = 0
+        with self._lock:
+            if key not in self._entries:
+                self._live[context] = self._live.get(context, 0) + 1
+                self._trees.setdefault(context, BKTree()).add(image_hash)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+        if evicted:
+            metrics.increment(f"cache.{self.name}.evictions", evicted)
+
+    def _remove(self, key):
+        """Drop an entry; rebuild its context's tree once it is mostly dead hashes"""
+        del self._entries[key]
+        context = key[0]
+        self._live[context] -= 1
+        if not self._live[context]:
+            del self._live[context]
+            del self._trees[context]
+        elif self._trees[context].size > 2 * self._live[context]:
+            tree = BKTree()
+            for entry_context, image_hash in self._entries:
+                if entry_context == context:
+                    tree.add(image_hash)
+            self._trees[context] = tree
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._trees.clear()
+            self._live.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,91 @@
+"""
+Pipeline Module - Runs a small DAG of stages, each as soon as its inputs are ready
+
+A request pipeline is declared as named stages with the stages they depend on.
+Stages whose dependencies are satisfied run concurrently on a shared thread
+pool; a stage receives its dependencies' results as positional arguments.
+Every stage's duration is recorded under pipeline.<name>.<stage>.
+"""
+import queue
+import time
+
+import metrics
+
+
+class Pipeline:
+    """One run of a stage graph; build it, then call run() once"""
+
+    def __init__(self, name, executor):
+        """
+        Args:
+            name: Pipeline name, used as the metrics prefix
+            executor: concurrent.futures executor the stages run on
+        """
+        self.name = name
+        self.executor = executor
+        self._stages = {}
+        self.timings = {}
+
+    def stage(self, name, function, *dependencies):
+        """
+        Declare a stage
+
+        Args:
+            name: Stage name, unique within the pipeline
+            function: Callable(*dependency_results) returning the stage result
+            *dependencies: Names of stages that must finish first (declared earlier)
+        """
+        if name in self._stages:
+            raise ValueError(f"Stage {name} declared twice")
+        for dependency in dependencies:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage {name} depends on undeclared stage {dependency}")
+        self._stages[name] = (function, dependencies)
+
+    def _timed(self, name, function, args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = elapsed
+            metrics.observe(f"pipeline.{self.name}.{name}", elapsed)
+
+    def run(self, progress=None):
+        """
+        Execute every stage
+
+        Args:
+            progress: Optional callable(stage) invoked as each stage starts
+
+        Returns:
+            dict: Stage name -> result
+
+        Raises:
+            Exception: The first stage failure; stages not yet started are skipped
+        """
+        results = {}
+        running = {}
+        # Futures in the order they finish, so the earliest failure is the one raised
+        finished = queue.Queue()
+        waiting = dict(self._stages)
+        start = time.perf_counter()
+        try:
+            while waiting or running:
+                for name, (function, dependencies) in list(waiting.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        del waiting[name]
+                        if progress:
+                            progress(name)
+                        args = [results[dependency] for dependency in dependencies]
+                        future = self.executor.submit(self._timed, name, function, args)
+                        running[future] = name
+                        future.add_done_callback(finished.put)
+                future = finished.get()
+                # Re-raises a stage failure; the finally below abandons the rest
+                results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+            metrics.observe(f"pipeline.{self.name}", time.perf_counter() - start)
+        return results
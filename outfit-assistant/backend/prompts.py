@@ -0,0 +1,284 @@
+"""
+Prompts - Compiled prompt templates, response schemas and token accounting
+
+Templates are parsed once at import and rendered per request by joining the
+precompiled pieces. With OPENAI_STRUCTURED_OUTPUTS enabled (the default) the
+response shape is sent as a JSON schema in response_format instead of being
+spelled out in every prompt, which removes a few hundred input tokens per call.
+
+Prompts are kept under PROMPT_TOKEN_BUDGET by trimming their optional sections
+(conditions first, then brands). Token usage reported by OpenAI is counted per
+endpoint under openai.<endpoint>.* in /api/metrics.
+"""
+import os
+import string
+
+try:
+    import tiktoken
+except ImportError:  # Optional; token counts fall back to an estimate
+    tiktoken = None
+
+import metrics
+
+STRUCTURED_OUTPUTS = os.getenv('OPENAI_STRUCTURED_OUTPUTS', 'true').lower() == 'true'
+# Text tokens allowed per prompt (images are billed separately)
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 800))
+
+_encoding = None
+if tiktoken is not None:
+    try:
+        _encoding = tiktoken.get_encoding("o200k_base")  # GPT-4o tokenizer
+    except Exception as e:
+        print(f"Could not load tokenizer, estimating prompt tokens: {e}")
+
+# Rough characters per token for English text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text):
+    """Number of GPT-4o tokens in text (estimated without tiktoken)"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+# Input tokens OpenAI bills for one normalized photo (768x1024, high detail: 4 tiles)
+IMAGE_TOKENS = 765
+
+
+def estimate_request_tokens(prompt, max_tokens, images=0):
+    """
+    Tokens a chat completion counts against the tokens-per-minute limit
+
+    OpenAI reserves max_tokens for the completion up front, so it is counted in
+    full alongside the prompt and attached images.
+    """
+    return count_tokens(prompt) + images * IMAGE_TOKENS + max_tokens
+
+
+def _truncate_tokens(text, tokens):
+    """Keep the first `tokens` tokens of text"""
+    if tokens <= 0:
+        return ""
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:tokens])
+    return text[:tokens * CHARS_PER_TOKEN]
+
+
+class PromptTemplate:
+    """A str.format-style template parsed once into literal and field pieces"""
+
+    def __init__(self, name, text, optional=()):
+        """
+        Args:
+            name: Metrics prefix (prompts.<name>.*)
+            text: Template using {field} placeholders ({{ and }} for braces)
+            optional: Fields that may be trimmed to fit the token budget,
+                least important last
+        """
+        self.name = name
+        self.optional = tuple(optional)
+        self._pieces = [
+            (literal, field, spec)
+            for literal, field, spec, _ in string.Formatter().parse(text)
+        ]
+        self.fields = {field for _, field, _ in self._pieces if field}
+        unknown = set(self.optional) - self.fields
+        if unknown:
+            raise ValueError(f"Template {name} has no fields {sorted(unknown)}")
+
+    def render(self, **values):
+        parts = []
+        for literal, field, spec in self._pieces:
+            parts.append(literal)
+            if field is not None:
+                parts.append(format(values[field], spec or ""))
+        return "".join(parts)
+
+    def render_within(self, budget=None, **values):
+        """
+        Render, trimming optional fields (last first) until the prompt fits budget
+
+        Returns:
+            str: The prompt; may still exceed budget if the required text alone does
+        """
+        budget = budget or PROMPT_TOKEN_BUDGET
+        text = self.render(**values)
+        tokens = count_tokens(text)
+        for field in reversed(self.optional):
+            if tokens <= budget:
+                break
+            if not values[field]:
+                continue
+            metrics.increment(f"prompts.{self.name}.trimmed")
+            # Token counts are not additive across a join, so one cut can fall short
+            while tokens > budget and values[field]:
+                value = values[field]
+                values[field] = _truncate_tokens(value, count_tokens(value) - (tokens - budget))
+                text = self.render(**values)
+                tokens = count_tokens(text)
+        metrics.increment(f"prompts.{self.name}.rendered")
+        metrics.increment(f"prompts.{self.name}.tokens", tokens)
+        return text
+
+
+def record_usage(endpoint, usage):
+    """Count prompt and completion tokens reported by OpenAI for an endpoint"""
+    metrics.increment(f"openai.{endpoint}.calls")
+    if usage is None:
+        return
+    metrics.increment(f"openai.{endpoint}.prompt_tokens", usage.prompt_tokens or 0)
+    metrics.increment(f"openai.{endpoint}.completion_tokens", usage.completion_tokens or 0)
+
+
+def _object(**properties):
+    """Strict-mode object schema: every property required, nothing else allowed"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+_STRING = {"type": "string"}
+_NUMBER = {"type": "number"}
+_STRINGS = {"type": "array", "items": _STRING}
+
+RATING_SCHEMA = _object(
+    wow_factor=_NUMBER,
+    occasion_fitness=_NUMBER,
+    overall_rating=_NUMBER,
+    wow_factor_explanation=_STRING,
+    occasion_fitness_explanation=_STRING,
+    overall_explanation=_STRING,
+    strengths=_STRINGS,
+    improvements=_STRINGS,
+    suggestions=_STRINGS,
+    roast=_STRING,
+    shopping_recommendations={"type": "array", "items": _object(
+        item=_STRING, description=_STRING, price=_STRING, reason=_STRING
+    )}
+)
+
+OUTFIT_SCHEMA = _object(
+    outfit_concept=_STRING,
+    items={"type": "array", "items": _object(
+        type=_STRING, description=_STRING, color=_STRING, style_notes=_STRING
+    )},
+    color_palette=_STRING,
+    occasion_notes=_STRING,
+    product_recommendations={"type": "array", "items": _object(
+        item=_STRING, type=_STRING, brand=_STRING, description=_STRING, price=_STRING, reason=_STRING
+    )}
+)
+
+
+def response_format(name, schema):
+    """response_format for chat.completions: the JSON schema, or plain JSON mode"""
+    if not STRUCTURED_OUTPUTS:
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+
+
+RATING_FORMAT = """
+
+Format your response as JSON with this structure:
+{
+  "wow_factor": <number>,
+  "occasion_fitness": <number>,
+  "overall_rating": <number>,
+  "wow_factor_explanation": "<brief explanation>",
+  "occasion_fitness_explanation": "<brief explanation>",
+  "overall_explanation": "<brief explanation>",
+  "strengths": ["<strength1>", "<strength2>", ...],
+  "improvements": ["<improvement1>", "<improvement2>", ...],
+  "suggestions": ["<suggestion1>", "<suggestion2>", ...],
+  "roast": "<humorous witty roast of the outfit>",
+  "shopping_recommendations": [
+    {
+      "item": "<item name>",
+      "description": "<description>",
+      "price": "<estimated price>",
+      "reason": "<why this would enhance the outfit>"
+    }
+  ]
+}"""
+
+RATING = PromptTemplate("rating", """Analyze this outfit for a {occasion}{budget_text}.
+
+Please provide:
+1. Wow Factor Score (1-10): Rate the overall visual impact and style
+2. Occasion Fitness Score (1-10): How appropriate is this for {occasion}?
+3. Overall Rating (1-10): Combined assessment
+
+Then provide detailed feedback including:
+- Strengths of the outfit
+- Areas for improvement
+- Specific suggestions for colors, fit, accessories
+- 3-5 shopping recommendations with descriptions
+- A humorous "roast" - brutally honest, witty, and playful criticism about the outfit (2-3 sentences, make it funny but not mean-spirited){format}""")
+
+OUTFIT_FORMAT = """
+
+Format as JSON:
+{
+  "outfit_concept": "<overall concept and inspiration>",
+  "items": [
+    {
+      "type": "<item type>",
+      "description": "<detailed description>",
+      "color": "<color>",
+      "style_notes": "<why this works>"
+    }
+  ],
+  "color_palette": "<description of colors and why they work>",
+  "occasion_notes": "<why this works for the occasion>",
+  "product_recommendations": [
+    {
+      "item": "<item name>",
+      "type": "<clothing type>",
+      "brand": "<suggested brand>",
+      "description": "<description>",
+      "price": "<estimated price>",
+      "reason": "<why recommended>"
+    }
+  ]
+}"""
+
+OUTFIT = PromptTemplate("outfit", """Create a detailed outfit recommendation for {occasion}.
+
+Style level: {wow_factor}/10 ({style_desc})
+Preferences:{brand_text}{budget_text}
+{conditions_text}
+
+Provide:
+1. Complete outfit description (top, bottom, shoes, accessories)
+2. Color palette and why it works
+3. Style notes and occasion appropriateness
+4. 5-8 specific product recommendations with:
+   - Item type and description
+   - Estimated price
+   - Why it fits the outfit{format}""", optional=("brand_text", "conditions_text"))
+
+
+def rating_prompt(occasion, budget):
+    """Prompt asking GPT-4o to rate the attached outfit photo"""
+    return RATING.render_within(
+        occasion=occasion,
+        budget_text=f" with a budget of {budget}" if budget else "",
+        format="" if STRUCTURED_OUTPUTS else RATING_FORMAT
+    )
+
+
+def outfit_prompt(occasion, wow_factor, style_desc, brands, budget, conditions):
+    """Prompt asking GPT-4o to design an outfit"""
+    return OUTFIT.render_within(
+        occasion=occasion,
+        wow_factor=wow_factor,
+        style_desc=style_desc,
+        brand_text=f" from brands like {', '.join(brands)}" if brands else "",
+        budget_text=f" within a budget of {budget}" if budget else "",
+        conditions_text=f" Additional requirements: {conditions}." if conditions else "",
+        format="" if STRUCTURED_OUTPUTS else OUTFIT_FORMAT
+    )
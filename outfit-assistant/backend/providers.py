@@ -0,0 +1,501 @@
+"""
+Providers - Pluggable model backends for rating, outfit text and image editing
+
+Endpoints talk to three small interfaces instead of vendor SDKs: VisionRater
+rates the outfit in a photo, OutfitWriter designs an outfit, and ImageEditor
+dresses the person in a photo. The live implementations are OpenAI GPT-4o and
+Fal CDN + NanobananaAPI. StubProvider answers all three locally with canned
+outputs after a random latency drawn from a configurable distribution, so the
+server can be load-tested and benchmarked offline without keys or spend.
+
+MODEL_PROVIDER picks "live" (default) or "stub" for all three; RATING_PROVIDER,
+OUTFIT_PROVIDER and IMAGE_PROVIDER override it per capability.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import fal_client
+import openai
+import requests
+from PIL import Image, ImageFile
+
+import http_client
+import prompts
+import task_poller
+
+OPENAI_MODEL = "gpt-4o"
+
+# Token counts as reported by the provider (OpenAI's usage object has the same fields)
+Usage = namedtuple("Usage", "prompt_tokens completion_tokens")
+# A finished completion; finish_reason is "length" when it hit max_tokens
+Completion = namedtuple("Completion", "text finish_reason usage")
+# A piece of a streamed completion; usage is set on the last one only
+Chunk = namedtuple("Chunk", "text usage")
+
+
+class VisionRater(ABC):
+    """Rates the outfit in a photo, answering with rating JSON (prompts.RATING_SCHEMA)"""
+
+    name = "base"
+    model = None
+
+    @abstractmethod
+    def rate(self, prompt, photo, max_tokens):
+        """Rate image_prep.PreparedImage photo; returns a Completion"""
+
+    @abstractmethod
+    def stream_rating(self, prompt, photo, max_tokens):
+        """Like rate(), yielding Chunks as the rating is written"""
+
+
+class OutfitWriter(ABC):
+    """Designs an outfit, answering with outfit JSON (prompts.OUTFIT_SCHEMA)"""
+
+    name = "base"
+    model = None
+
+    @abstractmethod
+    def describe(self, prompt, photo, max_tokens):
+        """Returns a Completion; photo (PreparedImage) is None without a user photo"""
+
+
+class ImageEditor(ABC):
+    """Generates a photo of the user's person wearing a described outfit"""
+
+    name = "base"
+
+    def missing_configuration(self):
+        """Error message if the editor cannot run (e.g. no API key), else None"""
+        return None
+
+    @abstractmethod
+    def upload(self, photo):
+        """Make a PreparedImage available to edit(); returns a reference (URL)"""
+
+    @abstractmethod
+    def edit(self, image_reference, prompt):
+        """Returns the generated PIL Image"""
+
+
+def _messages(prompt, photo):
+    if photo is None:
+        return [{"role": "user", "content": prompt}]
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": photo.data_url()}}
+        ]
+    }]
+
+
+class OpenAIProvider(VisionRater, OutfitWriter):
+    """GPT-4o chat completions with structured outputs"""
+
+    name = "openai"
+
+    def __init__(self, model=OPENAI_MODEL):
+        self.model = model
+
+    def _create(self, prompt, photo, max_tokens, schema_name, schema, **options):
+        return openai.chat.completions.create(
+            model=self.model,
+            messages=_messages(prompt, photo),
+            max_tokens=max_tokens,
+            response_format=prompts.response_format(schema_name, schema),
+            **options
+        )
+
+    @staticmethod
+    def _completion(response):
+        choice = response.choices[0]
+        return Completion(choice.message.content, choice.finish_reason, response.usage)
+
+    def rate(self, prompt, photo, max_tokens):
+        return self._completion(self._create(prompt, photo, max_tokens, "outfit_rating", prompts.RATING_SCHEMA))
+
+    def stream_rating(self, prompt, photo, max_tokens):
+        stream = self._create(
+            prompt, photo, max_tokens, "outfit_rating", prompts.RATING_SCHEMA,
+            stream=True, stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            # Final chunk carries token usage and no choices
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            usage = getattr(chunk, "usage", None)
+            if text or usage:
+                yield Chunk(text or "", usage)
+
+    def describe(self, prompt, photo, max_tokens):
+        return self._completion(self._create(prompt, photo, max_tokens, "outfit_description", prompts.OUTFIT_SCHEMA))
+
+
+def download_image(url, max_bytes):
+    """
+    Stream an image from url straight into the decoder
+
+    Args:
+        url: Image URL
+        max_bytes: Largest download accepted
+
+    Returns:
+        tuple: (PIL Image, number of bytes downloaded)
+
+    Raises:
+        ValueError: If the image is larger than max_bytes or cannot be decoded
+    """
+    with http_client.get(url, stream=True) as response:
+        response.raise_for_status()
+        declared = int(response.headers.get('Content-Length') or 0)
+        if declared > max_bytes:
+            raise ValueError(f"Generated image too large: {declared} bytes")
+
+        parser = ImageFile.Parser()
+        downloaded = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            downloaded += len(chunk)
+            if downloaded > max_bytes:
+                raise ValueError(f"Generated image exceeds {max_bytes} bytes")
+            parser.feed(chunk)
+
+    try:
+        return parser.close(), downloaded
+    except OSError as e:
+        raise ValueError(f"Could not decode generated image: {e}")
+
+
+class NanobananaImageEditor(ImageEditor):
+    """
+    Photo upload to Fal CDN, then a NanobananaAPI image-to-image task
+
+    Task completion arrives through the callback endpoint when PUBLIC_BASE_URL
+    is set; one shared poller checks outstanding tasks as a fallback.
+    """
+
+    name = "nanobanana"
+    task_timeout = 120
+
+    def __init__(self):
+        self.api_key = os.getenv('NANOBANANA_API_KEY')
+        # Override to point at a local stub server (nanobanana_stub.py) when testing
+        self.api_base = os.getenv('NANOBANANA_API_BASE', 'https://api.nanobananaapi.ai/api/v1/nanobanana').rstrip('/')
+        # Completion callbacks need a publicly reachable URL for this server. Without
+        # one we rely on polling alone; with one, polling only backs up missed callbacks.
+        self.public_base_url = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+        self.callback_secret = os.getenv('NANOBANANA_CALLBACK_SECRET')
+        if self.public_base_url and not self.callback_secret:
+            # A per-process secret would reject callbacks for tasks started by other workers
+            raise ValueError("NANOBANANA_CALLBACK_SECRET must be set when PUBLIC_BASE_URL is set")
+        self.fallback_poll_delay = float(os.getenv('NANOBANANA_FALLBACK_POLL_DELAY', 15))
+        # Largest generated image we are willing to download
+        self.max_image_bytes = int(os.getenv('MAX_GENERATED_IMAGE_BYTES', 20 * 1024 * 1024))
+        self.poller = task_poller.TaskPoller(self.check_task, name="nanobanana_poller")
+
+    def missing_configuration(self):
+        if not self.api_key:
+            return "NANOBANANA_API_KEY not configured. Please add it to your .env file."
+        return None
+
+    def callback_url(self):
+        """Public URL NanobananaAPI should call on completion, or None if callbacks are disabled"""
+        if not self.public_base_url:
+            return None
+        return f"{self.public_base_url}/api/callbacks/nanobanana?token={self.callback_secret}"
+
+    def upload(self, photo):
+        # Straight from memory to Fal CDN; NanobananaAPI fetches it from the public URL
+        return fal_client.upload(photo.data, photo.content_type)
+
+    def edit(self, image_reference, prompt):
+        if not self.api_key:
+            raise Exception("NANOBANANA_API_KEY not configured")
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {
+            "prompt": prompt,
+            "type": "IMAGETOIAMGE",  # Image to Image editing
+            "imageUrls": [image_reference],
+            "numImages": 1,
+            "image_size": "3:4",  # Portrait format for fashion
+            # Without a public URL the callback goes nowhere and we poll instead
+            "callBackUrl": self.callback_url() or "https://webhook.site/dummy"
+        }
+
+        print(f"✓ Calling NanobananaAPI...")
+        response = http_client.post(f"{self.api_base}/generate", headers=headers, json=payload)
+
+        if response.status_code != 200:
+            raise Exception(f"NanobananaAPI request failed: {response.status_code} - {response.text}")
+
+        task_data = response.json()
+        if task_data.get('code') != 200:
+            raise Exception(f"NanobananaAPI error: {task_data.get('msg')}")
+
+        task_id = task_data['data']['taskId']
+        print(f"✓ Task submitted: {task_id}")
+
+        # Wait for the completion callback, or the shared poller as a fallback
+        try:
+            generated_image_url = self.poller.track(
+                task_id,
+                timeout=self.task_timeout,
+                initial_delay=self.fallback_poll_delay if self.callback_url() else None
+            ).result()
+        except TimeoutError:
+            raise Exception("Task timeout - image generation took too long")
+
+        print(f"✓ Image generated: {generated_image_url}")
+        image, downloaded_bytes = download_image(generated_image_url, self.max_image_bytes)
+        print(f"✓ Image downloaded: {downloaded_bytes} bytes")
+        return image
+
+    def check_task(self, task_id):
+        """
+        Check the status of a NanobananaAPI task once
+
+        Returns:
+            str: Generated image URL, or None while the task is still running
+
+        Raises:
+            Exception: If the task failed
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        try:
+            status_response = http_client.get(
+                f"{self.api_base}/record-info?taskId={task_id}",
+                headers=headers,
+                timeout=(http_client.CONNECT_TIMEOUT, 10)
+            )
+        except requests.RequestException as e:
+            print(f"Status check failed for task {task_id}: {e}")
+            return None
+
+        if status_response.status_code != 200:
+            print(f"Status check failed: {status_response.status_code}")
+            return None
+
+        status_data = status_response.json()
+        if status_data.get('code') != 200:
+            return None
+
+        task_info = status_data.get('data', {})
+        success_flag = task_info.get('successFlag')
+
+        if success_flag == 1:
+            # Task completed successfully
+            generated_image_url = task_info.get('response', {}).get('resultImageUrl')
+            if not generated_image_url:
+                print(f"Task {task_id}: success flag is 1 but no resultImageUrl found")
+            return generated_image_url
+        elif success_flag is not None and success_flag != 0:
+            # If successFlag exists and is not 0 or 1, treat as error
+            error_msg = task_info.get('errorMessage', 'Unknown error')
+            raise Exception(f"Task failed: {error_msg}")
+        return None
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution in seconds
+
+    Args:
+        spec: "fixed:S", "uniform:LOW:HIGH", "normal:MEAN:STDDEV" or
+            "lognormal:MEDIAN:SIGMA" (a long right tail, like real model calls)
+
+    Returns:
+        callable: (random.Random) -> seconds, never negative
+
+    Raises:
+        ValueError: If the spec is not one of the above
+    """
+    kind, _, params = spec.strip().partition(":")
+    try:
+        values = [float(value) for value in params.split(":")] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency distribution: {spec!r}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2 and values[0] > 0:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency distribution: {spec!r}")
+
+
+# Default stub latencies, roughly what the live vendors take
+STUB_LATENCIES = {
+    "rating": "lognormal:5:0.35",
+    "outfit": "lognormal:7:0.35",
+    "upload": "uniform:0.2:0.6",
+    "image": "lognormal:15:0.3"
+}
+# Share of a streamed rating's latency spent before the first chunk
+STUB_FIRST_CHUNK_SHARE = 0.3
+STUB_CHUNK_CHARS = 24
+
+STUB_RATING = {
+    "wow_factor": 7,
+    "occasion_fitness": 8,
+    "overall_rating": 7,
+    "wow_factor_explanation": "Clean lines and a confident colour choice.",
+    "occasion_fitness_explanation": "Appropriate for the occasion with room to dress up.",
+    "overall_explanation": "A solid, well-fitted outfit.",
+    "strengths": ["Good fit", "Cohesive colours"],
+    "improvements": ["Add a statement accessory"],
+    "suggestions": ["Try a leather belt", "Swap in loafers"],
+    "roast": "Your outfit called; it wants to know why it's this sensible.",
+    "shopping_recommendations": [
+        {"item": "Leather belt", "description": "Brown, slim buckle", "price": "$40", "reason": "Defines the waist"}
+    ]
+}
+
+STUB_OUTFIT = {
+    "outfit_concept": "Relaxed smart casual",
+    "items": [
+        {"type": "top", "description": "linen shirt", "color": "white", "style_notes": "Light and breathable"},
+        {"type": "bottom", "description": "tailored chinos", "color": "navy", "style_notes": "Sharp but comfortable"},
+        {"type": "shoes", "description": "suede loafers", "color": "tan", "style_notes": "Easy to dress up"}
+    ],
+    "color_palette": "White, navy and tan: classic and easy to match.",
+    "occasion_notes": "Polished without trying too hard.",
+    "product_recommendations": [
+        {"item": "Linen shirt", "type": "top", "brand": "Uniqlo", "description": "Relaxed fit", "price": "$30", "reason": "Breathable staple"}
+    ]
+}
+
+
+class StubProvider(VisionRater, OutfitWriter, ImageEditor):
+    """
+    Local stand-in for every capability: canned outputs after random latencies
+
+    Outputs depend only on the inputs (scores are derived from the photo, the
+    generated image from the prompt), and latencies come from a seeded generator,
+    so runs are repeatable. Token usage is counted as for a real call.
+    """
+
+    name = "stub"
+    model = "stub"
+
+    def __init__(self, latencies=None, seed=0, rating=None, outfit=None):
+        """
+        Args:
+            latencies: {capability: parse_latency spec} for "rating", "outfit",
+                "upload" and "image", merged over STUB_LATENCIES
+            seed: Seed of the latency generator
+            rating: Canned rating object (defaults to STUB_RATING)
+            outfit: Canned outfit object (defaults to STUB_OUTFIT)
+        """
+        specs = dict(STUB_LATENCIES, **(latencies or {}))
+        self.latencies = {kind: parse_latency(spec) for kind, spec in specs.items()}
+        self.rating = rating or STUB_RATING
+        self.outfit = outfit or STUB_OUTFIT
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _latency(self, kind):
+        with self._lock:
+            return self.latencies[kind](self._random)
+
+    @staticmethod
+    def _usage(prompt, photo, text):
+        images = 1 if photo is not None else 0
+        return Usage(prompts.count_tokens(prompt) + images * prompts.IMAGE_TOKENS, prompts.count_tokens(text))
+
+    def _rating_text(self, photo):
+        # Scores vary by photo so batch rankings have something to order
+        digest = int(photo.sha256[:8], 16) if photo is not None else 0
+        rating = dict(self.rating)
+        for offset, field in enumerate(("wow_factor", "occasion_fitness", "overall_rating")):
+            rating[field] = 1 + (digest >> (8 * offset)) % 10
+        return json.dumps(rating)
+
+    def rate(self, prompt, photo, max_tokens):
+        time.sleep(self._latency("rating"))
+        text = self._rating_text(photo)
+        return Completion(text, "stop", self._usage(prompt, photo, text))
+
+    def stream_rating(self, prompt, photo, max_tokens):
+        latency = self._latency("rating")
+        text = self._rating_text(photo)
+        pieces = [text[start:start + STUB_CHUNK_CHARS] for start in range(0, len(text), STUB_CHUNK_CHARS)]
+        time.sleep(latency * STUB_FIRST_CHUNK_SHARE)
+        for piece in pieces:
+            yield Chunk(piece, None)
+            time.sleep(latency * (1 - STUB_FIRST_CHUNK_SHARE) / len(pieces))
+        yield Chunk("", self._usage(prompt, photo, text))
+
+    def describe(self, prompt, photo, max_tokens):
+        time.sleep(self._latency("outfit"))
+        text = json.dumps(self.outfit)
+        return Completion(text, "stop", self._usage(prompt, photo, text))
+
+    def upload(self, photo):
+        time.sleep(self._latency("upload"))
+        return f"stub://{photo.sha256}"
+
+    def edit(self, image_reference, prompt):
+        time.sleep(self._latency("image"))
+        shade = hashlib.sha256(f"{image_reference}\n{prompt}".encode("utf-8")).digest()
+        return Image.new('RGB', (768, 1024), tuple(shade[:3]))
+
+
+def _stub_from_env():
+    latencies = {
+        kind: os.getenv(f'STUB_{kind.upper()}_LATENCY')
+        for kind in STUB_LATENCIES
+        if os.getenv(f'STUB_{kind.upper()}_LATENCY')
+    }
+    canned = {}
+    outputs_dir = os.getenv('STUB_OUTPUTS_DIR')
+    if outputs_dir:
+        for kind in ("rating", "outfit"):
+            path = os.path.join(outputs_dir, f"{kind}.json")
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    canned[kind] = json.load(f)
+    return StubProvider(latencies, seed=int(os.getenv('STUB_SEED', 0)), **canned)
+
+
+def create_providers():
+    """
+    Build the configured providers (read from the environment at call time)
+
+    Returns:
+        tuple: (VisionRater, OutfitWriter, ImageEditor)
+
+    Raises:
+        ValueError: If a provider name or stub latency setting is unknown
+    """
+    default = os.getenv('MODEL_PROVIDER', 'live').lower()
+    choices = {
+        capability: (os.getenv(f'{capability.upper()}_PROVIDER') or default).lower()
+        for capability in ("rating", "outfit", "image")
+    }
+    live = {"rating": OpenAIProvider, "outfit": OpenAIProvider, "image": NanobananaImageEditor}
+
+    stub = None
+    built = []
+    for capability, choice in choices.items():
+        if choice == "stub":
+            # One stub shares its latency generator across capabilities
+            stub = stub or _stub_from_env()
+            built.append(stub)
+        elif choice == "live":
+            built.append(live[capability]())
+        else:
+            raise ValueError(f"Unknown {capability} provider {choice!r} (MODEL_PROVIDER / {capability.upper()}_PROVIDER)")
+    return tuple(built)
@@ -0,0 +1,108 @@
+"""
+Single Flight - Share one upstream call between identical concurrent requests
+
+When a request arrives while an identical one (same canonical key) is already
+being worked on, it waits for that call's result instead of starting its own.
+Within a process this uses one Future per key. With lock_dir set, the leader
+also takes a file lock so identical calls in other worker processes queue
+behind it; once they get the lock they re-check a shared cache (e.g. the
+SQLite description tier) before calling upstream themselves. Every key gets a
+lock file of its own, so unrelated calls never wait on each other; the holder
+removes it before releasing the lock.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays within the process
+    fcntl = None
+
+import metrics
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one"""
+
+    def __init__(self, name, lock_dir=None):
+        """
+        Args:
+            name: Metrics prefix (single_flight.<name>.*) and lock file prefix
+            lock_dir: Directory for cross-process lock files; None keeps
+                coalescing within this process
+        """
+        self.name = name
+        self.lock_dir = lock_dir if fcntl is not None else None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, recheck=None):
+        """
+        Return function(), or the result of an identical call already in flight
+
+        Args:
+            key: Hashable canonical request key
+            function: Callable() making the upstream call
+            recheck: Optional callable() returning a cached result (or None); run
+                after waiting for another process's identical call
+
+        Raises:
+            Exception: Whatever the leading call raised, for every waiter
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.increment(f"single_flight.{self.name}.shared")
+            return future.result()
+
+        metrics.increment(f"single_flight.{self.name}.calls")
+        try:
+            result = self._run(key, function, recheck)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _run(self, key, function, recheck):
+        if not self.lock_dir:
+            return function()
+        path, lock_file = self._lock_key(key)
+        try:
+            if recheck is not None:
+                result = recheck()
+                if result is not None:
+                    metrics.increment(f"single_flight.{self.name}.shared_across_processes")
+                    return result
+            return function()
+        finally:
+            # Removed while still locked: processes queued on it retry on a fresh file
+            os.unlink(path)
+            lock_file.close()
+
+    def _lock_key(self, key):
+        """Lock the file of one key; returns (path, open locked file)"""
+        digest = hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32]
+        path = os.path.join(self.lock_dir, f"{self.name}-{digest}.lock")
+        while True:
+            lock_file = open(path, "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                    return path, lock_file
+            except FileNotFoundError:
+                pass
+            # The previous holder removed the file while we waited on it
+            lock_file.close()
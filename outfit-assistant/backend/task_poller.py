@@ -0,0 +1,182 @@
+"""
+Task Poller - One thread polling every outstanding upstream task
+
+Upstream image generation is asynchronous: we submit a task and poll its status.
+Instead of a sleeping loop per request, tasks are registered here and a single
+scheduler thread hands whichever task is due next to a small pool of check
+workers, so one slow status call never delays the others. A task is rescheduled
+when its check returns and never has two checks in flight. Intervals start short and grow with
+each attempt (with jitter so tasks submitted together do not poll in lockstep),
+which keeps latency low for fast tasks and call volume low for slow ones.
+
+When the upstream can push completions (webhooks), resolve() completes a task
+immediately and polling only serves as a fallback for missed callbacks.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+
+
+class TaskPoller:
+    """Resolves a Future per task once its status check reports a result"""
+
+    def __init__(self, check, name, initial_delay=1.0, max_delay=8.0, backoff=1.5, jitter=0.2, workers=4):
+        """
+        Args:
+            check: Callable(task_id) returning the task result, or None while still
+                pending; exceptions fail the task
+            name: Thread name, also used as the metrics prefix
+            initial_delay: Seconds before the first status check
+            max_delay: Upper bound for the interval between checks
+            backoff: Interval multiplier applied after every pending check
+            jitter: Random +/- fraction applied to every interval
+            workers: Status checks allowed to run at once
+        """
+        self.check = check
+        self.name = name
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+
+        self._due = []
+        self._tasks = {}
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-check")
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def track(self, task_id, timeout=120, initial_delay=None):
+        """
+        Start polling a task
+
+        Args:
+            task_id: Upstream task identifier
+            timeout: Seconds after which the task fails with TimeoutError
+            initial_delay: Seconds before the first check, overriding the default
+                (e.g. longer when a completion callback is expected)
+
+        Returns:
+            Future: Resolves with the result returned by check
+        """
+        now = time.monotonic()
+        delay = initial_delay if initial_delay is not None else self.initial_delay
+        task = {
+            "task_id": task_id,
+            "future": Future(),
+            "delay": delay,
+            "attempts": 0,
+            "checking": False,
+            "started": now,
+            "deadline": now + timeout
+        }
+        with self._changed:
+            self._tasks[task_id] = task
+        self._schedule(task, now + self._jittered(delay))
+        metrics.increment(f"{self.name}.tracked")
+        return task["future"]
+
+    def resolve(self, task_id, result=None, error=None):
+        """
+        Complete a task without waiting for its next check
+
+        Returns:
+            bool: False if the task is not being tracked (unknown or already finished)
+        """
+        with self._changed:
+            task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        metrics.increment(f"{self.name}.resolved")
+        return self._finish(task, result, error)
+
+    def poll_now(self, task_id):
+        """
+        Check a task as soon as possible, e.g. after a callback without a result
+
+        Returns:
+            bool: False if the task is not being tracked
+        """
+        with self._changed:
+            task = self._tasks.get(task_id)
+        if task is None:
+            return False
+        self._schedule(task, time.monotonic())
+        return True
+
+    def _finish(self, task, result=None, error=None):
+        """Set a task's outcome once; returns False if it was already finished"""
+        with self._changed:
+            if self._tasks.get(task["task_id"]) is not task:
+                return False
+            del self._tasks[task["task_id"]]
+        if error is not None:
+            task["future"].set_exception(error)
+        else:
+            metrics.observe(f"{self.name}.latency", time.monotonic() - task["started"])
+            task["future"].set_result(result)
+        return True
+
+    def _jittered(self, delay):
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, task, due):
+        with self._changed:
+            task["due"] = due
+            heapq.heappush(self._due, (due, next(self._sequence), task))
+            self._changed.notify()
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._due or self._due[0][0] > time.monotonic():
+                    timeout = self._due[0][0] - time.monotonic() if self._due else None
+                    self._changed.wait(timeout)
+                due, _, task = heapq.heappop(self._due)
+                if self._tasks.get(task["task_id"]) is not task or task["due"] != due:
+                    # Already resolved by a callback, or superseded by poll_now()
+                    continue
+                if task["checking"]:
+                    # poll_now() during a check: check again as soon as it returns
+                    task["check_again"] = True
+                    continue
+                task["checking"] = True
+            self._executor.submit(self._poll, task)
+
+    def _poll(self, task):
+        """Run one status check on a worker thread, then finish or reschedule the task"""
+        task["attempts"] += 1
+        metrics.increment(f"{self.name}.checks")
+        try:
+            result = self.check(task["task_id"])
+        except Exception as e:
+            metrics.increment(f"{self.name}.failed")
+            self._finish(task, error=e)
+            return
+        finally:
+            with self._changed:
+                task["checking"] = False
+                check_again = task.pop("check_again", False)
+
+        now = time.monotonic()
+        if result is not None:
+            self._finish(task, result)
+            return
+        if now >= task["deadline"]:
+            metrics.increment(f"{self.name}.timeouts")
+            self._finish(task, error=TimeoutError(
+                f"Task {task['task_id']} still pending after {task['attempts']} checks"
+            ))
+            return
+
+        task["delay"] = min(task["delay"] * self.backoff, self.max_delay)
+        if check_again:
+            self._schedule(task, now)
+        else:
+            self._schedule(task, min(now + self._jittered(task["delay"]), task["deadline"]))
@@ -0,0 +1,44 @@
+"""
+Shared test setup: the backend modules are imported from the directory above
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CALLBACK_SECRET = "s3cret"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def data_dir(tmp_path_factory):
+    """Working directory for the session; fashion_arena keeps its data relative to it"""
+    with pytest.MonkeyPatch.context() as patch:
+        path = tmp_path_factory.mktemp("data")
+        patch.chdir(path)
+        yield path
+        fashion_arena = sys.modules.get("fashion_arena")
+        if fashion_arena is not None and fashion_arena._counters is not None:
+            # Clean shutdown while the relative data paths still resolve
+            fashion_arena._counters.close()
+
+
+@pytest.fixture(scope="session")
+def app_module(data_dir):
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("MODEL_PROVIDER", "stub")
+        patch.setenv("IMAGE_PROVIDER", "live")
+        patch.setenv("NANOBANANA_API_KEY", "test")
+        patch.setenv("PUBLIC_BASE_URL", "http://backend.test")
+        patch.setenv("NANOBANANA_CALLBACK_SECRET", CALLBACK_SECRET)
+        app = importlib.import_module("app")
+        # Tasks stay pending instead of being checked against the real API
+        patch.setattr(app.image_editor.poller, "check", lambda task_id: None)
+        yield app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,145 @@
+"""
+Tests for per-upstream admission control
+"""
+import threading
+import time
+import types
+
+import admission
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def wait_for_queue(limiter, queued):
+    deadline = time.monotonic() + 2
+    while limiter.state()["queued"] != queued:
+        assert time.monotonic() < deadline, "waiters never queued"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refills_up_to_one_minute(clock):
+    bucket = admission.TokenBucket(60)
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.wait_time(1) == 0
+
+    clock.now += 3600
+    assert bucket.wait_time(60) == 0
+    assert bucket.level == 60
+    # Amounts above capacity are capped instead of waiting forever
+    assert bucket.wait_time(500) == 0
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    limiter = admission.Limiter("test", max_concurrent=1)
+    order = []
+
+    def call(label, priority):
+        with limiter.admit(priority):
+            order.append(label)
+
+    holder = limiter.admit()
+    holder.__enter__()
+    threads = []
+    for label, priority in [("background-1", admission.BACKGROUND), ("background-2", admission.BACKGROUND),
+                            ("interactive-1", admission.INTERACTIVE), ("interactive-2", admission.INTERACTIVE)]:
+        thread = threading.Thread(target=call, args=(label, priority))
+        thread.start()
+        threads.append(thread)
+        wait_for_queue(limiter, len(threads))
+    holder.__exit__(None, None, None)
+    for thread in threads:
+        thread.join(2)
+
+    assert order == ["interactive-1", "interactive-2", "background-1", "background-2"]
+    assert limiter.state() == {"in_flight": 0, "queued": 0}
+
+
+def test_full_queue_turns_away_lower_priority_first():
+    limiter = admission.Limiter("test", max_concurrent=1, max_queue=1)
+    outcomes = {}
+
+    def call(label, priority):
+        try:
+            with limiter.admit(priority):
+                outcomes[label] = "admitted"
+        except admission.Overloaded:
+            outcomes[label] = "rejected"
+
+    holder = limiter.admit()
+    holder.__enter__()
+    background = threading.Thread(target=call, args=("background", admission.BACKGROUND))
+    background.start()
+    wait_for_queue(limiter, 1)
+    interactive = threading.Thread(target=call, args=("interactive", admission.INTERACTIVE))
+    interactive.start()
+    background.join(2)
+    assert outcomes == {"background": "rejected"}
+
+    # Equal priority never displaces a waiter
+    with pytest.raises(admission.Overloaded):
+        with limiter.admit(admission.INTERACTIVE):
+            pass
+    holder.__exit__(None, None, None)
+    interactive.join(2)
+    assert outcomes["interactive"] == "admitted"
+
+
+def test_retry_after_follows_the_request_rate(clock):
+    limiter = admission.Limiter("test", requests_per_minute=2)
+    for _ in range(2):
+        with limiter.admit():
+            pass
+    with pytest.raises(admission.Overloaded) as raised:
+        with limiter.admit(timeout=0):
+            pass
+    # One request frees up every 30 seconds
+    assert raised.value.retry_after == 30
+
+    clock.now += 30
+    with limiter.admit(timeout=0):
+        pass
+
+
+def test_retry_after_follows_hold_time_and_queue(clock):
+    limiter = admission.Limiter("test", max_concurrent=1, max_queue=1)
+    with limiter.admit():
+        clock.now += 10  # calls hold their slot for about 10 seconds
+
+    holder = limiter.admit()
+    holder.__enter__()
+    with pytest.raises(admission.Overloaded) as raised:
+        with limiter.admit(timeout=0):
+            pass
+    # Nobody queued: the slot frees up within one hold time
+    assert raised.value.retry_after == 10
+
+    waiter = threading.Thread(target=lambda: limiter.admit(admission.BACKGROUND).__enter__())
+    waiter.start()
+    wait_for_queue(limiter, 1)
+    with pytest.raises(admission.Overloaded) as raised:
+        with limiter.admit(admission.BACKGROUND):
+            pass
+    # Queue full: one waiter ahead plus the call in flight
+    assert raised.value.retry_after == 20
+    holder.__exit__(None, None, None)
+    waiter.join(2)
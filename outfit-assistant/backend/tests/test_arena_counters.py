@@ -0,0 +1,141 @@
+"""
+Tests for write-behind like counters: intent log replay, crash recovery and flush retries
+"""
+import os
+
+import arena_counters
+import arena_index
+import arena_storage
+import arena_writer
+import pytest
+
+
+def derived(submission):
+    # Stand-in for the vote log: no upvotes, so total_votes is just the likes
+    return {"total_votes": submission.get("likes", 0)}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = arena_storage.SQLiteStorage(str(tmp_path / "arena.db"))
+    with storage.transaction():
+        storage.add_submission({"id": "s1", "created_at": "2024-01-01", "total_votes": 0, "likes": 0})
+    return storage
+
+
+@pytest.fixture
+def make_counters(storage, tmp_path):
+    created = []
+
+    def make():
+        index = arena_index.ArenaIndex()
+        index.rebuild(storage.list_submissions())
+        counters = arena_counters.WriteBehindCounters(
+            arena_writer.ArenaWriter(storage), index, str(tmp_path / "intents"),
+            flush_interval_ms=60000, derived=derived
+        )
+        created.append(counters)
+        return counters
+
+    yield make
+    for counters in created:
+        if not counters._lock_file.closed:
+            counters.close()
+
+
+def crash(counters):
+    """Drop a counters instance without flushing, as if its process died"""
+    counters._log.close()
+    counters._lock_file.close()  # releases the flock
+
+
+def test_like_is_visible_before_flush(make_counters, storage):
+    counters = make_counters()
+    assert counters.like("s1")["total_votes"] == 1
+    assert counters.index.get("s1")["likes"] == 1
+    assert storage.get_submission("s1")["likes"] == 0
+
+    counters.flush()
+    assert storage.get_submission("s1")["total_votes"] == 1
+    assert counters.like("missing") is None
+
+
+def test_failed_append_leaves_index_unchanged(make_counters, monkeypatch):
+    counters = make_counters()
+
+    def fail(intent):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(counters, "_append", fail)
+    with pytest.raises(OSError):
+        counters.like("s1")
+    assert counters.index.get("s1")["total_votes"] == 0
+
+
+def test_orphaned_log_is_replayed(make_counters, storage, tmp_path):
+    first = make_counters()
+    for _ in range(3):
+        first.like("s1")
+    crash(first)
+
+    make_counters()
+    assert storage.get_submission("s1")["likes"] == 3
+    assert storage.get_submission("s1")["total_votes"] == 3
+    assert not [name for name in os.listdir(tmp_path / "intents") if name.startswith(first._log_id)]
+
+
+def test_crash_after_commit_does_not_apply_twice(make_counters, storage, monkeypatch):
+    first = make_counters()
+    first.like("s1")
+    first.like("s1")
+
+    # The flush commits, then the process dies before deleting the flushed segment
+    def die(path):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(arena_counters.os, "unlink", die)
+    with pytest.raises(KeyboardInterrupt):
+        first.flush()
+    monkeypatch.undo()
+    first.like("s1")
+    crash(first)
+
+    make_counters()
+    assert storage.get_submission("s1")["likes"] == 3
+    applied_key = arena_counters.APPLIED_SEGMENT_KEY.format(log_id=first._log_id)
+    assert storage.get_meta(applied_key) is None
+
+
+def test_failed_flush_is_retried(make_counters, storage, monkeypatch):
+    counters = make_counters()
+    counters.like("s1")
+
+    execute = counters.writer.execute
+    calls = []
+
+    def flaky(operation):
+        calls.append(operation)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return execute(operation)
+
+    monkeypatch.setattr(counters.writer, "execute", flaky)
+    counters.flush()
+    assert storage.get_submission("s1")["likes"] == 0
+
+    counters.like("s1")
+    counters.flush()
+    assert storage.get_submission("s1")["likes"] == 2
+    assert counters._segments(counters._log_id) == [counters._segment]
+
+
+def test_close_is_idempotent_and_cleans_up(make_counters, storage, tmp_path):
+    counters = make_counters()
+    counters.like("s1")
+    counters.close()
+    counters.close()
+
+    assert storage.get_submission("s1")["likes"] == 1
+    applied_key = arena_counters.APPLIED_SEGMENT_KEY.format(log_id=counters._log_id)
+    assert storage.get_meta(applied_key) is None
+    assert os.listdir(tmp_path / "intents") == []
@@ -0,0 +1,60 @@
+"""
+Tests for Fashion Arena pagination cursors and page arguments
+"""
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture
+def fashion_arena():
+    # Imported here so its data directories land in the session's data directory
+    import fashion_arena
+    return fashion_arena
+
+
+def raw_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip(fashion_arena):
+    submission = {"id": "s1", "created_at": "2024-01-01T00:00:00", "total_votes": 3, "average_rating": 7.5}
+    for sort_by in ("recent", "top_voted", "top_rated"):
+        cursor = fashion_arena.encode_cursor(sort_by, submission)
+        assert fashion_arena.decode_cursor(cursor) == (sort_by, fashion_arena.arena_storage.sort_key(submission, sort_by))
+
+
+@pytest.mark.parametrize("position", [
+    ["recent", 5, "x"],
+    ["recent", "2024-01-01", 7],
+    ["top_voted", "many", "x"],
+    ["top_voted", True, "x"],
+    ["top_rated", 7.5, None, "x"],
+    ["top_rated", 7.5, 3],
+    ["unknown", 1, "x"],
+    {"sort_by": "recent"},
+])
+def test_decode_cursor_rejects_mistyped_keys(fashion_arena, position):
+    with pytest.raises(ValueError):
+        fashion_arena.decode_cursor(raw_cursor(position))
+
+
+def test_decode_cursor_rejects_garbage(fashion_arena):
+    with pytest.raises(ValueError):
+        fashion_arena.decode_cursor("not a cursor!")
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_page_functions_reject_limits_below_one(fashion_arena, limit):
+    with pytest.raises(ValueError):
+        fashion_arena.get_submissions_after(limit=limit)
+    with pytest.raises(ValueError):
+        fashion_arena.get_all_submissions(limit=limit)
+    with pytest.raises(ValueError):
+        fashion_arena.get_leaderboard(limit=limit)
+
+
+def test_offset_pages_start_at_one(fashion_arena):
+    with pytest.raises(ValueError):
+        fashion_arena.get_all_submissions(page=0)
@@ -0,0 +1,96 @@
+"""
+Tests for the ranked arena index and how it is rebuilt from storage
+"""
+import arena_counters
+import arena_index
+import arena_storage
+import arena_writer
+import pytest
+
+
+def submission(submission_id, created_at, total_votes=0, average_rating=0):
+    return {
+        "id": submission_id,
+        "created_at": created_at,
+        "total_votes": total_votes,
+        "total_rating": 0,
+        "vote_count": 0,
+        "average_rating": average_rating,
+    }
+
+
+@pytest.fixture
+def index():
+    return arena_index.ArenaIndex()
+
+
+def test_page_orders_best_first_and_reranks(index):
+    for i, votes in enumerate([3, 1, 2]):
+        index.put(submission(f"s{i}", f"2024-01-0{i + 1}", total_votes=votes))
+
+    page, total = index.page("top_voted", 0, 10)
+    assert [s["id"] for s in page] == ["s0", "s2", "s1"]
+    assert total == 3
+
+    index.update("s1", lambda record: record.update(total_votes=5))
+    page, _ = index.page("top_voted", 0, 2)
+    assert [s["id"] for s in page] == ["s1", "s0"]
+
+    index.remove("s1")
+    page, total = index.page("top_voted", 0, 10)
+    assert [s["id"] for s in page] == ["s0", "s2"]
+    assert total == 2
+
+
+def test_page_after_continues_from_key(index):
+    for i in range(5):
+        index.put(submission(f"s{i}", f"2024-01-0{i + 1}"))
+
+    first, _ = index.page_after("recent", None, 2)
+    assert [s["id"] for s in first] == ["s4", "s3"]
+    key = arena_storage.sort_key(first[-1], "recent")
+    rest, _ = index.page_after("recent", key, 10)
+    assert [s["id"] for s in rest] == ["s2", "s1", "s0"]
+
+
+def test_rebuild_keeps_unflushed_deltas(tmp_path):
+    storage = arena_storage.SQLiteStorage(str(tmp_path / "arena.db"))
+    with storage.transaction():
+        storage.add_submission({**submission("s1", "2024-01-01", total_votes=1), "likes": 1})
+    writer = arena_writer.ArenaWriter(storage)
+    index = arena_index.ArenaIndex()
+    index.rebuild(storage.list_submissions())
+    counters = arena_counters.WriteBehindCounters(
+        writer, index, str(tmp_path / "intents"), flush_interval_ms=60000,
+        derived=lambda record: {"total_votes": record["likes"]}
+    )
+    try:
+        counters.like("s1")
+        # Another process flushes likes of its own; the local like has not been flushed yet
+        with storage.transaction():
+            stored = storage.get_submission("s1")
+            stored["likes"] += 10
+            storage.update_submission(stored)
+            storage.add_submission(submission("s2", "2024-01-02"))
+
+        counters.rebuild_index(storage.list_submissions)
+        assert index.get("s1")["total_votes"] == 12
+        assert index.get("s2") is not None
+
+        counters.flush()
+        counters.rebuild_index(storage.list_submissions)
+        assert index.get("s1")["total_votes"] == 12
+    finally:
+        counters.close()
+
+
+def test_writer_advances_storage_version(tmp_path):
+    storage = arena_storage.SQLiteStorage(str(tmp_path / "arena.db"))
+    seen = []
+    writer = arena_writer.ArenaWriter(storage, on_version=lambda previous, new: seen.append((previous, new)))
+
+    writer.execute(lambda s: s.add_submission(submission("s1", "2024-01-01")))
+    writer.execute(lambda s: s.delete_submission("s1"))
+
+    assert seen == [(0, 1), (1, 2)]
+    assert storage.get_meta(arena_writer.VERSION_KEY) == 2
@@ -0,0 +1,198 @@
+"""
+Tests for the content-addressed Fashion Arena photo store and photo routes
+"""
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import arena_photos
+from arena_photos import PhotoStore
+
+
+def jpeg_bytes(color="red", size=(40, 30)):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def data_url(data):
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PhotoStore(str(tmp_path / "photos"))
+
+
+def stored_files(store):
+    return [name for _, _, names in os.walk(store.root) for name in names]
+
+
+def test_put_dedupes_identical_photos(store):
+    data = jpeg_bytes()
+    first = store.put(data)
+    second = store.put(data_url(data))
+
+    assert first == second == {
+        "photo_hash": hashlib.sha256(data).hexdigest(),
+        "photo_width": 40,
+        "photo_height": 30,
+        "photo_bytes": len(data),
+    }
+    assert stored_files(store) == [first["photo_hash"]]
+
+    other = store.put(jpeg_bytes("blue"))
+    assert other["photo_hash"] != first["photo_hash"]
+    assert len(stored_files(store)) == 2
+
+
+@pytest.mark.parametrize("photo", ["not base64!", base64.b64encode(b"not an image").decode()])
+def test_put_rejects_unreadable_photos(store, photo):
+    with pytest.raises(ValueError):
+        store.put(photo)
+    assert stored_files(store) == []
+
+
+@pytest.mark.parametrize("photo_hash", ["", "abc", "../" + "0" * 61, "A" * 64])
+def test_malformed_hashes_have_no_path(store, photo_hash):
+    assert store.path_for(photo_hash) is None
+    assert not store.exists(photo_hash)
+
+
+def test_generate_renditions_writes_every_missing_size(store):
+    photo_hash = store.put(jpeg_bytes(size=(400, 200)))["photo_hash"]
+    formats = len(arena_photos.RENDITION_FORMATS)
+
+    assert store.generate_renditions(photo_hash) == len(arena_photos.RENDITION_SIZES) * formats
+    assert store.generate_renditions(photo_hash) == 0
+
+    for size in arena_photos.RENDITION_SIZES:
+        with Image.open(store.rendition_path(photo_hash, size, "jpg")) as rendition:
+            # Never upscaled past the original
+            assert max(rendition.size) == min(size, 400)
+
+    os.unlink(store.rendition_path(photo_hash, 128, "jpg"))
+    assert store.generate_renditions(photo_hash) == 1
+
+
+def test_get_rendition_generates_inline_when_missing(store):
+    photo_hash = store.put(jpeg_bytes())["photo_hash"]
+    path = store.rendition_path(photo_hash, 320, "jpg")
+    assert not os.path.exists(path)
+
+    assert store.get_rendition(photo_hash, 320, "jpg") == path
+    assert os.path.exists(path)
+
+
+@pytest.mark.parametrize("size, ext", [(64, "jpg"), (320, "png"), (320, "../jpg")])
+def test_get_rendition_rejects_unknown_specs(store, size, ext):
+    photo_hash = store.put(jpeg_bytes())["photo_hash"]
+    assert store.get_rendition(photo_hash, size, ext) is None
+
+
+def test_get_rendition_of_missing_photo(store):
+    assert store.get_rendition("0" * 64, 320, "jpg") is None
+    assert not os.path.exists(os.path.join(store.root, "renditions"))
+
+
+# ----------------------------------------------------------------------
+# Routes
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def stored_photo(app_module):
+    data = jpeg_bytes("green")
+    return app_module.fashion_arena.photo_store.put(data)["photo_hash"], data
+
+
+def test_photo_is_served_with_strong_etag_and_immutable_caching(client, stored_photo):
+    photo_hash, data = stored_photo
+    response = client.get(f"/api/arena/photo/{photo_hash}")
+
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.mimetype == "image/jpeg"
+    assert response.get_etag() == (photo_hash, False)
+    assert response.cache_control.public
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == 31536000
+
+
+def test_matching_etag_returns_304(client, stored_photo):
+    photo_hash, _ = stored_photo
+    response = client.get(f"/api/arena/photo/{photo_hash}", headers={"If-None-Match": f'"{photo_hash}"'})
+
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_rendition_is_generated_on_demand(client, app_module, stored_photo):
+    photo_hash, _ = stored_photo
+    path = app_module.fashion_arena.photo_store.rendition_path(photo_hash, 128, "jpg")
+    assert not os.path.exists(path)
+
+    response = client.get(f"/api/arena/photo/{photo_hash}/128.jpg")
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+    assert response.get_etag() == (f"{photo_hash}-128-jpg", False)
+    assert response.cache_control.immutable
+    assert os.path.exists(path)
+
+    cached = client.get(f"/api/arena/photo/{photo_hash}/128.jpg", headers={"If-None-Match": f'"{photo_hash}-128-jpg"'})
+    assert cached.status_code == 304
+
+
+@pytest.mark.parametrize("path", ["0" * 64 + "/128.jpg", "{hash}/64.jpg", "{hash}/128.gif"])
+def test_unknown_rendition_returns_404(client, stored_photo, path):
+    photo_hash, _ = stored_photo
+    assert client.get("/api/arena/photo/" + path.format(hash=photo_hash)).status_code == 404
+
+
+@pytest.mark.parametrize("photo_hash", ["0" * 64, "not-a-hash"])
+def test_unknown_photo_returns_404(client, photo_hash):
+    assert client.get(f"/api/arena/photo/{photo_hash}").status_code == 404
+
+
+def test_restore_moves_inline_photos_to_the_store(client, app_module):
+    data = jpeg_bytes("purple")
+    backup = {
+        "submissions": [{
+            "id": "restored-1",
+            "photo": data_url(data),
+            "title": "Old backup",
+            "created_at": "2024-01-01T00:00:00",
+            "total_votes": 0,
+        }],
+        "votes": {},
+    }
+    response = client.post("/api/arena/restore", json=backup)
+    assert response.status_code == 200
+    assert response.get_json()["count"] == 1
+
+    submission = client.get("/api/arena/submission/restored-1").get_json()["submission"]
+    photo_hash = hashlib.sha256(data).hexdigest()
+    assert "photo" not in submission
+    assert submission["photo_hash"] == photo_hash
+    assert submission["photo_url"].endswith(f"/api/arena/photo/{photo_hash}")
+    assert client.get(f"/api/arena/photo/{photo_hash}").data == data
+
+
+def test_startup_migration_moves_inline_photos(app_module, tmp_path):
+    fashion_arena = app_module.fashion_arena
+    storage = fashion_arena.arena_storage.create_storage("json", str(tmp_path / "a.db"), str(tmp_path / "a.json"))
+    data = jpeg_bytes("orange")
+    with storage.transaction():
+        storage.add_submission({"id": "old", "photo": data_url(data), "created_at": "2024-01-01T00:00:00"})
+        storage.add_submission({"id": "new", "photo_hash": "f" * 64, "created_at": "2024-01-02T00:00:00"})
+
+    assert fashion_arena._migrate_inline_photos(storage) == 1
+    assert fashion_arena._migrate_inline_photos(storage) == 0
+
+    migrated = storage.get_submission("old")
+    assert "photo" not in migrated
+    assert migrated["photo_hash"] == hashlib.sha256(data).hexdigest()
+    assert fashion_arena.photo_store.exists(migrated["photo_hash"])
@@ -0,0 +1,161 @@
+"""
+Tests for the Fashion Arena storage backends and the JSON to SQLite migration
+"""
+import json
+import os
+
+import arena_storage
+import pytest
+
+
+def submission(submission_id, created_at, total_votes=0, average_rating=0, **extra):
+    return {
+        "id": submission_id,
+        "created_at": created_at,
+        "total_votes": total_votes,
+        "total_rating": 0,
+        "vote_count": 0,
+        "average_rating": average_rating,
+        **extra,
+    }
+
+
+def vote(submission_id, voter_id, rating, vote_type="upvote"):
+    return {
+        "submission_id": submission_id,
+        "voter_id": voter_id,
+        "vote_type": vote_type,
+        "rating": rating,
+        "voted_at": "2024-01-01T00:00:00",
+    }
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def storage(request, tmp_path):
+    return arena_storage.create_storage(
+        request.param, str(tmp_path / "fashion_arena.db"), str(tmp_path / "fashion_arena_db.json")
+    )
+
+
+def test_submission_crud(storage):
+    with storage.transaction():
+        storage.add_submission(submission("s1", "2024-01-01", title="Blazer", photo_hash="abc"))
+        storage.add_submission(submission("s2", "2024-01-02"))
+
+    stored = storage.get_submission("s1")
+    assert stored["title"] == "Blazer"
+    assert stored["photo_hash"] == "abc"
+
+    stored["total_votes"] = 5
+    stored["title"] = "Navy blazer"
+    with storage.transaction():
+        storage.update_submission(stored)
+    assert storage.get_submission("s1")["total_votes"] == 5
+    assert storage.get_submission("s1")["title"] == "Navy blazer"
+
+    assert storage.delete_submission("s2") is True
+    assert storage.delete_submission("s2") is False
+    assert [s["id"] for s in storage.list_submissions()] == ["s1"]
+    assert storage.get_submission("missing") is None
+
+
+def test_page_submissions_sort_orders(storage):
+    with storage.transaction():
+        storage.add_submission(submission("a", "2024-01-01", total_votes=3, average_rating=7.0))
+        storage.add_submission(submission("b", "2024-01-03", total_votes=1, average_rating=9.0))
+        storage.add_submission(submission("c", "2024-01-02", total_votes=5, average_rating=7.0))
+
+    def ids(sort_by, offset=0, limit=10):
+        page, total = storage.page_submissions(sort_by, offset, limit)
+        assert total == 3
+        return [s["id"] for s in page]
+
+    assert ids("recent") == ["b", "c", "a"]
+    assert ids("top_voted") == ["c", "a", "b"]
+    # Ties on average_rating fall back to total_votes
+    assert ids("top_rated") == ["b", "c", "a"]
+    assert ids("recent", offset=1, limit=1) == ["c"]
+
+
+def test_one_vote_per_voter_and_submission(storage):
+    with storage.transaction():
+        storage.add_submission(submission("s1", "2024-01-01"))
+        storage.save_vote(vote("s1", "alice", 6))
+        storage.save_vote(vote("s1", "alice", 9, "downvote"))
+        storage.save_vote(vote("s1", "bob", 4))
+
+    assert storage.get_vote("s1", "alice")["rating"] == 9
+    assert storage.get_vote("s1", "alice")["vote_type"] == "downvote"
+    assert storage.get_vote("s1", "carol") is None
+    assert storage.get_stats()["total_votes"] == 2
+    assert len(storage.export()["votes"]) == 2
+
+
+def test_transaction_rolls_back_on_error(storage):
+    with storage.transaction():
+        storage.add_submission(submission("s1", "2024-01-01"))
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.add_submission(submission("s2", "2024-01-02"))
+            storage.set_meta("key", 1)
+            raise RuntimeError("boom")
+    assert [s["id"] for s in storage.list_submissions()] == ["s1"]
+    assert storage.get_meta("key") is None
+
+
+def test_meta_and_replace_all(storage):
+    with storage.transaction():
+        storage.add_submission(submission("old", "2024-01-01"))
+        storage.set_meta("version", {"n": 1})
+    assert storage.get_meta("version") == {"n": 1}
+
+    with storage.transaction():
+        storage.replace_all({
+            "submissions": [submission("new", "2024-02-01")],
+            "votes": {"new_alice": vote("new", "alice", 7)},
+        })
+        storage.delete_meta("missing")
+    assert [s["id"] for s in storage.list_submissions()] == ["new"]
+    assert storage.get_vote("new", "alice")["rating"] == 7
+    # Bookkeeping survives a restore
+    assert storage.get_meta("version") == {"n": 1}
+
+    with storage.transaction():
+        storage.delete_meta("version")
+    assert storage.get_meta("version") is None
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        arena_storage.create_storage("redis", str(tmp_path / "a.db"), str(tmp_path / "a.json"))
+
+
+def test_sqlite_migrates_legacy_json_once(tmp_path):
+    json_path = tmp_path / "fashion_arena_db.json"
+    legacy = {
+        "submissions": [
+            submission("s1", "2024-01-01", total_votes=2, average_rating=8.0, title="Blazer"),
+            submission("s2", "2024-01-02", title="Dress"),
+        ],
+        "votes": {"s1_alice": vote("s1", "alice", 8), "s1_bob": vote("s1", "bob", 8)},
+    }
+    json_path.write_text(json.dumps(legacy))
+
+    storage = arena_storage.create_storage("sqlite", str(tmp_path / "fashion_arena.db"), str(json_path))
+    assert not json_path.exists()
+    assert (tmp_path / "fashion_arena_db.json.migrated").exists()
+    assert storage.export() == legacy
+
+    # The renamed file is not imported again on the next start
+    again = arena_storage.create_storage("sqlite", str(tmp_path / "fashion_arena.db"), str(json_path))
+    assert len(again.list_submissions()) == 2
+
+
+def test_migration_accepts_the_oldest_list_format(tmp_path):
+    json_path = tmp_path / "fashion_arena_db.json"
+    json_path.write_text(json.dumps([submission("s1", "2024-01-01")]))
+    storage = arena_storage.SQLiteStorage(str(tmp_path / "fashion_arena.db"))
+
+    assert arena_storage.migrate_json_to_sqlite(str(json_path), storage) == 1
+    assert storage.get_submission("s1")["created_at"] == "2024-01-01"
+    assert os.listdir(tmp_path).count("fashion_arena_db.json.migrated") == 1
@@ -0,0 +1,111 @@
+"""
+Tests for the append-only vote log: compaction, reloads and shared directories
+"""
+import os
+
+import arena_votes
+
+
+def vote(submission_id, voter_id, rating, vote_type="upvote", voted_at="2024-01-01T00:00:00"):
+    return {
+        "submission_id": submission_id,
+        "voter_id": voter_id,
+        "vote_type": vote_type,
+        "rating": rating,
+        "voted_at": voted_at,
+    }
+
+
+def test_revote_replaces_previous_vote(tmp_path):
+    log = arena_votes.VoteLog(str(tmp_path), fsync=False)
+    assert log.append(vote("s1", "a", 8)) is None
+    assert log.append(vote("s1", "b", 4)) is None
+    old_vote = log.append(vote("s1", "a", 6, "downvote"))
+
+    assert old_vote["rating"] == 8
+    assert log.aggregates("s1") == {"total_rating": 10, "vote_count": 2, "average_rating": 5.0, "upvotes": 1}
+    assert log.get("s1", "a")["vote_type"] == "downvote"
+    assert len(log) == 2
+
+
+def test_compact_then_reload(tmp_path):
+    log = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+    for i in range(4):
+        log.append(vote("s1", f"v{i}", i + 1))
+    log.append(vote("s1", "v0", 10))
+
+    # Compacted once: generation 2 holds two votes on top of the snapshot
+    assert sorted(os.listdir(tmp_path / "archive")) == ["votes.000001.log"]
+    reloaded = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+    assert reloaded.aggregates("s1") == log.aggregates("s1")
+    assert reloaded.aggregates("s1")["total_rating"] == 10 + 2 + 3 + 4
+    assert reloaded.get("s1", "v0")["rating"] == 10
+
+    reloaded.compact()
+    again = arena_votes.VoteLog(str(tmp_path), fsync=False)
+    assert again.aggregates("s1") == log.aggregates("s1")
+    assert len(again) == 4
+
+
+def test_instances_sharing_a_directory_see_each_other(tmp_path):
+    first = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+    second = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+
+    first.append(vote("s1", "a", 8))
+    assert second.get("s1", "a")["rating"] == 8
+    assert second.append(vote("s1", "a", 2))["rating"] == 8
+
+    # The second instance compacts the log the first one is reading
+    second.append(vote("s1", "b", 4))
+    first.append(vote("s1", "c", 6))
+    for log in (first, second):
+        assert log.aggregates("s1") == {"total_rating": 12, "vote_count": 3, "average_rating": 4.0, "upvotes": 3}
+        assert len(log) == 3
+
+
+def test_reads_only_lock_after_the_log_changed(tmp_path, monkeypatch):
+    first = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+    second = arena_votes.VoteLog(str(tmp_path), compact_every=3, fsync=False)
+    first.append(vote("s1", "a", 8))
+
+    locks = []
+    flock = arena_votes.fcntl.flock
+    monkeypatch.setattr(arena_votes.fcntl, "flock", lambda f, op: (locks.append(op), flock(f, op)))
+
+    def exclusive_locks():
+        count = locks.count(arena_votes.fcntl.LOCK_EX)
+        locks.clear()
+        return count
+
+    # Catching up on the first instance's vote takes the lock once
+    assert second.aggregates("s1")["vote_count"] == 1
+    assert exclusive_locks() == 1
+    assert second.get("s1", "a")["rating"] == 8
+    assert len(second) == 1
+    assert exclusive_locks() == 0
+
+    # Its own appends leave nothing to catch up on
+    second.append(vote("s1", "b", 4))
+    exclusive_locks()
+    assert second.aggregates("s1")["vote_count"] == 2
+    assert exclusive_locks() == 0
+
+    # A compaction by the other instance retires the log being read
+    first.append(vote("s1", "c", 6))
+    exclusive_locks()
+    assert second.aggregates("s1")["vote_count"] == 3
+    assert exclusive_locks() == 1
+
+
+def test_seeding_and_merge(tmp_path):
+    stored = [vote("s1", "a", 8), vote("s1", "b", 4)]
+    log = arena_votes.VoteLog(str(tmp_path), fsync=False, initial_votes=lambda: stored)
+    assert log.merge(stored) == 0
+
+    # A log that already exists is not seeded again; merge picks up what it lacks
+    log.append(vote("s1", "a", 9, voted_at="2024-02-01T00:00:00"))
+    later = stored + [vote("s1", "c", 5), vote("s1", "a", 1, voted_at="2024-01-15T00:00:00")]
+    reopened = arena_votes.VoteLog(str(tmp_path), fsync=False, initial_votes=lambda: later)
+    assert reopened.merge(later) == 1
+    assert reopened.get("s1", "a")["rating"] == 9
+    assert reopened.aggregates("s1")["vote_count"] == 3
@@ -0,0 +1,59 @@
+"""
+Tests for the per-host circuit breaker
+"""
+import types
+
+import http_client
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def breaker(monkeypatch, threshold=2, reset_seconds=10):
+    clock = Clock()
+    monkeypatch.setattr(http_client, "time", types.SimpleNamespace(monotonic=clock))
+    return http_client.CircuitBreaker(threshold, reset_seconds), clock
+
+
+def test_opens_after_threshold_and_closes_on_trial_success(monkeypatch):
+    circuit, clock = breaker(monkeypatch)
+    circuit.record_failure()
+    assert circuit.allow()
+    circuit.record_failure()
+    assert circuit.state() == "open"
+    assert not circuit.allow()
+
+    clock.now += 10
+    assert circuit.state() == "half_open"
+    assert circuit.allow()
+    assert not circuit.allow()  # one trial at a time
+    circuit.record_success()
+    assert circuit.state() == "closed"
+    assert circuit.allow()
+
+
+def test_failed_trial_reopens(monkeypatch):
+    circuit, clock = breaker(monkeypatch, threshold=1)
+    circuit.record_failure()
+    clock.now += 10
+    assert circuit.allow()
+    circuit.record_failure()
+    assert circuit.state() == "open"
+    assert not circuit.allow()
+
+
+def test_abandoned_trial_expires(monkeypatch):
+    circuit, clock = breaker(monkeypatch, threshold=1)
+    circuit.record_failure()
+    clock.now += 10
+    assert circuit.allow()  # the trial never reports back
+
+    clock.now += 9
+    assert not circuit.allow()
+    clock.now += 1
+    assert circuit.allow()
@@ -0,0 +1,214 @@
+"""
+Tests for the background job queue and the outfit generation job endpoints
+"""
+import base64
+import json
+import threading
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import jobs
+import providers
+
+INSTANT = {kind: "fixed:0" for kind in providers.STUB_LATENCIES}
+
+
+def wait_until_finished(queue, job_id, timeout=10):
+    job = queue.get(job_id)
+    while job["status"] not in jobs.FINISHED_STATUSES:
+        job = queue.wait(job_id, job["version"], timeout=timeout)
+    return job
+
+
+def test_job_runs_through_its_stages():
+    queue = jobs.JobQueue(max_workers=1)
+    release = threading.Event()
+
+    def work(value, progress):
+        release.wait(5)
+        progress("first")
+        progress("second")
+        return value * 2
+
+    job = queue.submit("double", work, 21)
+    assert job["status"] == "queued"
+    assert job["stage"] is None
+
+    seen = []
+    version = job["version"]
+    release.set()
+    while True:
+        job = queue.wait(job["job_id"], version, timeout=5)
+        version = job["version"]
+        seen.append((job["status"], job["stage"]))
+        if job["status"] in jobs.FINISHED_STATUSES:
+            break
+
+    # Each change wakes the waiter, though it may observe several at once
+    assert seen[-1] == ("succeeded", "second")
+    assert job["result"] == 42
+    assert job["error"] is None
+    assert set(seen) <= {("running", None), ("running", "first"), ("running", "second"), ("succeeded", "second")}
+
+
+def test_failed_job_keeps_the_error():
+    queue = jobs.JobQueue(max_workers=1)
+
+    def fail(progress):
+        progress("working")
+        raise RuntimeError("model unavailable")
+
+    job = wait_until_finished(queue, queue.submit("broken", fail)["job_id"])
+    assert job["status"] == "failed"
+    assert job["stage"] == "working"
+    assert job["error"] == "model unavailable"
+    assert job["result"] is None
+
+
+def test_submit_rejects_when_too_many_jobs_wait():
+    queue = jobs.JobQueue(max_workers=1, max_pending=1)
+    release = threading.Event()
+    block = lambda progress: release.wait(5)
+
+    running = queue.submit("slow", block)
+    queue.wait(running["job_id"], running["version"], timeout=5)
+    queued = queue.submit("slow", block)
+    with pytest.raises(jobs.QueueFullError):
+        queue.submit("slow", block)
+
+    release.set()
+    assert wait_until_finished(queue, queued["job_id"])["status"] == "succeeded"
+    # Room again once the waiting job has started
+    wait_until_finished(queue, queue.submit("slow", block)["job_id"])
+
+
+def test_unknown_and_expired_jobs():
+    queue = jobs.JobQueue(max_workers=1, ttl_seconds=0)
+    assert queue.get("missing") is None
+    assert queue.wait("missing", None, timeout=0) is None
+
+    finished = wait_until_finished(queue, queue.submit("quick", lambda progress: None)["job_id"])
+    queue.submit("quick", lambda progress: None)
+    assert queue.get(finished["job_id"]) is None
+
+
+# ----------------------------------------------------------------------
+# Routes
+# ----------------------------------------------------------------------
+
+def user_image():
+    buffer = BytesIO()
+    Image.new("RGB", (64, 96), "gray").save(buffer, format="JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def stub_app(app_module, monkeypatch):
+    stub = providers.StubProvider(INSTANT)
+    monkeypatch.setattr(app_module, "outfit_writer", stub)
+    monkeypatch.setattr(app_module, "image_editor", stub)
+    monkeypatch.setattr(app_module, "job_queue", jobs.JobQueue(max_workers=2, max_pending=1))
+    return app_module
+
+
+def generate(client, **data):
+    return client.post("/api/generate-outfit", json={"occasion": "Date Night", "user_image": user_image(), **data})
+
+
+def test_generate_outfit_returns_a_job_to_follow(client, stub_app):
+    response = generate(client)
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status"] == "queued"
+    assert body["status_url"] == f"/api/jobs/{body['job_id']}"
+
+    wait_until_finished(stub_app.job_queue, body["job_id"])
+    job = client.get(body["status_url"]).get_json()
+    assert job["status"] == "succeeded"
+    assert job["stage"] == "generating_image"
+    assert job["result"]["outfit_image_url"].startswith("data:image/jpeg;base64,")
+    assert job["result"]["outfit_description"]
+
+
+def test_generate_outfit_requires_a_photo(client, stub_app):
+    response = client.post("/api/generate-outfit", json={"occasion": "Date Night"})
+    assert response.status_code == 400
+
+
+def test_generate_outfit_rejects_when_the_queue_is_full(client, stub_app, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(stub_app, "run_outfit_generation", lambda data, progress: release.wait(5))
+
+    # Two workers busy and one job waiting fill the queue
+    started = [generate(client).get_json() for _ in range(2)]
+    for job in started:
+        stub_app.job_queue.wait(job["job_id"], 0, timeout=5)
+    assert generate(client).status_code == 202
+
+    response = generate(client)
+    assert response.status_code == 503
+    assert "try again" in response.get_json()["error"]
+    release.set()
+
+
+def parse_event(block):
+    if isinstance(block, bytes):
+        block = block.decode()
+    lines = dict(line.split(": ", 1) for line in block.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_job_events_stream_each_change_until_done(client, stub_app, monkeypatch):
+    gates = [threading.Event(), threading.Event()]
+
+    def pipeline(data, progress):
+        progress("describing_outfit")
+        gates[0].wait(5)
+        progress("generating_image")
+        gates[1].wait(5)
+        return {"success": True}
+
+    monkeypatch.setattr(stub_app, "run_outfit_generation", pipeline)
+    job_id = generate(client).get_json()["job_id"]
+    job = stub_app.job_queue.get(job_id)
+    while job["stage"] is None:
+        job = stub_app.job_queue.wait(job_id, job["version"], timeout=5)
+
+    response = client.get(f"/api/jobs/{job_id}/events", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    events = iter(response.response)
+    name, job = parse_event(next(events))
+    assert (name, job["status"], job["stage"]) == ("status", "running", "describing_outfit")
+
+    gates[0].set()
+    name, job = parse_event(next(events))
+    assert (name, job["status"], job["stage"]) == ("status", "running", "generating_image")
+
+    gates[1].set()
+    name, job = parse_event(next(events))
+    assert (name, job["status"], job["result"]) == ("done", "succeeded", {"success": True})
+    assert next(events, None) is None
+    response.close()
+
+
+def test_job_events_for_the_real_pipeline(client, stub_app):
+    job_id = generate(client).get_json()["job_id"]
+    blocks = client.get(f"/api/jobs/{job_id}/events").get_data(as_text=True).strip().split("\n\n")
+    events = [parse_event(block) for block in blocks]
+
+    # However much of the run the stream catches, versions only move forward
+    assert [name for name, _ in events] == ["status"] * (len(events) - 1) + ["done"]
+    versions = [job["version"] for _, job in events]
+    assert versions == sorted(set(versions))
+    assert events[-1][1]["status"] == "succeeded"
+    assert events[-1][1]["stage"] == "generating_image"
+
+
+@pytest.mark.parametrize("path", ["/api/jobs/missing", "/api/jobs/missing/events"])
+def test_unknown_job_returns_404(client, stub_app, path):
+    assert client.get(path).status_code == 404
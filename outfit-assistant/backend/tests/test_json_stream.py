@@ -0,0 +1,68 @@
+"""
+Tests for the incremental JSON object parser used on streamed model output
+"""
+import json
+
+import pytest
+from json_stream import ObjectStream
+
+DOCUMENT = json.dumps({
+    "wow_factor": "Bold \"statement\" piece, {not} a [bracket]",
+    "score": 8.5,
+    "path": "C:\\\\closet\\\\",
+    "accent": "caf\u00e9 \\u00e9 \\\\\"",
+    "items": [{"name": "blazer, navy", "tags": ["a}", "b]"]}, 2],
+    "notes": {"fit": "slim", "nested": {"deep": [1, {"x": '\\"'}]}},
+    "empty": "",
+    "flag": True,
+}, ensure_ascii=False)
+EXPECTED = list(json.loads(DOCUMENT).items())
+
+
+def feed_all(chunks):
+    stream = ObjectStream()
+    members = []
+    for chunk in chunks:
+        members.extend(stream.feed(chunk))
+    return stream, members
+
+
+def test_whole_document():
+    stream, members = feed_all([DOCUMENT])
+    assert members == EXPECTED
+    assert stream.done
+    assert stream.text == DOCUMENT
+
+
+def test_character_by_character():
+    stream, members = feed_all(list(DOCUMENT))
+    assert members == EXPECTED
+    assert stream.done
+
+
+def test_every_two_way_split():
+    # Covers splits inside keys, strings, escape sequences and nested values
+    for split in range(1, len(DOCUMENT)):
+        _, members = feed_all([DOCUMENT[:split], DOCUMENT[split:]])
+        assert members == EXPECTED, f"split at {split}: {DOCUMENT[split - 5:split]!r}|{DOCUMENT[split:split + 5]!r}"
+
+
+def test_members_arrive_as_soon_as_complete():
+    stream = ObjectStream()
+    assert stream.feed('{"wow_factor": "Sha') == []
+    assert stream.feed('rp \\"look\\"", "score"') == [("wow_factor", 'Sharp "look"')]
+    assert stream.feed(': 9}') == [("score", 9)]
+    assert stream.done
+
+
+def test_split_escape_backslash():
+    stream = ObjectStream()
+    assert stream.feed('{"a": "x\\') == []
+    assert stream.feed('"y", "b": "\\\\') == [("a", 'x"y')]
+    assert stream.feed('"}') == [("b", "\\")]
+
+
+def test_invalid_member_raises_value_error():
+    stream = ObjectStream()
+    with pytest.raises(ValueError):
+        stream.feed('{"score": 8.5.1, "b": 1}')
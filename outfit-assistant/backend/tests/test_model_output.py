@@ -0,0 +1,105 @@
+"""
+Tests for decoding, repairing and validating model JSON output
+"""
+import json
+
+import model_output
+import pytest
+
+RATING = {
+    "wow_factor": "8",
+    "occasion_fitness": 7.5,
+    "overall_rating": 9,
+    "wow_factor_explanation": "Sharp",
+    "occasion_fitness_explanation": None,
+    "overall_explanation": "Great",
+    "strengths": ["fit", None, 3],
+    "improvements": "not a list",
+    "suggestions": [],
+    "roast": "Mild",
+    "shopping_recommendations": [{"item": "Belt", "price": 40}, "junk"],
+}
+
+
+@pytest.fixture(params=["orjson", "json"], autouse=True)
+def decoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(model_output, "orjson", None)
+    elif model_output.orjson is None:
+        pytest.skip("orjson is not installed")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": "hel', {"a": 1, "b": "hel"}),
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": {"b": {"c": "d", "e": [', {"a": {"b": {"c": "d", "e": []}}}),
+    ('{"a": 1, "b": ', {"a": 1}),
+    ('{"a": 1, "b": tr', {"a": 1}),
+    ('{"a": [1, 2], "b": {"c": 3, "d"', {"a": [1, 2], "b": {"c": 3}}),
+    ('{"a": "x, y", "b": "quote \\"', {"a": "x, y", "b": 'quote "'}),
+])
+def test_repair_truncated(text, expected):
+    repaired = model_output.repair_truncated(text)
+    assert repaired is not None
+    assert json.loads(repaired) == expected
+    assert model_output.decode(text, "test") == expected
+
+
+@pytest.mark.parametrize("text", ["", "Sorry, I can't rate this outfit.", '{"a": 1 "b"', "{'a': 1}"])
+def test_unrepairable_text_is_rejected(text):
+    assert model_output.repair_truncated(text) is None
+    with pytest.raises(model_output.ModelOutputError):
+        model_output.decode(text, "test")
+
+
+@pytest.mark.parametrize("text", ["[1, 2]", '"text"', "42", "null"])
+def test_non_objects_are_rejected(text):
+    with pytest.raises(model_output.ModelOutputError, match="instead of an object"):
+        model_output.decode(text, "test")
+
+
+def test_parse_rating_normalizes_fields():
+    rating = model_output.parse_rating(json.dumps(RATING)).to_dict()
+    assert (rating["wow_factor"], rating["occasion_fitness"], rating["overall_rating"]) == (8, 7.5, 9)
+    assert rating["occasion_fitness_explanation"] == ""
+    assert rating["strengths"] == ["fit", "3"]
+    assert rating["improvements"] == []
+    assert rating["shopping_recommendations"] == [
+        {"item": "Belt", "description": "", "price": "40", "reason": ""}
+    ]
+
+
+def test_parse_rating_of_truncated_response():
+    text = json.dumps(RATING)
+    cut = text[:text.index('"shopping_recommendations"') + 40]
+    rating = model_output.parse_rating(cut)
+    assert rating.overall_rating == 9
+    assert rating.roast == "Mild"
+
+
+@pytest.mark.parametrize("score", [None, "high", [8], True, False, "nan", "inf", "-inf", 42, 0, 0.5, -3, "11", 10.01])
+def test_parse_rating_rejects_bad_scores(score):
+    with pytest.raises(model_output.ModelOutputError, match="overall_rating"):
+        model_output.parse_rating(json.dumps({**RATING, "overall_rating": score}))
+
+
+def test_parse_rating_rejects_non_finite_json_numbers():
+    # The standard library decoder accepts NaN and Infinity literals; orjson rejects the document
+    for literal in ("NaN", "Infinity", "-Infinity"):
+        text = json.dumps(RATING).replace('"overall_rating": 9', f'"overall_rating": {literal}')
+        with pytest.raises(model_output.ModelOutputError):
+            model_output.parse_rating(text)
+
+
+@pytest.mark.parametrize("score, expected", [(1, 1), ("10", 10), (7.0, 7), ("6.5", 6.5)])
+def test_parse_rating_accepts_scores_in_range(score, expected):
+    rating = model_output.parse_rating(json.dumps({**RATING, "overall_rating": score}))
+    assert rating.overall_rating == expected
+
+
+def test_parse_outfit_requires_items():
+    outfit = {"outfit_concept": "Smart casual", "items": [{"type": "top", "description": "Linen shirt", "color": "white"}]}
+    parsed = model_output.parse_outfit(json.dumps(outfit))
+    assert parsed.summary() == "Linen shirt in white"
+    with pytest.raises(model_output.ModelOutputError, match="no items"):
+        model_output.parse_outfit(json.dumps({**outfit, "items": ["not an item"]}))
@@ -0,0 +1,51 @@
+"""
+Tests for the NanobananaAPI completion callback endpoint
+"""
+import pytest
+
+# Matches NANOBANANA_CALLBACK_SECRET set by the app_module fixture in conftest.py
+SECRET = "s3cret"
+
+
+def callback(client, payload, token=SECRET):
+    return client.post("/api/callbacks/nanobanana", query_string={"token": token}, json=payload)
+
+
+@pytest.mark.parametrize("token", ["wrong", "", "sécret"])
+def test_rejects_bad_tokens(client, token):
+    assert callback(client, {"data": {"taskId": "t1"}}, token=token).status_code == 403
+
+
+@pytest.mark.parametrize("payload", [
+    [1, 2],
+    "text",
+    {"data": ["taskId"]},
+    {"data": "t1"},
+    {"data": {"taskId": ["t1"]}},
+    {"data": {}},
+])
+def test_rejects_malformed_payloads(client, payload):
+    assert callback(client, payload).status_code == 400
+
+
+def test_resolves_tracked_task(client, app_module):
+    future = app_module.image_editor.poller.track("t1", initial_delay=60)
+    payload = {"code": 200, "data": {"taskId": "t1", "info": {"resultImageUrl": "http://cdn.test/a.png"}}}
+
+    assert callback(client, payload).status_code == 200
+    assert future.result(timeout=1) == "http://cdn.test/a.png"
+    # Already finished
+    assert callback(client, payload).status_code == 404
+
+
+def test_result_without_dict_falls_back_to_polling(client, app_module):
+    app_module.image_editor.poller.track("t2", initial_delay=60)
+    payload = {"code": 200, "data": {"taskId": "t2", "info": "pending"}}
+    assert callback(client, payload).status_code == 200
+
+
+def test_public_base_url_requires_a_secret(app_module, monkeypatch):
+    monkeypatch.setenv("PUBLIC_BASE_URL", "http://backend.test")
+    monkeypatch.delenv("NANOBANANA_CALLBACK_SECRET")
+    with pytest.raises(ValueError):
+        app_module.providers.NanobananaImageEditor()
@@ -0,0 +1,78 @@
+"""
+Tests for the perceptual hash cache and its BK-tree
+"""
+import random
+import types
+
+import perceptual_cache
+import pytest
+from PIL import Image
+
+
+def flip(value, bits):
+    """Return value with the given bit positions inverted"""
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+BASE = 0xF0F0_1234_ABCD_0F0F
+
+
+def test_bk_tree_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    # Near neighbours of the first hash, so the radius actually matters
+    hashes += [flip(hashes[0], rng.sample(range(64), rng.randint(1, 8))) for _ in range(50)]
+    tree = perceptual_cache.BKTree()
+    for value in hashes:
+        tree.add(value)
+
+    for radius in (0, 3, 4, 5, 10):
+        expected = sorted({
+            (perceptual_cache.hamming_distance(hashes[0], value), value) for value in hashes
+            if perceptual_cache.hamming_distance(hashes[0], value) <= radius
+        })
+        assert sorted(tree.search(hashes[0], radius)) == expected
+
+
+@pytest.mark.parametrize("distance, hit", [(0, True), (3, True), (4, True), (5, False)])
+def test_max_distance_is_inclusive(distance, hit):
+    cache = perceptual_cache.PerceptualCache("test_cache", max_distance=4)
+    cache.set(BASE, "casual", "rating")
+    assert (cache.get(flip(BASE, range(distance)), "casual") == "rating") is hit
+
+
+def test_nearest_entry_wins_and_context_must_match():
+    cache = perceptual_cache.PerceptualCache("test_cache", max_distance=4)
+    cache.set(flip(BASE, [0, 1, 2]), "casual", "far")
+    cache.set(flip(BASE, [10]), "casual", "near")
+
+    assert cache.get(BASE, "casual") == "near"
+    assert cache.get(BASE, "formal") is None
+
+
+def test_expired_and_evicted_entries_are_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(perceptual_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    cache = perceptual_cache.PerceptualCache("test_cache", max_entries=2, ttl_seconds=10)
+    cache.set(BASE, "casual", "old")
+    now[0] += 11
+    assert cache.get(BASE, "casual") is None
+    assert len(cache) == 0
+
+    for occasion in ("casual", "formal", "party"):
+        cache.set(BASE, occasion, occasion)
+    assert len(cache) == 2
+    assert cache.get(BASE, "casual") is None
+    assert cache.get(BASE, "party") == "party"
+
+
+def test_dhash_survives_resizing():
+    image = Image.new("RGB", (120, 90))
+    for x in range(120):
+        for y in range(90):
+            image.putpixel((x, y), ((x * 7) % 256, (y * 5) % 256, ((x + y) * 3) % 256))
+    original = perceptual_cache.dhash(image)
+    resized = perceptual_cache.dhash(image.resize((60, 45)))
+    assert perceptual_cache.hamming_distance(original, resized) <= 4
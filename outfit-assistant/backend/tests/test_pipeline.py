@@ -0,0 +1,80 @@
+"""
+Tests for the stage pipeline: concurrency, ordering and failure handling
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pipeline import Pipeline
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def outfit_pipeline(executor, upload, describe):
+    """Same shape as the outfit generation pipeline in app.py"""
+    flow = Pipeline("test", executor)
+    flow.stage("preparing_image", lambda: "photo")
+    flow.stage("uploading_image", upload, "preparing_image")
+    flow.stage("describing_outfit", describe, "preparing_image")
+    flow.stage("generating_image", lambda url, description: f"{url}+{description}",
+               "uploading_image", "describing_outfit")
+    return flow
+
+
+def test_independent_stages_run_concurrently(executor):
+    # Each side only passes the barrier if the other is running at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def upload(photo):
+        barrier.wait()
+        return f"url({photo})"
+
+    def describe(photo):
+        barrier.wait()
+        return f"description({photo})"
+
+    started = []
+    flow = outfit_pipeline(executor, upload, describe)
+    results = flow.run(started.append)
+
+    assert results["generating_image"] == "url(photo)+description(photo)"
+    assert started[0] == "preparing_image"
+    assert set(started[1:3]) == {"uploading_image", "describing_outfit"}
+    assert started[3] == "generating_image"
+    assert set(flow.timings) == set(started)
+
+
+def test_first_failure_is_raised_and_dependents_are_skipped(executor):
+    upload_failed = threading.Event()
+    generated = []
+
+    def upload(photo):
+        upload_failed.set()
+        raise ConnectionError("upload failed")
+
+    def describe(photo):
+        upload_failed.wait(5)
+        # Fails after the upload, while the pipeline may not have woken up yet
+        raise TimeoutError("description timed out")
+
+    flow = outfit_pipeline(executor, upload, describe)
+    flow.stage("publishing", generated.append, "generating_image")
+    for _ in range(20):
+        upload_failed.clear()
+        with pytest.raises(ConnectionError, match="upload failed"):
+            flow.run()
+    assert generated == []
+
+
+def test_stage_declaration_errors(executor):
+    flow = Pipeline("test", executor)
+    flow.stage("a", lambda: 1)
+    with pytest.raises(ValueError):
+        flow.stage("a", lambda: 2)
+    with pytest.raises(ValueError):
+        flow.stage("b", lambda value: value, "missing")
@@ -0,0 +1,107 @@
+"""
+Tests for prompt rendering within the token budget, response formats and usage accounting
+"""
+import pytest
+
+import metrics
+import prompts
+from providers import Usage
+
+
+def counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+@pytest.fixture
+def template():
+    return prompts.PromptTemplate(
+        "test_trim", "Outfit for {occasion}.{brand_text}{conditions_text}",
+        optional=("brand_text", "conditions_text")
+    )
+
+
+BRANDS = " From brands like " + ", ".join(f"Brand{i}" for i in range(20)) + "."
+CONDITIONS = " Additional requirements: " + "must be warm and waterproof, " * 10 + "nothing else."
+
+
+def render(template, budget):
+    return template.render_within(budget, occasion="Hiking", brand_text=BRANDS, conditions_text=CONDITIONS)
+
+
+def test_prompt_within_budget_is_untouched(template):
+    full = template.render(occasion="Hiking", brand_text=BRANDS, conditions_text=CONDITIONS)
+    trimmed = counter("prompts.test_trim.trimmed")
+
+    assert render(template, prompts.count_tokens(full)) == full
+    assert counter("prompts.test_trim.trimmed") == trimmed
+
+
+def test_conditions_are_trimmed_before_brands(template):
+    base = prompts.count_tokens("Outfit for Hiking.")
+    with_brands = prompts.count_tokens("Outfit for Hiking." + BRANDS)
+
+    # Room for the brands and part of the conditions
+    text = render(template, with_brands + 5)
+    assert text.startswith("Outfit for Hiking." + BRANDS + " Additional")
+    assert CONDITIONS not in text
+    assert prompts.count_tokens(text) <= with_brands + 5
+
+    # Not even room for every brand: the conditions go entirely, then the brands are cut
+    budget = (base + with_brands) // 2
+    text = render(template, budget)
+    assert "Additional requirements" not in text
+    assert text.startswith("Outfit for Hiking. From brands like Brand0")
+    assert BRANDS not in text
+    assert prompts.count_tokens(text) <= budget
+
+
+def test_required_text_is_never_trimmed(template):
+    text = render(template, 1)
+    assert text == "Outfit for Hiking."
+
+
+def test_unknown_optional_field_is_rejected():
+    with pytest.raises(ValueError):
+        prompts.PromptTemplate("bad", "Hello {name}", optional=("missing",))
+
+
+@pytest.mark.parametrize("structured", [True, False])
+def test_schema_example_only_sent_without_structured_outputs(monkeypatch, structured):
+    monkeypatch.setattr(prompts, "STRUCTURED_OUTPUTS", structured)
+
+    rating = prompts.rating_prompt("Date Night", "$200")
+    outfit = prompts.outfit_prompt("Date Night", 7, "bold", ["Zara"], "$200", "")
+    assert (prompts.RATING_FORMAT in rating) is not structured
+    assert (prompts.OUTFIT_FORMAT in outfit) is not structured
+
+    response_format = prompts.response_format("rating", prompts.RATING_SCHEMA)
+    if structured:
+        assert response_format["type"] == "json_schema"
+        assert response_format["json_schema"]["schema"] is prompts.RATING_SCHEMA
+        assert response_format["json_schema"]["strict"]
+    else:
+        assert response_format == {"type": "json_object"}
+
+
+def test_structured_outputs_save_prompt_tokens(monkeypatch):
+    monkeypatch.setattr(prompts, "STRUCTURED_OUTPUTS", True)
+    structured = prompts.count_tokens(prompts.rating_prompt("Date Night", ""))
+    monkeypatch.setattr(prompts, "STRUCTURED_OUTPUTS", False)
+    assert prompts.count_tokens(prompts.rating_prompt("Date Night", "")) > structured
+
+
+def test_record_usage_counts_tokens_per_endpoint():
+    prompts.record_usage("test_usage", Usage(120, 30))
+    prompts.record_usage("test_usage", Usage(80, None))
+    prompts.record_usage("test_usage", None)
+
+    assert counter("openai.test_usage.calls") == 3
+    assert counter("openai.test_usage.prompt_tokens") == 200
+    assert counter("openai.test_usage.completion_tokens") == 30
+
+
+def test_estimate_request_tokens_reserves_the_completion():
+    prompt = "Rate this outfit."
+    assert prompts.estimate_request_tokens(prompt, 500, images=2) == (
+        prompts.count_tokens(prompt) + 2 * prompts.IMAGE_TOKENS + 500
+    )
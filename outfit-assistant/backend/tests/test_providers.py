@@ -0,0 +1,214 @@
+"""
+Tests for the stub provider's outputs and latencies, and provider selection from the environment
+"""
+import hashlib
+import json
+import random
+import types
+
+import pytest
+
+import providers
+
+PROVIDER_VARIABLES = ("MODEL_PROVIDER", "RATING_PROVIDER", "OUTFIT_PROVIDER", "IMAGE_PROVIDER",
+                      "STUB_SEED", "STUB_OUTPUTS_DIR", "PUBLIC_BASE_URL",
+                      *(f"STUB_{kind.upper()}_LATENCY" for kind in providers.STUB_LATENCIES))
+
+
+def photo(name):
+    return types.SimpleNamespace(sha256=hashlib.sha256(name.encode()).hexdigest())
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Latencies the stub would have slept, without sleeping"""
+    recorded = []
+    monkeypatch.setattr(providers, "time", types.SimpleNamespace(sleep=recorded.append))
+    return recorded
+
+
+@pytest.fixture
+def environment(monkeypatch):
+    for name in PROVIDER_VARIABLES:
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+def scores(completion):
+    rating = json.loads(completion.text)
+    return rating["wow_factor"], rating["occasion_fitness"], rating["overall_rating"]
+
+
+# ----------------------------------------------------------------------
+# StubProvider outputs
+# ----------------------------------------------------------------------
+
+def test_scores_are_derived_from_the_photo_hash(sleeps):
+    first, second = providers.StubProvider(seed=1), providers.StubProvider(seed=2)
+    photos = [photo(f"outfit-{i}") for i in range(20)]
+
+    by_photo = [scores(first.rate("prompt", p, 100)) for p in photos]
+    # Same photo, same scores, whatever the seed or call order
+    assert by_photo == [scores(second.rate("prompt", p, 100)) for p in reversed(photos)][::-1]
+    assert all(1 <= score <= 10 for triple in by_photo for score in triple)
+    # Different photos spread across the scale so rankings have something to order
+    assert len(set(by_photo)) > 10
+
+    digest = int(photos[0].sha256[:8], 16)
+    assert by_photo[0] == tuple(1 + (digest >> (8 * offset)) % 10 for offset in range(3))
+
+
+def test_streamed_rating_matches_rate(sleeps):
+    stub = providers.StubProvider()
+    chunks = list(stub.stream_rating("Rate this", photo("a"), 100))
+
+    assert "".join(chunk.text for chunk in chunks) == stub.rate("Rate this", photo("a"), 100).text
+    assert all(chunk.usage is None for chunk in chunks[:-1])
+    assert chunks[-1].text == ""
+    assert chunks[-1].usage.prompt_tokens == providers.prompts.count_tokens("Rate this") + providers.prompts.IMAGE_TOKENS
+
+
+def test_canned_outputs_and_generated_images(sleeps):
+    outfit = {"outfit_concept": "Test", "items": []}
+    stub = providers.StubProvider(outfit=outfit)
+
+    assert json.loads(stub.describe("Design", None, 100).text) == outfit
+    reference = stub.upload(photo("person"))
+    assert reference == f"stub://{photo('person').sha256}"
+    image = stub.edit(reference, "linen suit")
+    assert image.size == (768, 1024)
+    assert stub.edit(reference, "linen suit").tobytes() == image.tobytes()
+    assert stub.edit(reference, "tuxedo").tobytes() != image.tobytes()
+
+
+# ----------------------------------------------------------------------
+# Latencies
+# ----------------------------------------------------------------------
+
+def test_latencies_repeat_for_a_seed(sleeps):
+    def run(seed):
+        sleeps.clear()
+        stub = providers.StubProvider(seed=seed)
+        for _ in range(5):
+            stub.rate("prompt", photo("a"), 100)
+            stub.describe("prompt", None, 100)
+            stub.upload(photo("a"))
+        return list(sleeps)
+
+    assert run(7) == run(7)
+    assert run(7) != run(8)
+
+
+def test_latency_specs_override_defaults(sleeps):
+    stub = providers.StubProvider({"rating": "fixed:0.25", "upload": "uniform:1:2"})
+    stub.rate("prompt", photo("a"), 100)
+    stub.upload(photo("a"))
+    stub.describe("prompt", None, 100)
+
+    rating, upload, outfit = sleeps
+    assert rating == 0.25
+    assert 1 <= upload <= 2
+    # Not overridden: the default lognormal around 7 seconds
+    assert outfit > 0
+
+
+def test_streamed_rating_spreads_its_latency(sleeps):
+    stub = providers.StubProvider({"rating": "fixed:2"})
+    list(stub.stream_rating("prompt", photo("a"), 100))
+
+    assert sleeps[0] == pytest.approx(2 * providers.STUB_FIRST_CHUNK_SHARE)
+    assert sum(sleeps) == pytest.approx(2)
+
+
+@pytest.mark.parametrize("spec, low, high", [
+    ("fixed:1.5", 1.5, 1.5),
+    ("uniform:0.2:0.6", 0.2, 0.6),
+    ("normal:0.1:5", 0, float("inf")),
+    ("lognormal:5:0.35", 0, float("inf")),
+])
+def test_parse_latency_distributions(spec, low, high):
+    sample = providers.parse_latency(spec)
+    rng = random.Random(0)
+    values = [sample(rng) for _ in range(200)]
+    assert all(low <= value <= high for value in values)
+
+
+@pytest.mark.parametrize("spec", ["", "fixed", "fixed:a", "uniform:1", "gamma:1:2", "lognormal:0:1"])
+def test_parse_latency_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        providers.parse_latency(spec)
+
+
+# ----------------------------------------------------------------------
+# Selection
+# ----------------------------------------------------------------------
+
+def test_model_provider_stub_shares_one_stub(environment):
+    environment.setenv("MODEL_PROVIDER", "Stub")
+    rater, writer, editor = providers.create_providers()
+
+    assert isinstance(rater, providers.StubProvider)
+    assert rater is writer is editor
+
+
+def test_default_is_live(environment):
+    rater, writer, editor = providers.create_providers()
+
+    assert isinstance(rater, providers.OpenAIProvider)
+    assert isinstance(writer, providers.OpenAIProvider)
+    assert isinstance(editor, providers.NanobananaImageEditor)
+
+
+def test_capability_overrides(environment):
+    environment.setenv("MODEL_PROVIDER", "stub")
+    environment.setenv("RATING_PROVIDER", "live")
+    rater, writer, editor = providers.create_providers()
+    assert isinstance(rater, providers.OpenAIProvider)
+    assert isinstance(writer, providers.StubProvider)
+    assert writer is editor
+
+    environment.setenv("MODEL_PROVIDER", "live")
+    environment.delenv("RATING_PROVIDER")
+    environment.setenv("IMAGE_PROVIDER", "stub")
+    rater, writer, editor = providers.create_providers()
+    assert isinstance(rater, providers.OpenAIProvider)
+    assert isinstance(editor, providers.StubProvider)
+
+
+@pytest.mark.parametrize("variable", ["MODEL_PROVIDER", "OUTFIT_PROVIDER"])
+def test_unknown_provider_is_rejected(environment, variable):
+    environment.setenv(variable, "mock")
+    with pytest.raises(ValueError, match="mock"):
+        providers.create_providers()
+
+
+def test_stub_settings_from_environment(environment, tmp_path, sleeps):
+    (tmp_path / "rating.json").write_text(json.dumps({**providers.STUB_RATING, "roast": "Canned"}))
+    environment.setenv("MODEL_PROVIDER", "stub")
+    environment.setenv("STUB_RATING_LATENCY", "fixed:0.5")
+    environment.setenv("STUB_OUTPUTS_DIR", str(tmp_path))
+    environment.setenv("STUB_SEED", "3")
+
+    stub, _, _ = providers.create_providers()
+    assert json.loads(stub.rate("prompt", photo("a"), 100).text)["roast"] == "Canned"
+    assert sleeps == [0.5]
+
+    stub.upload(photo("a"))
+    seeded = providers.StubProvider({"rating": "fixed:0.5"}, seed=3)
+    seeded.rate("prompt", photo("a"), 100)
+    seeded.upload(photo("a"))
+    # Same settings and seed as the environment asked for, so the same latencies
+    assert sleeps[2:] == sleeps[:2]
+
+
+def test_stub_latency_setting_is_validated(environment):
+    environment.setenv("MODEL_PROVIDER", "stub")
+    environment.setenv("STUB_IMAGE_LATENCY", "slow")
+    with pytest.raises(ValueError, match="slow"):
+        providers.create_providers()
+
+
+def test_interfaces_are_abstract():
+    for interface in (providers.VisionRater, providers.OutfitWriter, providers.ImageEditor):
+        with pytest.raises(TypeError):
+            interface()
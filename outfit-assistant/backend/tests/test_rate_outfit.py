@@ -0,0 +1,65 @@
+"""
+Tests for request validation and streaming on the rate-outfit endpoints
+"""
+import base64
+import json
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import providers
+
+INSTANT = {kind: "fixed:0" for kind in providers.STUB_LATENCIES}
+
+
+def photo():
+    buffer = BytesIO()
+    Image.new("RGB", (48, 64), "teal").save(buffer, format="JPEG")
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def stub_app(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "vision_rater", providers.StubProvider(INSTANT))
+    return app_module
+
+
+@pytest.mark.parametrize("path", ["/api/rate-outfit", "/api/rate-outfit/stream"])
+@pytest.mark.parametrize("body", [
+    {"json": ["not", "an", "object"]},
+    {"json": "image"},
+    {"json": 7},
+    {"data": "not json", "content_type": "application/json"},
+    {"data": "image=abc", "content_type": "application/x-www-form-urlencoded"},
+    {"json": {"occasion": "Date Night"}},
+])
+def test_bad_bodies_return_json_400(client, stub_app, path, body):
+    response = client.post(path, **body)
+    assert response.status_code == 400
+    assert response.is_json
+    assert response.get_json()["error"]
+
+
+def test_prepare_rating_request_rejects_non_objects(stub_app):
+    for data in (None, [], ["image"], "image"):
+        with pytest.raises(ValueError, match="JSON object"):
+            stub_app.prepare_rating_request(data)
+
+
+def test_stream_emits_fields_then_done(client, stub_app):
+    response = client.post("/api/rate-outfit/stream", json={"image": photo(), "occasion": "Stream test"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+
+    name, done = events[-1]
+    assert name == "done"
+    assert done["success"]
+    fields = {payload["name"]: payload["value"] for name, payload in events[:-1] if name == "field"}
+    assert fields["overall_rating"] == done["data"]["overall_rating"]
+    assert 1 <= done["data"]["overall_rating"] <= 10
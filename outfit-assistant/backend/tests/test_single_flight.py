@@ -0,0 +1,79 @@
+"""
+Tests for coalescing identical calls within and across processes
+"""
+import os
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flight = SingleFlight("test_flight")
+    release = threading.Event()
+    calls = []
+
+    def function():
+        calls.append(1)
+        release.wait(2)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", function))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+
+
+def test_processes_wait_on_the_same_key_only(tmp_path):
+    # flock treats separate open() calls like separate processes, so two
+    # instances sharing a lock directory stand in for two workers
+    first, second = SingleFlight("test_flight", tmp_path), SingleFlight("test_flight", tmp_path)
+    started, release = threading.Event(), threading.Event()
+    cache = {}
+
+    def slow_call():
+        started.set()
+        release.wait(2)
+        cache["shared"] = "from first"
+        return "from first"
+
+    leader = threading.Thread(target=lambda: first.do("shared", slow_call))
+    leader.start()
+    assert started.wait(2)
+
+    # An unrelated key is not held up by the call in flight
+    assert second.do("other", lambda: "other") == "other"
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(
+        second.do("shared", lambda: "from second", recheck=lambda: cache.get("shared"))
+    ))
+    waiter.start()
+    time.sleep(0.05)
+    assert results == []
+    release.set()
+    leader.join(2)
+    waiter.join(2)
+
+    assert results == ["from first"]
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_call_frees_the_lock(tmp_path):
+    flight = SingleFlight("test_flight", tmp_path)
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    try:
+        flight.do("key", fail)
+    except RuntimeError:
+        pass
+    assert flight.do("key", lambda: "retried") == "retried"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,79 @@
+"""
+Tests for the shared upstream task poller
+"""
+import threading
+import time
+
+import pytest
+import task_poller
+
+
+def test_pending_checks_back_off_until_a_result():
+    calls = []
+
+    def check(task_id):
+        calls.append(task_id)
+        return "done" if len(calls) == 3 else None
+
+    poller = task_poller.TaskPoller(check, "test_poller", initial_delay=0.01, max_delay=0.02, jitter=0)
+    assert poller.track("t1").result(timeout=2) == "done"
+    assert calls == ["t1"] * 3
+
+
+def test_check_errors_and_timeouts_fail_the_task():
+    def check(task_id):
+        if task_id == "broken":
+            raise RuntimeError("upstream error")
+        return None
+
+    poller = task_poller.TaskPoller(check, "test_poller", initial_delay=0.01, max_delay=0.01, jitter=0)
+    with pytest.raises(RuntimeError):
+        poller.track("broken").result(timeout=2)
+    with pytest.raises(TimeoutError):
+        poller.track("slow", timeout=0.05).result(timeout=2)
+
+
+def test_slow_check_does_not_block_other_tasks():
+    release = threading.Event()
+
+    def check(task_id):
+        if task_id == "slow":
+            release.wait(5)
+        return task_id
+
+    poller = task_poller.TaskPoller(check, "test_poller", initial_delay=0, jitter=0)
+    slow = poller.track("slow")
+    time.sleep(0.05)
+    fast = poller.track("fast")
+    try:
+        assert fast.result(timeout=1) == "fast"
+        assert not slow.done()
+    finally:
+        release.set()
+    assert slow.result(timeout=2) == "slow"
+
+
+def test_poll_now_during_a_check_rechecks_after_it():
+    started, release = threading.Event(), threading.Event()
+    in_flight, overlapped, calls = [], [], []
+
+    def check(task_id):
+        overlapped.append(bool(in_flight))
+        in_flight.append(task_id)
+        calls.append(task_id)
+        if len(calls) == 1:
+            started.set()
+            release.wait(5)
+        in_flight.pop()
+        return "done" if len(calls) == 2 else None
+
+    # Without poll_now the second check would only run a minute later
+    poller = task_poller.TaskPoller(check, "test_poller", initial_delay=0.01, max_delay=60, backoff=6000, jitter=0)
+    future = poller.track("t1")
+    assert started.wait(2)
+    assert poller.poll_now("t1")
+    time.sleep(0.05)
+    release.set()
+
+    assert future.result(timeout=0.5) == "done"
+    assert overlapped == [False, False]
@@ -76,6 +76,51 @@ function generateShoppingButtons(itemName) {
     `;
 }
 
+// Helper function to resolve a backend path (e.g. /api/arena/photo/...) against the API host
+function apiAssetUrl(path) {
+    return new URL(path, API_BASE_URL).href;
+}
+
+// Helper function to build the URL of a Fashion Arena photo
+function arenaPhotoUrl(submission, size = 1024) {
+    if (submission.renditions && submission.renditions[size]) {
+        return apiAssetUrl(submission.renditions[size].jpg);
+    }
+    // Older submissions may still carry the inline base64 photo
+    return submission.photo_hash
+        ? `${API_BASE_URL}/arena/photo/${submission.photo_hash}`
+        : submission.photo;
+}
+
+// Helper function to build a responsive <picture> for a Fashion Arena photo
+function arenaPictureHtml(submission, sizes) {
+    const renditions = submission.renditions;
+    if (!renditions) {
+        return `<img src="${arenaPhotoUrl(submission)}" alt="${submission.title}" loading="lazy">`;
+    }
+
+    const srcset = (ext) => Object.keys(renditions)
+        .filter(size => renditions[size][ext])
+        .map(size => `${apiAssetUrl(renditions[size][ext])} ${size}w`)
+        .join(', ');
+    const webpSource = srcset('webp')
+        ? `<source type="image/webp" srcset="${srcset('webp')}" sizes="${sizes}">`
+        : '';
+
+    return `
+        <picture>
+            ${webpSource}
+            <img src="${arenaPhotoUrl(submission, 320)}" srcset="${srcset('jpg')}" sizes="${sizes}"
+                 alt="${submission.title}" loading="lazy">
+        </picture>
+    `;
+}
+
+// Model results arrive as objects (older backends sent JSON strings)
+function parseModelJson(value) {
+    return typeof value === 'string' ? JSON.parse(value) : value;
+}
+
 // Helper function to add timeout to fetch requests
 function fetchWithTimeout(url, options = {}, timeout = 60000) {
     return Promise.race([
@@ -86,6 +131,39 @@ function fetchWithTimeout(url, options = {}, timeout = 60000) {
     ]);
 }
 
+// Start an outfit generation job and poll until it finishes
+async function generateOutfitJob(params, timeout = 180000) {
+    const response = await fetchWithTimeout(`${API_BASE_URL}/generate-outfit`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(params)
+    });
+
+    const job = await response.json();
+    if (!response.ok || !job.success) {
+        throw new Error(job.error || 'Failed to generate outfit');
+    }
+
+    const deadline = Date.now() + timeout;
+    let delay = 1000;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, 5000);
+
+        const statusResponse = await fetchWithTimeout(`${API_BASE_URL}/jobs/${job.job_id}`);
+        const status = await statusResponse.json();
+        if (!statusResponse.ok || status.status === 'failed') {
+            throw new Error(status.error || 'Failed to generate outfit');
+        }
+        if (status.status === 'succeeded') {
+            return status.result;
+        }
+    }
+    throw new Error('Request timeout - please try again');
+}
+
 // Initialize app
 document.addEventListener('DOMContentLoaded', function () {
     initializeModeSwitch();
@@ -249,7 +327,7 @@ async function handleRaterSubmit(e) {
         const result = await response.json();
 
         if (result.success) {
-            displayRaterResults(JSON.parse(result.data));
+            displayRaterResults(parseModelJson(result.data));
         } else {
             throw new Error(result.error || 'Failed to rate outfit');
         }
@@ -414,15 +492,7 @@ async function generateFromRaterRecommendations() {
 
     try {
         console.log('Calling API:', `${API_BASE_URL}/generate-outfit`);
-        const response = await fetchWithTimeout(`${API_BASE_URL}/generate-outfit`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(params)
-        }, 120000); // 120 second timeout for image generation
-
-        const result = await response.json();
+        const result = await generateOutfitJob(params);
         console.log('API response:', result);
 
         if (result.success) {
@@ -580,15 +650,7 @@ async function handleGeneratorSubmit(e) {
     document.getElementById('generator-loading').style.display = 'block';
 
     try {
-        const response = await fetchWithTimeout(`${API_BASE_URL}/generate-outfit`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(lastGeneratorParams)
-        }, 120000); // 120 second timeout
-
-        const result = await response.json();
+        const result = await generateOutfitJob(lastGeneratorParams);
 
         if (result.success) {
             displayGeneratorResults(result);
@@ -605,7 +667,7 @@ async function handleGeneratorSubmit(e) {
 }
 
 function displayGeneratorResults(result) {
-    const data = JSON.parse(result.outfit_description);
+    const data = parseModelJson(result.outfit_description);
 
     // Display generated image
     document.getElementById('generated-image').src = result.outfit_image_url;
@@ -682,15 +744,8 @@ async function regenerateOutfit() {
     document.getElementById('generator-loading').style.display = 'block';
 
     try {
-        const response = await fetchWithTimeout(`${API_BASE_URL}/generate-outfit`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(lastGeneratorParams)
-        }, 120000); // 120 second timeout
-
-        const result = await response.json();
+        // Ask for a fresh outfit rather than the cached description
+        const result = await generateOutfitJob({ ...lastGeneratorParams, surprise_me: true });
 
         if (result.success) {
             displayGeneratorResults(result);
@@ -954,7 +1009,7 @@ function createSubmissionCard(submission) {
 
     card.innerHTML = `
         <div class="arena-card-image" data-submission-id="${submission.id}">
-            <img src="${submission.photo}" alt="${submission.title}">
+            ${arenaPictureHtml(submission, '(max-width: 768px) 100vw, 360px')}
             <div class="arena-card-badge">${sourceIcon} ${submission.source_mode}</div>
         </div>
         <div class="arena-card-content">
@@ -1042,7 +1097,7 @@ function displayLeaderboard(leaderboard) {
         item.innerHTML = `
             ${rankBadge}
             <div class="leaderboard-image">
-                <img src="${submission.photo}" alt="${submission.title}">
+                ${arenaPictureHtml(submission, '450px')}
             </div>
             <div class="leaderboard-details">
                 <h4>${submission.title}</h4>
@@ -1242,7 +1297,7 @@ async function openVoteModal(submissionId) {
         if (result.success) {
             const submission = result.submission;
 
-            document.getElementById('vote-modal-preview').src = submission.photo;
+            document.getElementById('vote-modal-preview').src = arenaPhotoUrl(submission);
             document.getElementById('vote-modal-title').textContent = submission.title;
             document.getElementById('vote-modal-description').textContent = submission.description || 'No description';
             document.getElementById('vote-modal-votes').textContent = submission.total_votes;